@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark of decisions on synthetic jobs and their SWF histories.
+
+Histories are generated by running the job with SWFDecider on SWFEmulator,
+and the history of the job is replayed at the decision tasks closest to the
+given completion points. Each decision is timed in phases:
+
+replay: build the step handler from the whole history
+priority: compute priorities of children
+decide: replay the job and generate decisions
+cached: apply the new events to the handler of the previous decision and
+        decide again
+
+It reports decision tasks per second of a decider without cache and the peak
+memory of a decision.
+
+Shapes of jobs:
+
+wide: parallel job of actions
+deep: serial job of actions
+mixed: serial job of parallel tasks of 10 actions
+retry: serial job of actions which fail until their last retry
+
+Usage:
+
+python benchmarks/decider.py --shapes wide,deep --sizes 100,1000 --points 0.5,0.9
+"""
+
+# built-in modules
+import json
+import time
+import tracemalloc
+
+# 3rd-party modules
+import click
+
+# local modules
+from mass import Job, Task, Action
+from mass.exception import TaskWait
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, get_priorities
+from mass.scheduler.swf.decisions import Decisions
+from mass.scheduler.swf.emulator import SWFEmulator
+from mass.scheduler.swf.step import StepHandler
+
+
+def make_job(shape, size):
+    if shape == 'wide':
+        with Job('Benchmark', parallel=True) as job:
+            for i in range(size):
+                Action(msg='Action #%d' % i, _role='echo')
+    elif shape in ['deep', 'retry']:
+        with Job('Benchmark') as job:
+            for i in range(size):
+                Action(msg='Action #%d' % i, _role='echo')
+    elif shape == 'mixed':
+        with Job('Benchmark') as job:
+            for i in range(max(size // 10, 1)):
+                with Task('Task #%d' % i, parallel=True):
+                    for j in range(10):
+                        Action(msg='Action #%d.%d' % (i, j), _role='echo')
+    else:
+        raise ValueError('Unknown shape: %r' % shape)
+    return job
+
+
+def make_history(job, fail, batch_size):
+    """Run job on emulator and return the history of job and the ids of the
+    started events of its decision tasks.
+
+    Activities are closed batch_size at a time between decisions. An activity
+    is failed if fail(activity id) is True.
+    """
+    emulator = SWFEmulator(poll_timeout=0, page_size=10 ** 9)
+    decider = SWFDecider(config.DOMAIN, config.REGION)
+    decider.client = emulator
+    run_id = emulator.start_workflow_execution(
+        domain=config.DOMAIN,
+        workflowId=job['Job']['title'],
+        workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': config.DECISION_TASK_LIST},
+        taskPriority='1',
+        input=json.dumps({'protocol': None, 'body': job}),
+        tagList=[job['Job']['title']])['runId']
+    workflow = emulator.executions[run_id]
+
+    decision_points = []
+    while workflow.close_status is None:
+        while True:
+            res = emulator.poll_for_decision_task(
+                domain=config.DOMAIN, taskList={'name': config.DECISION_TASK_LIST})
+            if 'taskToken' not in res:
+                break
+            if res['workflowExecution']['runId'] == run_id:
+                decision_points.append(res['startedEventId'])
+            decider.task_token = res['taskToken']
+            decider.workflow_execution = res['workflowExecution']
+            decider.started_event_id = res['startedEventId']
+            decider.decisions = Decisions()
+            decider.metrics = {'durations': {}}
+            decider.handler = decider.load_handler(iter(res['events']))
+            try:
+                decider.execute()
+                if decider.handler.is_waiting():
+                    raise TaskWait
+            except TaskWait:
+                decider.suspend()
+            except Exception as err:
+                decider.fail(repr(err), '')
+            else:
+                decider.complete(None)
+
+        for _ in range(batch_size):
+            task = emulator.poll_for_activity_task(
+                domain=config.DOMAIN, taskList={'name': 'echo'})
+            if 'taskToken' not in task:
+                break
+            if fail(int(task['activityId'])):
+                emulator.respond_activity_task_failed(
+                    taskToken=task['taskToken'], reason='Error', details='')
+            else:
+                emulator.respond_activity_task_completed(
+                    taskToken=task['taskToken'], result='null')
+    return workflow.events, decision_points
+
+
+def decide(decider, events, handler=None):
+    """Return elapsed time of phases of a decision and the number of
+    decisions. The decision applies events to handler if it is given.
+    """
+    decider.decisions = Decisions()
+    decider.metrics = {'durations': {}}
+    start_time = time.time()
+    if handler is None:
+        handler = StepHandler(
+            events,
+            activity_max_retry=config.ACTIVITY_MAX_RETRY,
+            workflow_max_retry=config.WORKFLOW_MAX_RETRY)
+    else:
+        handler.apply(events)
+    decider.handler = handler
+    replay_time = time.time()
+    handler.priorities = get_priorities(handler.input, handler.priority)
+    priority_time = time.time()
+    try:
+        decider.execute()
+    except TaskWait:
+        pass
+    decider.save_pending()
+    end_time = time.time()
+    return (replay_time - start_time, priority_time - replay_time,
+            end_time - priority_time, len(decider.decisions._data))
+
+
+def benchmark(shape, size, point, repeat):
+    """Return the measurements of the decision closest to point of job.
+    """
+    max_retry = config.ACTIVITY_MAX_RETRY
+    if shape == 'retry':
+        fail = lambda activity_id: activity_id % (max_retry + 1) < max_retry
+    else:
+        fail = lambda activity_id: False
+    job = make_job(shape, size)
+    events, decision_points = make_history(job, fail, max(size // 20, 1))
+    index = min(int(point * len(decision_points)), len(decision_points) - 1)
+    history = events[:decision_points[index]]
+    previous = events[:decision_points[index - 1]] if index > 0 else None
+
+    decider = SWFDecider(config.DOMAIN, config.REGION)
+    replay, priority, decide_, cached = [], [], [], []
+    for _ in range(repeat):
+        r, p, d, decisions = decide(decider, history)
+        replay.append(r)
+        priority.append(p)
+        decide_.append(d)
+        if previous is not None:
+            decide(decider, previous)
+            handler = decider.handler
+            cached.append(sum(decide(decider, history, handler)[:3]))
+
+    tracemalloc.start()
+    decide(decider, history)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = min(replay) + min(priority) + min(decide_)
+    return {
+        'events': len(history),
+        'replay': min(replay),
+        'priority': min(priority),
+        'decide': min(decide_),
+        'cached': min(cached) if cached else float('nan'),
+        'decisions': decisions,
+        'rate': 1 / total if total else float('inf'),
+        'peak': peak}
+
+
+@click.command()
+@click.option('--shapes', default='wide,deep,mixed,retry',
+              help='Comma-separated shapes of jobs.')
+@click.option('--sizes', default='100,1000',
+              help='Comma-separated numbers of actions of jobs.')
+@click.option('--points', default='0.5,0.9',
+              help='Comma-separated completion points of jobs in [0, 1).')
+@click.option('--repeat', default=3, help='Repeat times of each decision.')
+def main(shapes, sizes, points, repeat):
+    print('%6s %7s %5s %7s %10s %11s %10s %10s %9s %10s %9s' % (
+        'shape', 'actions', 'point', 'events', 'replay(s)', 'priority(s)',
+        'decide(s)', 'cached(s)', 'decisions', 'tasks/s', 'peak(KiB)'))
+    for shape in shapes.split(','):
+        for size in map(int, sizes.split(',')):
+            for point in map(float, points.split(',')):
+                result = benchmark(shape, size, point, repeat)
+                print('%6s %7d %5.2f %7d %10.4f %11.4f %10.4f %10.4f %9d %10.1f %9d' % (
+                    shape, size, point, result['events'], result['replay'],
+                    result['priority'], result['decide'], result['cached'],
+                    result['decisions'], result['rate'], result['peak'] / 1024))
+
+
+if __name__ == '__main__':
+    main()
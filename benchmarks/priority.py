@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark of computing priorities of children on wide and deep jobs.
+
+Usage:
+
+python benchmarks/priority.py --width 10000 --depth 200
+"""
+
+# built-in modules
+import time
+
+# 3rd-party modules
+import click
+
+# local modules
+from mass import Job, Task, Action
+from mass.scheduler.swf import get_priorities, get_priority
+
+
+def make_wide_job(width):
+    """Serial job of tasks which contain two parallel actions.
+    """
+    with Job('Wide') as job:
+        for i in range(width):
+            with Task('Task #%d' % i, parallel=True):
+                Action(msg='Action #%d.0' % i, _role='echo')
+                Action(msg='Action #%d.1' % i, _role='echo')
+    return job
+
+
+def make_deep_job(depth):
+    """Serial job of nested tasks, each task contains a sub-task followed by
+    two actions.
+    """
+    def make_task(level):
+        with Task('Task #%d' % level) as task:
+            if level < depth:
+                make_task(level + 1)
+            Action(msg='Action #%d.0' % level, _role='echo')
+            Action(msg='Action #%d.1' % level, _role='echo')
+        return task
+
+    with Job('Deep') as job:
+        for i in range(10):
+            make_task(1)
+    return job
+
+
+def measure(job):
+    """Return the elapsed time of computing priorities of children one by one
+    and all at once.
+    """
+    size = len(job['Job']['children'])
+    start_time = time.time()
+    for i in range(size):
+        get_priority(job, 1, i)
+    one_by_one = time.time() - start_time
+
+    start_time = time.time()
+    get_priorities(job, 1)
+    all_at_once = time.time() - start_time
+    return one_by_one, all_at_once
+
+
+@click.command()
+@click.option('--width', default=2000, help='Number of children of the wide job.')
+@click.option('--depth', default=200, help='Depth of the deep job.')
+def main(width, depth):
+    print('%6s %12s %12s' % ('job', 'per child(s)', 'once(s)'))
+    for name, job in [('wide', make_wide_job(width)), ('deep', make_deep_job(depth))]:
+        print('%6s %12.4f %12.4f' % ((name,) + measure(job)))
+
+
+if __name__ == '__main__':
+    main()
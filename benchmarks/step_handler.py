@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark of a decision on SWF workflow execution histories of different
+sizes. It measures the step handler on a wide job, and benchmarks/decider.py
+measures whole decisions on jobs of other shapes.
+
+Usage:
+
+python benchmarks/step_handler.py --sizes 100,1000,5000
+"""
+
+# built-in modules
+from datetime import datetime, timedelta
+import json
+import time
+import tracemalloc
+
+# 3rd-party modules
+import click
+
+# local modules
+from mass import Job, Action
+from mass.exception import TaskWait
+from mass.scheduler.swf import SWFDecider
+from mass.scheduler.swf.decisions import Decisions
+from mass.scheduler.swf.step import StepHandler
+
+
+def make_job(width):
+    with Job('Benchmark', parallel=True) as job:
+        for i in range(width):
+            Action(msg='Action #%d' % i, _role='echo')
+    return job
+
+
+def make_history(job):
+    """Generate the history of a parallel job after all of its actions are
+    scheduled and half of them are completed.
+    """
+    events = []
+
+    def add(event_type, **attributes):
+        event_id = len(events) + 1
+        attr_name = event_type[0].lower() + event_type[1:] + 'EventAttributes'
+        events.append({
+            'eventId': event_id,
+            'eventType': event_type,
+            'eventTimestamp': datetime(2015, 1, 1) + timedelta(milliseconds=event_id),
+            attr_name: attributes})
+        return event_id
+
+    add('WorkflowExecutionStarted',
+        input=json.dumps({'protocol': None, 'body': job}),
+        tagList=[job['Job']['title']],
+        taskPriority='1')
+    add('DecisionTaskScheduled')
+    add('DecisionTaskStarted')
+    add('DecisionTaskCompleted')
+    scheduled = []
+    for i, child in enumerate(job['Job']['children']):
+        scheduled.append(add(
+            'ActivityTaskScheduled',
+            activityId=str(i * 3),
+            input=json.dumps({'protocol': None, 'body': child}),
+            taskList={'name': 'echo'},
+            taskPriority='2'))
+    for event_id in scheduled:
+        add('ActivityTaskStarted', scheduledEventId=event_id)
+    for event_id in scheduled[:len(scheduled) // 2]:
+        add('ActivityTaskCompleted', scheduledEventId=event_id, result='null')
+    add('DecisionTaskScheduled')
+    add('DecisionTaskStarted')
+    return events
+
+
+def parse(job):
+    """Return the elapsed time of building steps from the history of job and
+    the memory retained by the steps after the raw history is released.
+    """
+    tracemalloc.start()
+    events = make_history(job)
+    start_time = time.time()
+    handler = StepHandler(events, activity_max_retry=2)
+    elapsed = time.time() - start_time
+    del events
+    retained, _ = tracemalloc.get_traced_memory()
+    del handler
+    tracemalloc.stop()
+    return elapsed, retained
+
+
+def decide(decider, events, handler=None):
+    """Decide with a new handler of the whole history, or apply the history
+    to the handler of the previous decision.
+    """
+    decider.decisions = Decisions()
+    if handler is None:
+        decider.handler = StepHandler(events, activity_max_retry=2)
+    else:
+        decider.handler = handler
+        handler.apply(events)
+    try:
+        decider.execute()
+    except TaskWait:
+        pass
+    decider.save_pending()
+
+
+def decide_incrementally(decider, events):
+    """Return the elapsed time of a decision which applies the last completed
+    activity to the handler of the previous decision.
+    """
+    decide(decider, events[:-3])
+    handler = decider.handler
+    start_time = time.time()
+    decide(decider, events, handler)
+    return time.time() - start_time
+
+
+@click.command()
+@click.option('--sizes', default='100,500,1000,2000,5000',
+              help='Comma-separated numbers of actions of the job.')
+@click.option('--repeat', default=3, help='Repeat times of each decision.')
+def main(sizes, repeat):
+    decider = SWFDecider('mass', 'us-east-1')
+    print('%8s %8s %10s %10s %12s %12s' % (
+        'actions', 'events', 'parse(s)', 'steps(KiB)', 'decision(s)', 'cached(s)'))
+    for size in map(int, sizes.split(',')):
+        job = make_job(size)
+        parse_time, retained = min(parse(job) for _ in range(repeat))
+        events = make_history(job)
+        elapsed = []
+        for _ in range(repeat):
+            start_time = time.time()
+            decide(decider, events)
+            elapsed.append(time.time() - start_time)
+        cached = min(decide_incrementally(decider, events) for _ in range(repeat))
+        print('%8d %8d %10.4f %10d %12.4f %12.4f' % (
+            size, len(events), parse_time, retained / 1024, min(elapsed), cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,10 @@
 from mass.input_handler import InputHandler
 from mass.job import Job, Task, Action
 from mass.log_handler import LogHandler
+from mass.metric_handler import MetricHandler
+from mass.tracer import Tracer
 from mass.utils import submit
 from pkg_resources import get_distribution
 
 __version__ = get_distribution('mass').version
-__all__ = [submit, Job, Task, Action, InputHandler, LogHandler]
+__all__ = [submit, Job, Task, Action, InputHandler, LogHandler, MetricHandler, Tracer]
@@ -42,6 +42,11 @@ def monitor():
     pass
 
 
+@cli.group()
+def emulator():
+    pass
+
+
 @worker.command('start')
 @click.option('-d', '--domain', help='Amazon SWF Domain.')
 @click.option('-r', '--region', help='Amazon Region.')
@@ -66,7 +71,32 @@ def job_submit(json_script, alf_script):
 def monitor_start():
     monitor = app.run(debug=True)
 
+@cli.group()
+def store():
+    pass
+
+
+@store.command('gc')
+@click.option('-p', '--path', help='Directory of payload store.')
+@click.option('-a', '--max-age', type=int, help='Max age in seconds of payloads.')
+def store_gc(path, max_age):
+    from mass.payload_store import PayloadStore
+    from mass.scheduler.swf import config
+    removed = PayloadStore(path or config.PAYLOAD_STORE_PATH).gc(
+        max_age or config.PAYLOAD_STORE_MAX_AGE)
+    print('%d payloads are removed.' % removed)
+
+
+@emulator.command('start')
+@click.option('-h', '--host', default='localhost', help='Host to listen on.')
+@click.option('-p', '--port', default=8080, help='Port to listen on.')
+def emulator_start(host, port):
+    from mass.scheduler.swf.emulator import serve
+    serve(host=host, port=port).serve_forever()
+
 cli.add_command(init)
 cli.add_command(worker)
 cli.add_command(job)
 cli.add_command(monitor)
+cli.add_command(emulator)
+cli.add_command(store)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Dependencies between the children of a parallel Job or Task.
+
+A child which depends on its siblings is scheduled after they are completed,
+e.g. B depends on A while C runs with both of them:
+
+with Job('Job', parallel=True) as job:
+    a = Task('A')
+    Task('B', _depends_on=[a])
+    Task('C')
+
+Dependencies are kept as the indexes of siblings in "_depends_on".
+"""
+
+# local modules
+from mass.exception import InvalidDependency
+
+
+def get_dependencies(node):
+    """Return the indexes of the siblings which node depends on.
+    """
+    type_ = [k for k in node.keys()][0]
+    return node[type_].get('_depends_on') or []
+
+
+def has_dependencies(children):
+    return any(get_dependencies(c) for c in children)
+
+
+def sort_children(children):
+    """Return the indexes of children in a topological order of their
+    dependencies. Raise InvalidDependency if a dependency is not a sibling,
+    is an action which runs when error or is cyclic.
+    """
+    dependents = [[] for _ in children]
+    counts = [0] * len(children)
+    for i, child in enumerate(children):
+        for d in get_dependencies(child):
+            if not isinstance(d, int) or not 0 <= d < len(children) or d == i:
+                raise InvalidDependency('Child %d depends on unknown sibling %r.' % (i, d))
+            if 'Action' in children[d] and children[d]['Action']['_whenerror']:
+                raise InvalidDependency(
+                    'Child %d depends on action %d which runs when error.' % (i, d))
+            dependents[d].append(i)
+            counts[i] += 1
+
+    order = [i for i, count in enumerate(counts) if count == 0]
+    for i in order:
+        for j in dependents[i]:
+            counts[j] -= 1
+            if counts[j] == 0:
+                order.append(j)
+    if len(order) < len(children):
+        cycle = [i for i, count in enumerate(counts) if count > 0]
+        raise InvalidDependency('Children %s have cyclic dependencies.' % cycle)
+    return order
+
+
+def check_dependencies(node):
+    """Check dependencies of all descendants of node. Children of a serial
+    node could only depend on their previous siblings.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        type_ = [k for k in node.keys()][0]
+        if type_ == 'Action':
+            continue
+        children = node[type_]['children']
+        sort_children(children)
+        if not node[type_].get('parallel', False):
+            for i, child in enumerate(children):
+                if any(d > i for d in get_dependencies(child)):
+                    raise InvalidDependency(
+                        'Child %d of serial %s %r depends on a later sibling.' % (
+                            i, type_, node[type_].get('title')))
+        stack.extend(children)
+
+
+def get_offsets(children, lengths):
+    """Return the offsets of parallel children on the critical path of their
+    dependencies, where lengths are the numbers of serial steps of children.
+    Children without dependencies are at offset 0.
+    """
+    offsets = [0] * len(children)
+    for i in sort_children(children):
+        offsets[i] = max([offsets[d] + lengths[d] for d in get_dependencies(children[i])] or [0])
+    return offsets
@@ -22,6 +22,12 @@ class TaskError(Exception):
         self.details = details
 
 
+class InvalidDependency(Exception):
+    """Raised while dependencies of children are invalid or cyclic.
+    """
+    pass
+
+
 class UnsupportedScheduler(Exception):
     """Raised while scheduler is not supported.
     """
@@ -3,6 +3,16 @@ from functools import wraps
 import inspect
 
 
+def get_arg_names(func):
+    """Return the names of arguments of func, or None if it accepts any
+    keyword arguments.
+    """
+    params = inspect.signature(func).parameters.values()
+    if any(p.kind == p.VAR_KEYWORD for p in params):
+        return None
+    return set(p.name for p in params)
+
+
 class InputHandler(object):
 
     HANDLERS = {}
@@ -11,17 +21,35 @@ class InputHandler(object):
         self.protocol = protocol
         self.HANDLERS.setdefault('load', {})
         self.HANDLERS.setdefault('save', {})
+        self.HANDLERS.setdefault('save_args', {})  # protocol -> arg names, or None for all
+        self.HANDLERS.setdefault('batch', {})  # protocol -> whether saver saves in batch
 
     def save(self, data, genealogy):
         """Save data by registered function.
         """
         if not self.protocol:
             return data
-        kwargs = locals()
-        kwargs.pop('self')
-        func = self.HANDLERS['save'][self.protocol]
-        args = inspect.formatargspec(*inspect.getargspec(func))
-        return func(**{k: v for k, v in kwargs.items() if k in args})
+        if self.HANDLERS['batch'][self.protocol]:
+            return self.HANDLERS['save'][self.protocol]([(data, genealogy)])[0]
+        return self._save(data, genealogy)
+
+    def save_batch(self, items):
+        """Save a list of (data, genealogy) by registered function and
+        return the list of results. Data are saved at once if the function is
+        registered with batch=True, or one by one otherwise.
+        """
+        if not self.protocol:
+            return [data for data, _ in items]
+        if self.HANDLERS['batch'][self.protocol]:
+            return self.HANDLERS['save'][self.protocol](items)
+        return [self._save(data, genealogy) for data, genealogy in items]
+
+    def _save(self, data, genealogy):
+        kwargs = {'data': data, 'genealogy': genealogy}
+        args = self.HANDLERS['save_args'][self.protocol]
+        if args is not None:
+            kwargs = {k: v for k, v in kwargs.items() if k in args}
+        return self.HANDLERS['save'][self.protocol](**kwargs)
 
     def load(self, from_save):
         """Load data by registered function.
@@ -30,15 +58,22 @@ class InputHandler(object):
             return from_save
         return self.HANDLERS['load'][self.protocol](from_save)
 
-    def saver(self, protocol=None):
+    def saver(self, protocol=None, batch=False):
         """Return a decorator to register function to save data for specific
         protocol.
+
+        The function is called with data and genealogy, or the arguments it
+        accepts. If batch is True, the function is called with a list of
+        (data, genealogy) and returns the list of results, so it could save
+        them concurrently.
         """
         protocol = protocol or self.protocol
         assert protocol is not None
 
         def decorator(func):
             self.HANDLERS['save'][protocol] = func
+            self.HANDLERS['batch'][protocol] = batch
+            self.HANDLERS['save_args'][protocol] = get_arg_names(func)
 
             @wraps(func)
             def wrapper(*args, **kwargs):
@@ -10,6 +10,9 @@ with Job('Job Title') as job:
         Action(cmd='sleep 10', _role='shell')
 """
 
+# local modules
+from mass.exception import InvalidDependency
+
 
 class Base(dict):
     """The base object of Job, Task and Action
@@ -28,7 +31,22 @@ class Base(dict):
         self._kwargs = kwargs
         if Base.__stack:
             last = Base.__stack[-1]
-            last[last.__class__.__name__]['children'].append(self)
+            siblings = last[last.__class__.__name__]['children']
+            if '_depends_on' in kwargs:
+                self[self.__class__.__name__]['_depends_on'] = [
+                    self.__index(siblings, d) for d in kwargs['_depends_on']]
+            siblings.append(self)
+
+    @staticmethod
+    def __index(siblings, sibling):
+        """Return the index of sibling, which could be given as index.
+        """
+        if isinstance(sibling, int):
+            return sibling
+        for i, s in enumerate(siblings):
+            if s is sibling:
+                return i
+        raise InvalidDependency('%s is not a previous sibling.' % sibling)
 
     def __str__(self):
         kwargs = ', '.join(['%s=%r' % (k, v) for k, v in self._kwargs.items()])
@@ -63,6 +81,9 @@ class Job(Base):
         title (str): The title of a Job.
         parallel (Optional[bool]): Run sub-tasks and sub-actions parallelly
             if True. Defaults to False.
+        max_parallel (Optional[int]): The max number of sub-tasks and
+            sub-actions running at the same time if parallel is True.
+            Defaults to no limit.
     """
 
     def __init__(self, title, **kwargs):
@@ -78,6 +99,12 @@ class Task(Base):
         title (str): The title of a Task.
         parallel (Optional[bool]): Run sub-tasks and sub-actions parallelly
             if True. Defaults to False.
+        max_parallel (Optional[int]): The max number of sub-tasks and
+            sub-actions running at the same time if parallel is True.
+            Defaults to no limit.
+        _depends_on (Optional[list]): The previous sibling tasks and actions,
+            or their indexes, which must be completed before this one starts
+            if the parent is parallel.
     """
 
     def __init__(self, title, **kwargs):
@@ -93,6 +120,12 @@ class Action(Base):
         _role (Optional[str]): The role name of registered funciton to process
             input. If role is None, print inputs without any processing.
             Defaults to None.
+        _depends_on (Optional[list]): The previous sibling tasks and actions,
+            or their indexes, which must be completed before this one starts
+            if the parent is parallel.
+        _inline (Optional[bool]): Run the action in the decider instead of a
+            worker, which is for trivial actions. Actions of roles in
+            INLINE_ROLES of SWF config are also run in the decider.
         kwargs: The keyword arguments to be forwarded to the registered role
             function.
     """
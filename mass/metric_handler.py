@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from functools import wraps
+
+
+class MetricHandler(object):
+
+    HANDLERS = {}
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def emit(self, name, metrics):
+        """Deliver metrics to registered functions.
+        """
+        for func in self.HANDLERS.get(name, []):
+            func(metrics)
+
+    def collector(self, name=None):
+        """Return a decorator to register function to collect specific
+        metrics, e.g. "decision".
+        """
+        name = name or self.name
+        assert name is not None
+        if name not in self.HANDLERS:
+            self.HANDLERS[name] = []
+
+        def decorator(func):
+            self.HANDLERS[name].append(func)
+
+            @wraps(func)
+            def wrapper(metrics):
+                func(metrics)
+            return wrapper
+        return decorator
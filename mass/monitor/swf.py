@@ -6,12 +6,11 @@ from collections import defaultdict
 from datetime import datetime
 
 # 3rd-party modules
-from botocore.client import Config
 import arrow
-import boto3
 
 # local modules
 from mass.scheduler.swf import config
+from mass.scheduler.swf.utils import get_client
 
 
 def workflows_to_jobs(workflows):
@@ -53,11 +52,7 @@ def datetime_to_timestamp(data):
 
 
 def list_workflow_executions(region, domain, **kwargs):
-    client = boto3.client(
-        'swf',
-        region_name=self.region,
-        config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                      read_timeout=config.READ_TIMEOUT))
+    client = get_client(region)
     paginator = client.get_paginator('list_closed_workflow_executions')
     for res in paginator.paginate(domain=domain, **kwargs):
         for workflow in res.get('executionInfos', []):
@@ -69,21 +64,13 @@ def list_workflow_executions(region, domain, **kwargs):
 
 
 def describe_workflow_execution(region, domain, **kwargs):
-    client = boto3.client(
-        'swf',
-        region_name=self.region,
-        config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                      read_timeout=config.READ_TIMEOUT))
+    client = get_client(region)
     res = client.describe_workflow_execution(domain=domain, **kwargs)
     return res
 
 
 def get_workflow_execution_history(region, domain, **kwargs):
-    client = boto3.client(
-        'swf',
-        region_name=self.region,
-        config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                      read_timeout=config.READ_TIMEOUT))
+    client = get_client(region)
     paginator = client.get_paginator('get_workflow_execution_history')
     for res in paginator.paginate(domain=domain, **kwargs):
         for event in res['events']:
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Content-addressed store of payloads on a local or shared file system.
+
+Payloads are saved in files named by the SHA-256 digest of their content, so
+identical payloads are saved once. Saving a payload again updates the
+modification time of its file, and gc() removes the payloads which are not
+saved for a given age.
+
+The store could be used as a protocol of InputHandler:
+
+PayloadStore('/mnt/shared/mass').register('store')
+submit(job, protocol='store')
+"""
+
+# built-in modules
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+# local modules
+from mass.input_handler import InputHandler
+
+KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class PayloadStore(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def key_path(self, key):
+        """Return the path of payload file of key. Raise ValueError if key
+        is not a SHA-256 digest, so a key never refers outside the store.
+        """
+        if not isinstance(key, str) or not KEY_PATTERN.fullmatch(key):
+            raise ValueError('Invalid key of payload: %r' % (key,))
+        return os.path.join(self.path, key[:2], key)
+
+    def put(self, payload):
+        """Save payload string and return its key.
+        """
+        data = payload.encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()
+        path = self.key_path(key)
+        try:
+            os.utime(path, None)
+            return key
+        except OSError:
+            pass
+
+        # Write to a temporary file and rename it, so a partial payload is
+        # never read by others.
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(data)
+            os.rename(tmp_path, path)
+        except:
+            os.remove(tmp_path)
+            raise
+        return key
+
+    def get(self, key):
+        """Return the payload string of key.
+        """
+        with open(self.key_path(key), 'rb') as fp:
+            return fp.read().decode('utf-8')
+
+    def put_many(self, payloads, max_workers=8):
+        """Save payload strings concurrently and return their keys.
+        """
+        if len(payloads) <= 1:
+            return [self.put(payload) for payload in payloads]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(self.put, payloads))
+
+    def gc(self, max_age):
+        """Remove payloads which are not saved in max_age seconds and return
+        the number of removed payloads.
+        """
+        deadline = time.time() - max_age
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if os.path.getmtime(path) < deadline:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    # Removed by another collector.
+                    pass
+        return removed
+
+    def register(self, protocol):
+        """Register the store to save and load data of protocol.
+        """
+        handler = InputHandler(protocol)
+
+        @handler.saver(batch=True)
+        def save(items):
+            return self.put_many([json.dumps(data) for data, _ in items])
+
+        @handler.loader()
+        def load(key):
+            return json.loads(self.get(key))
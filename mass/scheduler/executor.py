@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module defines the executors of worker to run actions apart from the
+polling loop, so that worker could keep sending heartbeats and cancel actions.
+
+Executors:
+
+process: fork a new process for each action.
+pool: reuse a pre-forked process, which is replaced after a number of actions,
+      on crash or on cancellation.
+thread: run actions in a thread of worker. It is for I/O-bound roles. A
+        cancelled action is abandoned since a thread could not be killed.
+"""
+
+# built-in modules
+from multiprocessing import Event, Pipe, Process, Queue
+import sys
+import threading
+import time
+import traceback
+
+# local modules
+from mass.exception import TaskError
+
+
+def run_action(execute, action):
+    """Execute action and return the result in dict.
+    """
+    start_time = time.time()
+    try:
+        result = execute(action)
+        execution_time = time.time() - start_time
+        return {
+            'status': 'completed',
+            'result': result,
+            'execution_time': execution_time
+        }
+    except TaskError as err:
+        return {
+            'status': 'failed',
+            'reason': err.reason,
+            'details': err.details,
+            'execution_time': time.time() - start_time
+        }
+    except Exception as e:
+        _, exc_value, _ = sys.exc_info()
+        return {
+            'status': 'failed',
+            'reason': repr(e),
+            'details': traceback.format_exc(),
+            'execution_time': time.time() - start_time
+        }
+
+
+def execute_action_proc(execute, action, event, queue):
+    try:
+        queue.put(run_action(execute, action))
+    finally:
+        event.set()
+
+
+def pool_proc(execute, conn, parent_conn):
+    # Close the end of worker inherited by fork, or EOF is never received.
+    parent_conn.close()
+    while True:
+        try:
+            action = conn.recv()
+        except EOFError:
+            return
+        conn.send(run_action(execute, action))
+
+
+def crashed_result(exitcode):
+    return {
+        'status': 'failed',
+        'reason': 'WorkerCrashed(exitcode=%r)' % exitcode,
+        'details': 'The process executing action exited unexpectedly.'
+    }
+
+
+class ProcessExecutor(object):
+
+    """Fork a new process for each action.
+    """
+
+    def submit(self, execute, action):
+        return ProcessTask(execute, action)
+
+    def shutdown(self):
+        pass
+
+
+class ProcessTask(object):
+
+    def __init__(self, execute, action):
+        self.event = Event()
+        self.queue = Queue()
+        self.proc = Process(
+            target=execute_action_proc,
+            args=(execute, action, self.event, self.queue))
+        self.proc.start()
+
+    def wait(self, timeout=None):
+        """Wait for the action to finish. Return True if it is finished.
+        """
+        return self.event.wait(timeout) or not self.proc.is_alive()
+
+    def result(self):
+        if not self.event.is_set():
+            self.proc.join()
+            return crashed_result(self.proc.exitcode)
+        result = self.queue.get()
+        self.proc.join()
+        return result
+
+    def cancel(self):
+        self.proc.terminate()
+        self.proc.join()
+
+
+class PoolExecutor(object):
+
+    """Execute actions in a pre-forked process.
+
+    The process inherits the modules of worker, so it does not need to import
+    the dependencies of roles for each action. It is replaced after max_tasks
+    actions, on crash or on cancellation.
+    """
+
+    def __init__(self, max_tasks, shutdown_timeout=5):
+        self.max_tasks = max_tasks
+        self.shutdown_timeout = shutdown_timeout
+        self.task_count = 0
+        self.proc = None
+        self.conn = None
+
+    def start(self, execute):
+        self.conn, child_conn = Pipe()
+        self.proc = Process(target=pool_proc, args=(execute, child_conn, self.conn))
+        self.proc.daemon = True
+        self.proc.start()
+        child_conn.close()
+        self.task_count = 0
+
+    def submit(self, execute, action):
+        if self.proc is None or not self.proc.is_alive() or self.task_count >= self.max_tasks:
+            self.shutdown()
+            self.start(execute)
+        self.task_count += 1
+        self.conn.send(action)
+        return PoolTask(self)
+
+    def shutdown(self, terminate=False):
+        if self.proc is None:
+            return
+        if terminate:
+            self.proc.terminate()
+        self.conn.close()
+        self.proc.join(self.shutdown_timeout)
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join()
+        self.proc = None
+        self.conn = None
+
+
+class PoolTask(object):
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    def wait(self, timeout=None):
+        """Wait for the action to finish. Return True if it is finished or
+        the process crashed.
+        """
+        return self.executor.conn.poll(timeout) or not self.executor.proc.is_alive()
+
+    def result(self):
+        try:
+            return self.executor.conn.recv()
+        except (EOFError, OSError):
+            self.executor.proc.join(self.executor.shutdown_timeout)
+            exitcode = self.executor.proc.exitcode
+            self.executor.shutdown(terminate=True)
+            return crashed_result(exitcode)
+
+    def cancel(self):
+        self.executor.shutdown(terminate=True)
+
+
+class ThreadExecutor(object):
+
+    """Run actions in a thread of worker.
+    """
+
+    def submit(self, execute, action):
+        return ThreadTask(execute, action)
+
+    def shutdown(self):
+        pass
+
+
+class ThreadTask(object):
+
+    def __init__(self, execute, action):
+        self.event = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(execute, action))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, execute, action):
+        try:
+            self._result = run_action(execute, action)
+        finally:
+            self.event.set()
+
+    def wait(self, timeout=None):
+        return self.event.wait(timeout)
+
+    def result(self):
+        return self._result
+
+    def cancel(self):
+        pass
+
+
+def create_executor(name, max_tasks=None):
+    """Return executor by name, which is "process", "pool" or "thread".
+    """
+    if name == 'process':
+        return ProcessExecutor()
+    elif name == 'pool':
+        return PoolExecutor(max_tasks)
+    elif name == 'thread':
+        return ThreadExecutor()
+    else:
+        raise ValueError('Unknown executor: %r' % name)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module implements a scheduler which executes mass jobs in local
+process without SWF, e.g. for tests and small jobs.
+
+Actions are executed by the roles registered on worker in a thread pool or a
+process pool. Tasks are coordinated in threads of the local process, so
+nested parallel tasks never wait for a slot of the pool.
+"""
+
+# built-in modules
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait)
+import json
+import threading
+
+# local modules
+from mass.dependency import get_dependencies
+from mass.exception import TaskError
+from mass.scheduler.executor import run_action
+from mass.scheduler.swf import config
+from mass.scheduler.worker import BaseWorker
+
+
+class LocalScheduler(object):
+
+    """Execute mass jobs in local process.
+
+    Args:
+        worker (Optional[BaseWorker]): The worker which the roles are
+            registered on. Defaults to BaseWorker().
+        executor (Optional[str]): "thread" or "process". Defaults to "thread".
+        max_workers (Optional[int]): The size of the pool.
+        activity_max_retry (Optional[int]): The max retry count of action.
+            Defaults to config.ACTIVITY_MAX_RETRY.
+        workflow_max_retry (Optional[int]): The max retry count of task.
+            Defaults to config.WORKFLOW_MAX_RETRY.
+    """
+
+    def __init__(self, worker=None, executor='thread', max_workers=None,
+                 activity_max_retry=None, workflow_max_retry=None):
+        self.worker = worker or BaseWorker()
+        self.executor = executor
+        self.max_workers = max_workers
+        self.activity_max_retry = config.ACTIVITY_MAX_RETRY \
+            if activity_max_retry is None else activity_max_retry
+        self.workflow_max_retry = config.WORKFLOW_MAX_RETRY \
+            if workflow_max_retry is None else workflow_max_retry
+        self.pool = None
+
+    def run(self, job):
+        """Execute job and wait for it. Raise TaskError if job is failed.
+        """
+        # Inputs are passed as JSON like SWF does.
+        job = json.loads(json.dumps(job))
+        if self.executor == 'thread':
+            self.pool = ThreadPoolExecutor(self.max_workers)
+        elif self.executor == 'process':
+            self.pool = ProcessPoolExecutor(self.max_workers)
+        else:
+            raise ValueError('Unknown executor: %r' % self.executor)
+        try:
+            self.execute_task(job)
+        finally:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def execute_task(self, task):
+        """Execute children of task. If a child is failed, execute the actions
+        of task which run when error and raise the error.
+        """
+        type_ = 'Job' if 'Job' in task else 'Task'
+        parallel = task[type_].get('parallel', False)
+        children = task[type_]['children']
+        try:
+            if parallel:
+                self.execute_parallel(children, task[type_].get('max_parallel'))
+            else:
+                for child in children:
+                    if 'Action' in child and child['Action']['_whenerror']:
+                        continue
+                    self.wait(child, self.submit(child))
+        except TaskError:
+            for child in task[type_]['children']:
+                if 'Action' in child and child['Action']['_whenerror']:
+                    self.wait(child, self.submit(child))
+            raise
+
+    def execute_parallel(self, children, max_parallel=None):
+        """Execute children after the siblings which they depend on are
+        completed, with at most max_parallel children running.
+        """
+        pending = [i for i, c in enumerate(children)
+                   if not ('Action' in c and c['Action']['_whenerror'])]
+        window = max_parallel or len(pending)
+        running = {}  # future -> (index of child, retry count)
+        completed = set()
+        while pending or running:
+            for i in [i for i in pending if all(
+                    d in completed for d in get_dependencies(children[i]))]:
+                if len(running) >= window:
+                    break
+                pending.remove(i)
+                running[self.submit(children[i])] = (i, 0)
+            if not running:
+                raise TaskError('Unsatisfiable dependencies',
+                                'Children %s could not be executed.' % pending)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, retry_count = running.pop(future)
+                # Failed actions are retried without blocking the siblings.
+                if self.can_retry(children[i], future, retry_count):
+                    running[self.submit(children[i])] = (i, retry_count + 1)
+                    continue
+                self.wait(children[i], future, retry_count)
+                completed.add(i)
+
+    def submit(self, node):
+        """Start executing node and return a future of it.
+        """
+        if 'Action' in node:
+            return self.pool.submit(run_action, self.worker.execute, node)
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.execute_task_with_retry(node))
+            except BaseException as e:
+                future.set_exception(e)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return future
+
+    def can_retry(self, node, future, retry_count):
+        """Return True if node is a failed action which could be retried.
+        """
+        return ('Action' in node and future.result()['status'] == 'failed' and
+                retry_count < self.activity_max_retry)
+
+    def wait(self, node, future, retry_count=0):
+        """Wait for the future of node. Failed actions are retried. Raise
+        TaskError if node is failed.
+        """
+        if 'Action' not in node:
+            return future.result()
+        result = future.result()
+        while result['status'] == 'failed' and retry_count < self.activity_max_retry:
+            retry_count += 1
+            result = self.pool.submit(run_action, self.worker.execute, node).result()
+        if result['status'] == 'failed':
+            raise TaskError(result['reason'], result['details'])
+        return result['result']
+
+    def execute_task_with_retry(self, task):
+        retry_count = 0
+        while True:
+            try:
+                return self.execute_task(task)
+            except TaskError:
+                if retry_count >= self.workflow_max_retry:
+                    raise
+                retry_count += 1
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module defines the metrics of workers, which are counters and
+histograms of each role.
+
+A worker records metrics to WorkerMetrics directly, or to QueueRecorder if it
+is forked by a farm, so the metrics of all workers are aggregated by the
+process which starts the farm. serve() exposes aggregated metrics over HTTP in
+the text format of Prometheus.
+"""
+
+# built-in modules
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import bisect
+import threading
+import time
+
+# The upper bounds in seconds of the buckets of histograms.
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600, float('inf'))
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class WorkerMetrics(object):
+
+    """Counters and histograms of roles.
+
+    Counters:
+        completed, failed, cancelled: The number of actions by result.
+        heartbeat_failures: The number of failed heartbeats.
+        polls, empty_polls: The number of polls and polls without task.
+        busy_seconds: The time to process tasks, which is used to compute the
+            utilization of the processes of role.
+
+    Histograms:
+        poll_wait: The time waiting for a task in poll.
+        schedule_to_start: The time from scheduling a task to polling it.
+        execution: The execution time of actions.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(float)  # (role, name) -> value
+        self.histograms = defaultdict(Histogram)  # (role, name) -> histogram
+        self.processes = defaultdict(int)  # role -> number of processes
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, kind, role, name, value=1):
+        """Record value of metric, kind is "counter" or "histogram".
+        """
+        with self.lock:
+            if kind == 'counter':
+                self.counters[(role, name)] += value
+            else:
+                self.histograms[(role, name)].observe(value)
+
+    def count(self, role, name, value=1):
+        self.record('counter', role, name, value)
+
+    def observe(self, role, name, value):
+        self.record('histogram', role, name, value)
+
+    def add_processes(self, role, number):
+        with self.lock:
+            self.processes[role] += number
+
+    def utilization(self, role):
+        """Return the ratio of time which the processes of role are busy.
+        """
+        uptime = time.time() - self.start_time
+        if not self.processes[role] or uptime <= 0:
+            return None
+        return self.counters[(role, 'busy_seconds')] / (self.processes[role] * uptime)
+
+    def render(self):
+        """Return metrics in the text format of Prometheus.
+        """
+        lines = []
+        with self.lock:
+            for (role, name), value in sorted(self.counters.items()):
+                lines.append('mass_worker_%s_total{role="%s"} %s' % (name, role, value))
+            for (role, name), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append('mass_worker_%s_seconds_bucket{role="%s",le="%s"} %d' % (
+                        name, role, '+Inf' if bound == float('inf') else bound, cumulative))
+                lines.append('mass_worker_%s_seconds_sum{role="%s"} %s' % (
+                    name, role, histogram.sum))
+                lines.append('mass_worker_%s_seconds_count{role="%s"} %d' % (
+                    name, role, histogram.count))
+            for role, number in sorted(self.processes.items()):
+                lines.append('mass_worker_processes{role="%s"} %d' % (role, number))
+        for role in sorted(self.processes):
+            lines.append('mass_worker_utilization{role="%s"} %.4f' % (
+                role, self.utilization(role)))
+        return '\n'.join(lines) + '\n'
+
+    def collect(self, queue):
+        """Record metrics from queue of QueueRecorder until None is got.
+        """
+        for args in iter(queue.get, None):
+            self.record(*args)
+
+
+class QueueRecorder(object):
+
+    """Send metrics of a forked worker to the queue of WorkerMetrics.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def record(self, kind, role, name, value=1):
+        self.queue.put((kind, role, name, value))
+
+    def count(self, role, name, value=1):
+        self.record('counter', role, name, value)
+
+    def observe(self, role, name, value):
+        self.record('histogram', role, name, value)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    metrics = None
+
+    def do_GET(self):
+        data = self.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+def serve(metrics, host='localhost', port=9090):
+    """Serve metrics over HTTP in a daemon thread and return the server.
+    """
+    handler = type('RequestHandler', (RequestHandler,), {'metrics': metrics})
+    server = _ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
@@ -6,103 +6,472 @@
 
 # built-in modules
 from __future__ import print_function
-from functools import reduce, wraps
-from multiprocessing import Event, Process, Queue
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process, Queue
+import calendar
 import json
+import random
 import signal
 import socket
 import sys
+import threading
 import time
 import traceback
 
-# 3rd-party modules
-from botocore.client import Config
-import boto3
-
 # local modules
+from mass.dependency import get_dependencies, get_offsets, has_dependencies
 from mass.exception import TaskError, TaskWait
 from mass.input_handler import InputHandler
 from mass.scheduler.swf import config
 from mass.scheduler.swf.decider import Decider
+from mass.scheduler.swf.node_table import expand_node, load_table
+from mass.scheduler.executor import create_executor, run_action
+from mass.scheduler.metrics import QueueRecorder, WorkerMetrics, serve
 from mass.scheduler.swf.step import StepHandler, ChildWorkflowExecution, ActivityTask
+from mass.scheduler.swf.utils import decode, encode, get_client, load_input, resolve, spill
 from mass.scheduler.worker import BaseWorker
+from mass.tracer import Tracer
+
+# The control of actions which run when error, so they are never counted as
+# children of a parallel task.
+WHENERROR_CONTROL = 'whenerror'
+
+
+def count_max_serial_children(node):
+    """Return the max number of descendants of node which run serially.
+    """
+    if 'Action' in node:
+        return 0
+    type_ = [k for k in node.keys()][0]
+    if '_serial' in node[type_]:  # task of node table
+        return node[type_]['_serial']
+    children = node[type_]['children']
+    counts = [count_max_serial_children(c) + 1 for c in children]
+    if node[type_].get('parallel', False):
+        if has_dependencies(children):
+            # The length of the critical path of dependencies.
+            offsets = get_offsets(children, counts)
+            return max(o + c for o, c in zip(offsets, counts))
+        return max(counts) if counts else 0
+    else:
+        return sum(counts)
+
+
+def get_priorities(root, root_priority):
+    """Return priorities of all children of root.
+
+    The number of serial descendants of each child is counted once, so it
+    takes linear time in the size of root. Children of parallel root are
+    prioritized by their offsets on the critical path of dependencies.
+    """
+    type_ = [k for k in root.keys()][0]
+    children = root[type_]['children']
+    if root[type_].get('parallel', False):  # parallel subtask
+        if has_dependencies(children):
+            counts = [count_max_serial_children(c) + 1 for c in children]
+            return [root_priority + 1 + o for o in get_offsets(children, counts)]
+        return [root_priority + 1] * len(children)
+
+    priorities = []
+    priority = root_priority + 1
+    for child in children:
+        priorities.append(priority)
+        priority += count_max_serial_children(child) + 1
+    return priorities
 
 
 def get_priority(root, root_priority, target_index):
-    def count_max_serial_children(task):
-        result = None
-        if 'Action' in task:
-            result = 0
-        elif task['Task'].get('parallel', False):
-            result = max(
-                [count_max_serial_children(c) + 1
-                 for c in task['Task']['children']])
-        else:
-            result = reduce(
-                lambda x, y: x + y,
-                [count_max_serial_children(c) + 1
-                 for c in task['Task']['children']])
-        return result
+    """Return priority of the child of target_index. Use get_priorities to get
+    priorities of all children.
+    """
     type_ = [k for k in root.keys()][0]
-    is_parallel = root[type_].get('parallel', False)
-    priority = None
+    if root[type_].get('parallel', False):  # parallel subtask
+        if has_dependencies(root[type_]['children']):
+            return get_priorities(root, root_priority)[target_index]
+        return root_priority + 1
     brothers = root[type_]['children'][:target_index]
-    if is_parallel:  # parallel subtask
-        priority = root_priority + 1
-    elif not brothers:
-        priority = root_priority + 1
-    else:
-        priority = reduce(
-            lambda x, y: x + y,
-            [count_max_serial_children(b) + 1
-             for b in brothers]) + root_priority + 1
-    return priority
+    return sum([count_max_serial_children(b) + 1 for b in brothers]) + root_priority + 1
+
+
+def is_inline(action):
+    """Return True if action runs in the decider instead of an activity task.
+    """
+    attrs = action['Action']
+    return bool(attrs.get('_inline')) or attrs['_role'] in config.INLINE_ROLES
+
+
+def can_inline(task):
+    """Return True if task is a serial task of actions, which could run in
+    the workflow execution of its parent instead of a child workflow.
+    """
+    attrs = task['Task']
+    return not attrs.get('parallel', False) and all(
+        'Action' in c and not c['Action']['_whenerror'] for c in attrs['children'])
+
+
+def get_batches(children, indexes, consecutive=True):
+    """Group indexes of children into batches, which are scheduled as one
+    step each. Actions of a role in config.ACTIVITY_BATCH_SIZE are packed into
+    batches of at most that size, and other children are batches of their own.
+    Only adjacent actions are packed if consecutive.
+    """
+    batches = []
+    open_batches = {}  # role -> the batch which actions of role are packed into
+    for i in indexes:
+        child = children[i]
+        role, size = None, 1
+        if 'Action' in child and not is_inline(child):
+            role = child['Action']['_role']
+            size = config.ACTIVITY_BATCH_SIZE.get(role, 1)
+        batch = open_batches.get(role)
+        if size > 1 and batch is not None and len(batch) < size:
+            batch.append(i)
+            continue
+        if consecutive:
+            open_batches.clear()
+        batch = [i]
+        batches.append(batch)
+        if size > 1:
+            open_batches[role] = batch
+    return batches
+
+
+def to_timestamp(datetime_):
+    """Return POSIX timestamp of datetime in UTC.
+    """
+    return calendar.timegm(datetime_.utctimetuple()) + datetime_.microsecond / 1e6
+
+
+def get_backoff_delay(retry):
+    """Return the delay in seconds before polling again after retry
+    consecutive errors. It is a random number up to the exponential backoff,
+    so that throttled pollers do not retry at the same time.
+    """
+    backoff = config.POLL_BACKOFF_BASE * 2 ** min(retry, 32)
+    return random.uniform(0, min(backoff, config.POLL_BACKOFF_MAX))
+
+
+def run_forever(func, args=()):
+    """Call func repeatedly to poll and process tasks.
+
+    Polling SWF is a long poll, so func is called again immediately after it
+    returns. It backs off only after errors, e.g. throttling, and the backoff
+    is reset once func succeeds.
+    """
+    retry = 0
+    while True:
+        try:
+            func(*args)
+        except Exception:
+            traceback.print_exc()
+            time.sleep(get_backoff_delay(retry))
+            retry += 1
+        else:
+            retry = 0
 
 
 class SWFDecider(Decider):
 
+    def __init__(self, domain, region):
+        super(SWFDecider, self).__init__(domain, region)
+        self.pending = []  # steps to schedule after their inputs are saved
+
     def run(self, task_list):
         """Poll decision task from SWF and process.
         """
         events = self.poll(task_list)
-        if not events:
+        if events is None:
             return
-        self.handler = StepHandler(
-            events,
-            activity_max_retry=config.ACTIVITY_MAX_RETRY,
-            workflow_max_retry=config.WORKFLOW_MAX_RETRY)
-        try:
-            result = self.execute()
-            if self.handler.is_waiting():
-                raise TaskWait
-        except TaskWait:
-            self.suspend()
-        except TaskError:
-            _, error, _ = sys.exc_info()
-            self.fail(error.reason, error.details)
-        except:
-            _, error, _ = sys.exc_info()
-            self.fail(repr(error), json.dumps(traceback.format_exc()))
+        with self.timer('parse', exclude=['paginate', 'load_input']):
+            self.handler = self.load_handler(events)
+        latencies = self.handler.latencies()
+        for name, latency in latencies:
+            self.log_handler.log('info', 'Step %s latency: %.3f seconds' % (name, latency))
+        self.metrics['history_size'] = self.handler.last_event_id
+        self.metrics['latencies'] = latencies
+
+        workflow_id = self.workflow_execution['workflowId']
+        self.decision_span_id = '%s:decision:%d' % (workflow_id, self.started_event_id)
+        with self.tracer.span('decision', self.trace_id, self.decision_span_id,
+                              parent_id=workflow_id, start_time=self.poll_time,
+                              events=self.metrics['events']) as span:
+            try:
+                with self.timer('execute', exclude=['save_input']):
+                    result = self.execute()
+                    if self.handler.is_waiting():
+                        raise TaskWait
+            except TaskWait:
+                self.suspend()
+            except TaskError:
+                _, error, _ = sys.exc_info()
+                self.fail(error.reason, error.details)
+            except:
+                _, error, _ = sys.exc_info()
+                self.fail(repr(error), json.dumps(traceback.format_exc()))
+            else:
+                self.complete(result)
+            span['attributes']['decisions'] = len(self.decisions._data)
+
+    @property
+    def trace_id(self):
+        return self.handler.tag_list[0] if self.handler.tag_list else \
+            self.workflow_execution['workflowId']
+
+    def load_handler(self, events):
+        """Return step handler of the polled workflow execution.
+
+        Step handlers are cached as histories between decision tasks, so only
+        new events are applied to a cached handler and the replay resumes from
+        its checkpoint. Otherwise the handler is built from the whole history
+        and the replay starts from the first child.
+        """
+        handler = self.history.get(self.history_key)
+        self.metrics['cached'] = handler is not None
+        if handler is not None:
+            last_event_id = handler.last_event_id
+            handler.apply(events)
         else:
-            self.complete(result)
+            last_event_id = 0
+            handler = StepHandler(
+                events,
+                activity_max_retry=config.ACTIVITY_MAX_RETRY,
+                workflow_max_retry=config.WORKFLOW_MAX_RETRY)
+            self.metrics['durations']['load_input'] = handler.load_time
+        self.metrics['events'] = handler.last_event_id - last_event_id
+        self.history.put(self.history_key, handler)
+        return handler
 
     def execute(self):
         """Execute input of SWF workflow.
         """
         type_ = 'Job' if 'Job' in self.handler.input else 'Task'
         parallel = self.handler.input[type_].get('parallel', False)
-        for i, child in enumerate(self.handler.input[type_]['children']):
-            priority = get_priority(self.handler.input, self.handler.priority, i)
-            if 'Task' in child:
+        children = self.handler.input[type_]['children']
+        start = self.handler.resume()
+        if parallel:
+            self.execute_parallel(children, start, self.handler.input[type_].get('max_parallel'))
+            return
+        indexes = [i for i in range(start, len(children))
+                   if not ('Action' in children[i] and children[i]['Action']['_whenerror'])]
+        for batch in get_batches(children, indexes):
+            i = batch[-1]
+            child = children[i]
+            if 'Action' in child and is_inline(child):
+                self.execute_inline(child, str(i))
+                self.handler.commit(i + 1)
+                continue
+            priority = self.get_priority(i)
+            if len(batch) > 1:
+                self.execute_batch([children[j] for j in batch], priority)
+            elif 'Task' in child and self.get_inlined(i):
+                # The actions of inlined task are waited one by one.
+                self.execute_inlined(self.get_inlined(i), priority, i)
+                self.handler.commit(i + 1)
+                continue
+            elif 'Task' in child:
                 self.execute_task(child, priority)
-            elif 'Action' in child and not child['Action']['_whenerror']:
+            else:
                 self.execute_action(child, priority)
+            self.wait()
+            self.handler.commit(i + 1)
 
-            if not parallel:
-                self.wait()
-        if parallel:
-            for child in self.handler.input[type_]['children']:
-                self.wait()
+    def execute_parallel(self, children, start, max_parallel=None):
+        """Schedule children in parallel and wait for them.
+
+        Children are scheduled after the siblings which they depend on are
+        completed. At most max_parallel children are in flight, and the next
+        ones are scheduled as they are closed. At most config.MAX_DECISIONS
+        decisions are made in a decision task, including a timer firing
+        immediately which triggers the next decision to schedule the rest.
+        """
+        indexes = [i for i in range(start, len(children))
+                   if not ('Action' in children[i] and children[i]['Action']['_whenerror'])]
+        inline = set(i for i in indexes if 'Action' in children[i] and is_inline(children[i]))
+
+        # The steps after the checkpoint are of the children since start. The
+        # indexes of children are kept in the control of step, because
+        # children with dependencies are not scheduled in order and a batch
+        # of actions is scheduled as one step.
+        _, position = self.handler.checkpoint
+        steps = self.handler.events[position:position + len(indexes)]
+        for k, step in enumerate(steps):
+            if step.init_event().control == WHENERROR_CONTROL:
+                steps = steps[:k]  # actions when error follow a failed child
+                break
+        batches = [[int(i) for i in step.init_event().control.split(',')]
+                   if step.init_event().control else [indexes[k]]
+                   for k, step in enumerate(steps)]
+        last = -1
+        count = 0
+        covered = set(i for i in inline if (
+            self.get_inline_result(str(i)) or {}).get('status') == 'completed')
+        for batch in batches:
+            self.wait()
+            last = max([last] + batch)
+            covered.update(batch)
+            while count < len(indexes) and indexes[count] in covered:
+                count += 1
+            if count and last <= indexes[count - 1]:  # children before are all scheduled
+                self.handler.commit(indexes[count - 1] + 1)
+
+        completed = set(i for batch, step in zip(batches, steps)
+                        if step.status() == 'Completed' for i in batch)
+        in_flight = sum(len(batch) for batch, step in zip(batches, steps)
+                        if step.status() in ['Scheduled', 'Started'])
+        scheduled = set(i for batch in batches for i in batch)
+
+        # Inline actions run as soon as they are ready, and so could their
+        # dependents in this decision. Their markers share the decision limit.
+        limit = config.MAX_DECISIONS - 1  # a decision is kept for the timer
+        deferred = False
+        while not deferred:
+            ready = [i for i in indexes if i not in scheduled and all(
+                d < start or d in completed for d in get_dependencies(children[i]))]
+            ready_inline = [i for i in ready if i in inline]
+            if not ready_inline:
+                break
+            for i in ready_inline:
+                if ('inline-%d' % i not in self.handler.markers and
+                        len(self.decisions._data) >= limit):
+                    deferred = True
+                    break
+                self.run_inline(children[i], str(i))
+                scheduled.add(i)
+                completed.add(i)
+        ready = [i for i in ready if i not in inline]
+        window = len(indexes) if max_parallel is None else max_parallel
+        room = limit - len(self.decisions._data)
+        quota = max(min(window - in_flight, room), 0)
+        for batch in get_batches(children, ready[:quota], consecutive=False):
+            i = batch[0]
+            if len(batch) > 1:
+                self.schedule_batch(
+                    [children[j] for j in batch], max(self.get_priority(j) for j in batch),
+                    control=','.join(str(j) for j in batch), parallel=True)
+            elif 'Task' in children[i]:
+                self.schedule_task(children[i], self.get_priority(i), control=str(i))
+            else:
+                self.schedule_action(children[i], self.get_priority(i), control=str(i))
+
+        if deferred or (len(ready) > quota and window - in_flight > room):
+            self.start_continuation()
+        remaining = len(indexes) - len(scheduled) - min(len(ready), quota)
+        if remaining > 0 and not in_flight and not ready and not deferred:
+            raise TaskError('Unsatisfiable dependencies',
+                            'Children %s could not be scheduled.' % sorted(
+                                set(indexes) - scheduled))
+        if self.pending or in_flight or remaining > 0:
+            raise TaskWait
+
+    def get_priority(self, index):
+        """Return priority of the child of index. Priorities of children are
+        computed once and kept with the step handler.
+        """
+        if self.handler.priorities is None:
+            self.handler.priorities = get_priorities(self.handler.input, self.handler.priority)
+        return self.handler.priorities[index]
+
+    def get_inlined(self, index):
+        """Return the task of index if it is inlined, else None. Tasks to
+        inline are planned once from the input, so every replay of the
+        workflow execution makes the same plan.
+        """
+        if self.handler.inlined is None:
+            self.handler.inlined = self.plan_inlined()
+        return self.handler.inlined.get(index)
+
+    def plan_inlined(self):
+        """Return {index: task} of the serial children to inline. A task is
+        inlined if it is a serial task of at most config.INLINE_TASK_MAX_ACTIONS
+        actions and the workflow execution stays within
+        config.INLINE_MAX_ACTIVITIES activities. Tasks are not inlined if they
+        could be retried as workflow executions.
+        """
+        max_actions = config.INLINE_TASK_MAX_ACTIONS
+        type_ = 'Job' if 'Job' in self.handler.input else 'Task'
+        if (not max_actions or self.handler.workflow_max_retry
+                or self.handler.input[type_].get('parallel', False)):
+            return {}
+
+        children = self.handler.input[type_]['children']
+        budget = config.INLINE_MAX_ACTIVITIES - sum(1 for c in children if 'Action' in c)
+        inlined = {}
+        for i, child in enumerate(children):
+            if 'Task' not in child:
+                continue
+            if '_node' in child['Task']:
+                if child['Task']['_serial'] > max_actions:
+                    continue
+                child = expand_node(
+                    load_table(self.handler.protocol, self.handler.table),
+                    child['Task']['_node'])
+            size = len(child['Task']['children'])
+            if size <= min(max_actions, budget) and can_inline(child):
+                inlined[i] = child
+                budget -= size
+        return inlined
+
+    def execute_inlined(self, task, priority, index):
+        """Schedule actions of task of index to SWF as activity tasks of this
+        workflow execution one by one. If they are not completed, raise
+        TaskWait.
+        """
+        tag_list = self.handler.tag_list + [task['Task']['title']]
+        priorities = get_priorities(task, priority)
+        for j, action in enumerate(task['Task']['children']):
+            if is_inline(action):
+                self.execute_inline(action, '%d.%d' % (index, j))
+                continue
+            self.execute_action(action, priorities[j], tag_list)
+            self.wait()
+
+    def execute_inline(self, action, name):
+        """Execute action in the decider after the pending steps. If they are
+        not completed, or the decision has no room for the marker, raise
+        TaskWait.
+        """
+        if self.handler.is_waiting():
+            raise TaskWait
+        if ('inline-%s' % name not in self.handler.markers and
+                len(self.decisions._data) >= config.MAX_DECISIONS - 1):
+            self.start_continuation()
+            raise TaskWait
+        return self.run_inline(action, name)
+
+    def start_continuation(self):
+        """Start a timer firing immediately, so the next decision makes the
+        decisions beyond MAX_DECISIONS of this one.
+        """
+        self.decisions.start_timer(
+            timer_id='schedule-%d' % self.handler.last_event_id, start_to_fire_timeout='0')
+
+    def run_inline(self, action, name):
+        """Execute action in the decider and record the result as a marker,
+        or return the result if it is recorded. If the action is failed, raise
+        TaskError.
+        """
+        result = self.get_inline_result(name)
+        if result is None:
+            name = 'inline-%s' % name
+            result = run_action(BaseWorker().execute, action)
+            result.pop('execution_time', None)
+            self.decisions.record_marker(name, spill(
+                encode(json.dumps(result)), config.MAX_DETAIL_SIZE,
+                self.handler.protocol, self.handler.tag_list + [name]))
+            self.handler.hold()
+            self.trace_schedule('inline', name)
+        if result['status'] != 'completed':
+            raise TaskError(result['reason'], result['details'])
+        return result['result']
+
+    def get_inline_result(self, name):
+        """Return the result of inline action recorded as a marker, or None
+        if it is not recorded.
+        """
+        details = self.handler.markers.get('inline-%s' % name)
+        if details is None:
+            return None
+        return json.loads(decode(resolve(details)))
 
     def execute_task(self, task, priority):
         """Schedule task to SWF as child workflow and wait. If the task is not
@@ -113,20 +482,38 @@ class SWFDecider(Decider):
         elif self.handler.is_scheduled():
             return
         else:
-            handler = InputHandler(self.handler.protocol)
-            ChildWorkflowExecution.start(
-                decisions=self.decisions,
-                name=self.handler.get_next_workflow_name(task['Task']['title']),
+            self.schedule_task(task, priority)
+
+    def schedule_task(self, task, priority, control=None):
+        """Schedule task to SWF as child workflow.
+        """
+        name = self.handler.get_next_workflow_name(task['Task']['title'])
+        genealogy = self.handler.tag_list + [task['Task']['title']]
+        if self.handler.table is not None:
+            self.schedule(
+                ChildWorkflowExecution.start,
+                name=name,
                 input_data={
                     'protocol': self.handler.protocol,
-                    'body': handler.save(
-                        data=task,
-                        genealogy=self.handler.tag_list + [task['Task']['title']])
+                    'table': self.handler.table,
+                    'node': task['Task']['_node']
                 },
-                tag_list=self.handler.tag_list + [task['Task']['title']],
-                priority=priority)
-
-    def execute_action(self, action, priority):
+                tag_list=genealogy,
+                priority=priority,
+                control=control)
+        else:
+            self.schedule(
+                ChildWorkflowExecution.start,
+                data=task,
+                genealogy=genealogy,
+                name=name,
+                input_data={'protocol': self.handler.protocol, 'body': None},
+                tag_list=genealogy,
+                priority=priority,
+                control=control)
+        self.trace_schedule('schedule', name)
+
+    def execute_action(self, action, priority, tag_list=None, control=None):
         """Schedule action to SWF as activity task and wait. If action is not
         completed, raise TaskWait.
         """
@@ -135,20 +522,129 @@ class SWFDecider(Decider):
         elif self.handler.is_scheduled():
             return
         else:
-            handler = InputHandler(self.handler.protocol)
-            action_name = self.handler.get_next_activity_name()
-            ActivityTask.schedule(
-                self.decisions,
-                name=action_name,
-                input_data={
-                    'protocol': self.handler.protocol,
-                    'body': handler.save(
-                        data=action,
-                        genealogy=self.handler.tag_list + ['Action%s' % action_name])
-                },
-                task_list=action['Action'].get('_role', config.ACTIVITY_TASK_LIST),
-                priority=priority
-            )
+            self.schedule_action(action, priority, control=control, tag_list=tag_list)
+
+    def schedule_action(self, action, priority, control=None, tag_list=None):
+        """Schedule action to SWF as activity task. The genealogy of action
+        is under tag_list, which defaults to the tag list of workflow.
+        """
+        action_name = self.handler.get_next_activity_name()
+        genealogy = (tag_list or self.handler.tag_list) + ['Action%s' % action_name]
+        self.schedule(
+            ActivityTask.schedule,
+            data=action,
+            genealogy=genealogy,
+            name=action_name,
+            input_data={
+                'protocol': self.handler.protocol,
+                'body': None,
+                'scheduled_time': self.get_scheduled_time(),
+                'genealogy': genealogy
+            },
+            task_list=action['Action'].get('_role', config.ACTIVITY_TASK_LIST),
+            priority=priority,
+            control=control
+        )
+        self.trace_schedule('schedule', action_name)
+
+    def execute_batch(self, actions, priority):
+        """Schedule actions of the same role to SWF as an activity task and
+        wait. If they are not completed, raise TaskWait.
+        """
+        if self.handler.is_waiting():
+            raise TaskWait
+        elif self.handler.is_scheduled():
+            return
+        else:
+            self.schedule_batch(actions, priority)
+
+    def schedule_batch(self, actions, priority, control=None, parallel=False):
+        """Schedule actions of the same role to SWF as an activity task. The
+        worker reports the result of each action, so failed actions are
+        retried without the completed ones. Actions of a serial batch are
+        executed one by one until one of them fails.
+        """
+        action_name = self.handler.get_next_activity_name()
+        genealogy = self.handler.tag_list + ['Action%s' % action_name]
+        self.schedule(
+            ActivityTask.schedule,
+            data=actions,
+            genealogy=genealogy,
+            name=action_name,
+            input_data={
+                'protocol': self.handler.protocol,
+                'body': None,
+                'scheduled_time': self.get_scheduled_time(),
+                'genealogy': genealogy,
+                'batch': True,
+                'parallel': parallel
+            },
+            task_list=actions[0]['Action']['_role'],
+            priority=priority,
+            control=control
+        )
+        self.trace_schedule('schedule', action_name)
+
+    def trace_schedule(self, name, step_name):
+        """Export a span of scheduling step in this decision.
+        """
+        if not self.tracer.EXPORTERS:
+            return
+        workflow_id = self.workflow_execution['workflowId']
+        self.tracer.event(
+            name, self.trace_id, '%s:schedule:%s' % (workflow_id, step_name),
+            parent_id=self.decision_span_id, step=step_name)
+
+    def closed(self, status):
+        """Export the span of workflow execution.
+        """
+        if not self.tracer.EXPORTERS:
+            return
+        workflow_id = self.workflow_execution['workflowId']
+        with self.tracer.span(
+                'workflow', self.trace_id, workflow_id,
+                parent_id=self.handler.parent_workflow_id or '%s:submit' % workflow_id,
+                start_time=to_timestamp(self.handler.start_time),
+                run_id=self.workflow_execution['runId'],
+                tag_list=self.handler.tag_list,
+                status=status):
+            pass
+
+    def get_scheduled_time(self):
+        """Return the time of this decision task as the time when activity
+        tasks are scheduled, which is reported by SWF, so it is the same in
+        replays of the decision and the clocks of deciders do not matter.
+        """
+        if self.handler.decision_time is None:
+            return None
+        return to_timestamp(self.handler.decision_time)
+
+    def schedule(self, func, data=None, genealogy=None, **kwargs):
+        """Schedule step by func of ActivityTask or ChildWorkflowExecution
+        with kwargs. If data is given, it is saved as the body of input with
+        the data of other steps of this decision in batch, so the step is
+        scheduled when the decision is responded.
+        """
+        self.pending.append((func, data, genealogy, kwargs))
+
+    def save_pending(self):
+        """Save the data of pending steps in batch and schedule them.
+        """
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        items = [(data, genealogy) for _, data, genealogy, _ in pending if data is not None]
+        if items:
+            with self.timer('save_input'):
+                bodies = iter(InputHandler(self.handler.protocol).save_batch(items))
+        for func, data, _, kwargs in pending:
+            if data is not None:
+                kwargs['input_data']['body'] = next(bodies)
+            func(decisions=self.decisions, **kwargs)
+
+    def respond(self):
+        self.save_pending()
+        super(SWFDecider, self).respond()
 
     def fail(self, reason, details):
         try:
@@ -159,8 +655,11 @@ class SWFDecider(Decider):
                     continue
                 if child['Action']['_whenerror'] is False:
                     continue
-                priority = get_priority(self.handler.input, self.handler.priority, i)
-                self.execute_action(child, priority)
+                if is_inline(child):
+                    self.execute_inline(child, str(i))
+                    continue
+                priority = self.get_priority(i)
+                self.execute_action(child, priority, control=WHENERROR_CONTROL)
                 self.wait()
         except TaskWait:
             self.suspend()
@@ -168,22 +667,29 @@ class SWFDecider(Decider):
             _, error, _ = sys.exc_info()
             super(SWFDecider, self).fail(
                 error.reason[:config.MAX_REASON_SIZE] if error.reason else error.reason,
-                error.details[:config.MAX_DETAIL_SIZE] if error.details else error.details)
+                self.spill_details(error.details))
         except:
             _, error, _ = sys.exc_info()
             super(SWFDecider, self).fail(
                 repr(error)[:config.MAX_REASON_SIZE],
-                traceback.format_exc()[:config.MAX_DETAIL_SIZE])
+                self.spill_details(traceback.format_exc()))
         else:
             super(SWFDecider, self).fail(
                 reason[:config.MAX_REASON_SIZE] if reason else reason,
-                details[:config.MAX_DETAIL_SIZE] if details else details)
+                self.spill_details(details))
+
+    def spill_details(self, details):
+        """Return details of failure, or a reference to them if they are
+        longer than config.MAX_DETAIL_SIZE.
+        """
+        return spill(details, config.MAX_DETAIL_SIZE, self.handler.protocol,
+                     self.handler.tag_list)
 
     def wait(self):
         """Check if the next step could be processed. If the previous step
         is submitted to SWF, processed and successful, return result.
         """
-        if self.decisions._data:
+        if self.decisions._data or self.pending:
             raise TaskWait
 
         with self.handler.pop() as step:
@@ -191,7 +697,8 @@ class SWFDecider(Decider):
                 return
             if step.status() in ['Failed', 'TimedOut']:
                 if step.should_retry():
-                    step.retry(self.decisions)
+                    step.retry(self.decisions, scheduled_time=self.get_scheduled_time())
+                    self.trace_schedule('retry', step.retry_name())
                     raise TaskWait
                 else:
                     error = step.error()
@@ -201,58 +708,45 @@ class SWFDecider(Decider):
                 return step.result()
 
 
-def execute_action_proc(execute, action, event, queue):
-    try:
-        start_time = time.time()
-        result = execute(action)
-        execution_time = time.time() - start_time
-        queue.put({
-            'status': 'completed',
-            'result': result,
-            'execution_time': execution_time
-        })
-    except TaskError as err:
-        queue.put({
-            'status': 'failed',
-            'reason': err.reason,
-            'details': err.details
-        })
-    except Exception as e:
-        _, exc_value, _ = sys.exc_info()
-        queue.put({
-            'status': 'failed',
-            'reason': repr(e),
-            'details': traceback.format_exc()
-        })
-    finally:
-        event.set()
-
-
 class SWFWorker(BaseWorker):
 
-    def __init__(self, domain=None, region=None):
+    def __init__(self, domain=None, region=None, executor=None):
         super(SWFWorker, self).__init__()
         self.domain = domain or config.DOMAIN
         self.region = region or config.REGION
-        self.client = boto3.client(
-            'swf',
-            region_name=self.region,
-            config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                          read_timeout=config.READ_TIMEOUT))
+        self._client = None
         self.decider = SWFDecider(self.domain, self.region)
         self.task_token = None
+        self.executor = executor or config.ACTIVITY_EXECUTOR
+        self.executors = {}
+        self.metrics = WorkerMetrics()
+        self.tracer = Tracer()
+        self.trace_id = None
+        self.span_id = None
+
+    @property
+    def client(self):
+        """SWF client of the current process, unless a client is set, e.g.
+        an emulator. It is resolved on each use, so a worker built before
+        fork uses the client of the forked process.
+        """
+        if self._client is not None:
+            return self._client
+        return get_client(self.region)
 
-    def try_except(self, exception=Exception, handler=print):
+    @client.setter
+    def client(self, client):
+        self._client = client
 
-        def decorator(func):
-            @wraps(func)
-            def wrapper(*args, **kwargs):
-                try:
-                    func(*args, **kwargs)
-                except exception as e:
-                    handler(e)
-            return wrapper
-        return decorator
+    def get_executor(self, action):
+        """Return executor of the role of action. Executors are created on
+        the first use, so that they are not shared by forked workers.
+        """
+        name = self.role_executors.get(action['Action'].get('_role'), self.executor)
+        if name not in self.executors:
+            self.executors[name] = create_executor(
+                name, max_tasks=config.ACTIVITY_POOL_MAX_TASKS)
+        return self.executors[name]
 
     def poll(self, task_list):
         """Poll activity task of specific task list from SWF.
@@ -274,65 +768,147 @@ class SWFWorker(BaseWorker):
         )
 
     def execute_action(self, action):
-        event = Event()
-        queue = Queue()
-        proc = Process(
-            target=execute_action_proc,
-            args=(self.execute, action, event, queue))
-        proc.start()
+        task = self.get_executor(action).submit(self.execute, action)
 
         # Send heartbeat.
         heartbeat_retry = 0
-        while not event.is_set():
-            event.wait(config.ACTIVITY_HEARTBEAT_INTERVAL)
+        heartbeat_count = 0
+        while not task.wait(config.ACTIVITY_HEARTBEAT_INTERVAL):
+            heartbeat_count += 1
+            self.tracer.event(
+                'heartbeat', self.trace_id,
+                '%s:heartbeat:%d' % (self.span_id, heartbeat_count),
+                parent_id=self.span_id)
             try:
                 res = self.heartbeat(self.task_token)
                 if res['cancelRequested']:
-                    proc.terminate()
-                    proc.join()
-                    return Result('cancelled', -1, '', '', '', -1)
+                    task.cancel()
+                    return {'status': 'cancelled'}
             except Exception as err:
+                self.metrics.count(
+                    action['Action'].get('_role') or config.ACTIVITY_TASK_LIST,
+                    'heartbeat_failures')
                 if heartbeat_retry <= config.ACTIVITY_HEARTBEAT_MAX_RETRY:
                     heartbeat_retry += 1
                     continue
                 else:
-                    proc.terminate()
-                    proc.join()
+                    task.cancel()
                     raise
 
         # Evaluate the result.
-        result = queue.get_nowait()
-        proc.join()
-        return result
+        return task.result()
+
+    def execute_batch(self, actions, results=None, parallel=False):
+        """Execute the actions of a batch which are not completed in results
+        of the last try. The batch is completed with the results of all
+        actions, or failed with them in details if any action fails. Actions
+        of a serial batch are executed in order and stop at the first failure,
+        so the results of the rest are None.
+        """
+        results = results or [None] * len(actions)
+        indexes = [i for i, r in enumerate(results) if not r or r['status'] != 'completed']
+        max_workers = config.ACTIVITY_BATCH_MAX_WORKERS
+        if self.role_executors.get(actions[0]['Action']['_role'], self.executor) == 'pool':
+            max_workers = 1  # a pre-forked process executes one action at a time
+        start_time = time.time()
+        if parallel and max_workers > 1 and len(indexes) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                outcomes = list(pool.map(self.execute_action, [actions[i] for i in indexes]))
+        else:
+            outcomes = []
+            for i in indexes:
+                outcomes.append(self.execute_action(actions[i]))
+                if outcomes[-1]['status'] != 'completed' and not parallel:
+                    break
+        execution_time = time.time() - start_time
+
+        for i, outcome in zip(indexes, outcomes):
+            if outcome['status'] == 'cancelled':
+                return outcome
+            outcome.pop('execution_time', None)
+            results[i] = outcome
+        failed = [r for r in results if r and r['status'] != 'completed']
+        if failed:
+            return {
+                'status': 'failed',
+                'reason': failed[0]['reason'],
+                'details': json.dumps(results),
+                'execution_time': execution_time
+            }
+        return {
+            'status': 'completed',
+            'result': [r['result'] for r in results],
+            'execution_time': execution_time
+        }
 
-    @try_except(Exception)
     def run(self, task_list):
         """Poll activity task from SWF and process.
         """
+        start_time = time.time()
         task = self.poll(task_list)
+        polled_time = time.time()
+        self.metrics.count(task_list, 'polls')
+        self.metrics.observe(task_list, 'poll_wait', polled_time - start_time)
         if not task:
+            self.metrics.count(task_list, 'empty_polls')
             return
 
-        activity_input = json.loads(task['input'])
-        handler = InputHandler(activity_input['protocol'])
-        action = handler.load(activity_input['body'])
-        result = self.execute_action(action)
-        if result['status'] == 'completed':
-            self.client.respond_activity_task_completed(
-                taskToken=self.task_token,
-                result=json.dumps(result['result'])[:config.MAX_RESULT_SIZE])
-        else:
-            self.client.respond_activity_task_failed(
-                taskToken=self.task_token,
-                details=result['details'][:config.MAX_DETAIL_SIZE],
-                reason=result['reason'][:config.MAX_REASON_SIZE])
+        workflow_id = task['workflowExecution']['workflowId']
+        activity_input = load_input(task['input'])
+        genealogy = activity_input.get('genealogy') or [workflow_id]
+        self.trace_id = genealogy[0]
+        self.span_id = '%s/%s' % (workflow_id, task['activityId'])
+        with self.tracer.span('activity', self.trace_id, self.span_id,
+                              parent_id=workflow_id, start_time=polled_time,
+                              role=task_list, genealogy=genealogy) as span:
+            self.process(task_list, activity_input, polled_time, span)
+
+    def process(self, task_list, activity_input, polled_time, span):
+        """Execute the action of polled activity task and respond the result.
+        """
+        try:
+            if activity_input.get('scheduled_time') is not None:
+                self.metrics.observe(task_list, 'schedule_to_start', max(
+                    polled_time - activity_input['scheduled_time'], 0))
+            handler = InputHandler(activity_input['protocol'])
+            action = handler.load(activity_input['body'])
+            if activity_input.get('batch'):
+                result = self.execute_batch(action, activity_input.get('results'),
+                                            activity_input.get('parallel', False))
+            else:
+                result = self.execute_action(action)
+            span['attributes']['status'] = result['status']
+            genealogy = activity_input.get('genealogy') or []
+            if result['status'] == 'completed':
+                self.client.respond_activity_task_completed(
+                    taskToken=self.task_token,
+                    result=spill(encode(json.dumps(result['result'])), config.MAX_RESULT_SIZE,
+                                 activity_input['protocol'], genealogy + ['result']))
+            elif result['status'] == 'cancelled':
+                self.client.respond_activity_task_canceled(
+                    taskToken=self.task_token)
+            else:
+                self.client.respond_activity_task_failed(
+                    taskToken=self.task_token,
+                    details=spill(result['details'], config.MAX_DETAIL_SIZE,
+                                  activity_input['protocol'], genealogy + ['details']),
+                    reason=result['reason'][:config.MAX_REASON_SIZE])
+            self.metrics.count(task_list, result['status'])
+            if 'execution_time' in result:
+                self.metrics.observe(task_list, 'execution', result['execution_time'])
+        finally:
+            self.metrics.count(task_list, 'busy_seconds', time.time() - polled_time)
 
-    def start(self, farm=None, domain=None, region=None):
+    def start(self, farm=None, domain=None, region=None, metrics_port=None):
         """Start workers for each role.
 
         The default number of workers for each role is 1. This setting could
         be adjusted by input farm setting.
 
+        Metrics of workers are aggregated in self.metrics. They are served
+        over HTTP on localhost if metrics_port or config.WORKER_METRICS_PORT
+        is set.
+
         e.g.
         farm = {
             "shell": 3,
@@ -344,13 +920,8 @@ class SWFWorker(BaseWorker):
             farm = {r: 1 for r in self.role_functions.keys()}
         processes = []
 
-        def infinite_run(func, args):
-            while True:
-                func(*args)
-                time.sleep(5)
-
         def start_proc(func, args):
-            p = Process(target=infinite_run, kwargs={'func': func, 'args': args})
+            p = Process(target=run_forever, kwargs={'func': func, 'args': args})
             p.start()
             processes.append(p)
 
@@ -359,11 +930,23 @@ class SWFWorker(BaseWorker):
         start_proc(decider.run, args=(config.DECISION_TASK_LIST,))
 
         # start worker
+        queue = Queue()
         for task_list, number in farm.items():
+            self.metrics.add_processes(task_list, number)
             for _ in range(number):
-                worker = self.__class__(domain or config.DOMAIN, region or config.REGION)
+                worker = self.__class__(
+                    domain or config.DOMAIN, region or config.REGION, self.executor)
+                worker.metrics = QueueRecorder(queue)
                 start_proc(worker.run, args=(task_list,))
 
+        # aggregate and serve metrics
+        collector = threading.Thread(target=self.metrics.collect, args=(queue,))
+        collector.daemon = True
+        collector.start()
+        metrics_port = metrics_port or config.WORKER_METRICS_PORT
+        if metrics_port:
+            serve(self.metrics, port=metrics_port)
+
         def sig_handler(signum, frame):
             for p in processes:
                 p.terminate()
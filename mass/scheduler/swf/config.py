@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+# built-in modules
+import os
+import tempfile
+
 # The name of AWS region.
 REGION = 'ap-northeast-1'
 
@@ -13,9 +17,38 @@ CONNECT_TIMEOUT = 50
 # The time in seconds till a timeout exception is thrown when attempting to read from a connection.
 READ_TIMEOUT = 70
 
+# The endpoint URL of SWF, e.g. "http://localhost:8080" of the SWF emulator.
+# The endpoint of REGION is used if it is None.
+ENDPOINT_URL = None
+
+# The max number of connections kept in the connection pool of SWF client,
+# which is shared in process, e.g. by the threads of executor.
+MAX_POOL_CONNECTIONS = 10
+
+# Whether to use TCP keep-alive for the connections of SWF client, so idle
+# connections between long polls are not dropped. It is ignored by botocore
+# which does not support it.
+TCP_KEEPALIVE = True
+
 # The maximum length of the input field that is sent to SWF.
 MAX_INPUT_SIZE = 32000
 
+# The directory of the content-addressed store of payloads. Inputs longer than
+# MAX_INPUT_SIZE are saved to the store and referred by their keys in SWF, so
+# it should be shared by submitters, deciders and workers on different hosts,
+# e.g. a mount of NFS.
+PAYLOAD_STORE_PATH = os.path.join(tempfile.gettempdir(), 'mass-payloads')
+
+# The age in seconds after which payloads are removed by "mass store gc".
+# It should be longer than the timeout of workflow execution, because retries
+# save their inputs again.
+PAYLOAD_STORE_MAX_AGE = 14 * 24 * 60 * 60
+
+# The codec to compress inputs and results sent to SWF, "zlib" or "lzma", or
+# None to send them as JSON. Compressed payloads are encoded in base64 with a
+# version marker, so they are decoded whatever the codec of receiver is.
+PAYLOAD_CODEC = None
+
 # The maximum length of the result field that is sent to SWF.
 MAX_RESULT_SIZE = 32000
 
@@ -59,9 +92,63 @@ ACTIVITY_HEARTBEAT_TIMEOUT = 60 * 60
 # The interval of activity heartbeat.
 ACTIVITY_HEARTBEAT_INTERVAL = 15 * 60  # for 900 workers
 
+# The base and the max of the exponential backoff in second before polling
+# again after an error, e.g. throttling.
+POLL_BACKOFF_BASE = 1
+POLL_BACKOFF_MAX = 60
+
+# The max number of decisions in a response of decision task, which is at
+# most 100 on SWF. The rest of parallel children are scheduled in the
+# following decision tasks, which are triggered by a timer firing
+# immediately. A decision of each response is kept for the timer.
+MAX_DECISIONS = 100
+
+# The max number of actions of a serial task which runs in the workflow
+# execution of its serial parent instead of a child workflow execution. Tasks
+# are not inlined if it is 0.
+INLINE_TASK_MAX_ACTIONS = 0
+
+# The max number of activity tasks of a workflow execution with inlined tasks,
+# which bounds the size of its history. Tasks beyond it run as child workflow
+# executions.
+INLINE_MAX_ACTIVITIES = 1000
+
+# The max number of consecutive or parallel actions of a role packed into an
+# activity task, e.g. {'shell': 10}. Actions of other roles are scheduled one
+# by one.
+ACTIVITY_BATCH_SIZE = {}
+
+# The max number of actions of a batch executed concurrently by a worker.
+# Actions of roles using the pool executor are executed one by one.
+ACTIVITY_BATCH_MAX_WORKERS = 1
+
+# The roles of actions which run in the decider instead of activity tasks,
+# e.g. [None] for actions without role. Their results are recorded as markers.
+# The roles must be registered in the process of decider and their actions
+# should finish in a small part of DECISION_TASK_START_TO_CLOSE_TIMEOUT.
+INLINE_ROLES = []
+
+# The max number of workflow execution histories cached by a decider.
+DECIDER_HISTORY_CACHE_SIZE = 1000
+
+# The max number of events folded into the histories cached by a decider.
+DECIDER_HISTORY_CACHE_MAX_EVENTS = 1000000
+
 # The max retry count of activity heartbeat.
 ACTIVITY_HEARTBEAT_MAX_RETRY = 2
 
+# The executor of actions. "process" forks a process for each action, "pool"
+# reuses a pre-forked process and "thread" runs actions in a thread of worker.
+ACTIVITY_EXECUTOR = 'process'
+
+# The max number of actions executed by a pre-forked process before it is
+# replaced.
+ACTIVITY_POOL_MAX_TASKS = 100
+
+# The port on localhost to serve metrics of workers started by
+# SWFWorker.start, e.g. 9090. Metrics are not served if it is None.
+WORKER_METRICS_PORT = None
+
 # The max retry count of activity task.
 ACTIVITY_MAX_RETRY = 2
 
@@ -6,16 +6,68 @@ results to SWF.
 """
 
 # built-in modules
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
 import socket
-
-# 3rd-party modules
-from botocore.client import Config
-import boto3
+import time
 
 # local modules
 from mass.log_handler import LogHandler
+from mass.metric_handler import MetricHandler
+from mass.tracer import Tracer
 from mass.scheduler.swf import config
 from mass.scheduler.swf.decisions import Decisions
+from mass.scheduler.swf.utils import get_client
+
+
+class HistoryCache(object):
+
+    """LRU cache of workflow execution histories.
+
+    A history is cached as an object folded from its events, e.g. a step
+    handler, which has the id of the last folded event as `last_event_id`.
+    The number of cached histories and the total number of events folded into
+    them are bounded to limit the memory usage of decider. A history could be
+    folded with new events in place, so its number of events is counted when
+    it is put.
+    """
+
+    def __init__(self, max_size, max_events):
+        self.max_size = max_size
+        self.max_events = max_events
+        self.event_count = 0
+        self._histories = OrderedDict()
+        self._sizes = {}  # key -> number of events counted when history is put
+
+    def __len__(self):
+        return len(self._histories)
+
+    def get(self, key):
+        """Return cached history of workflow execution or None.
+        """
+        history = self._histories.pop(key, None)
+        if history is not None:
+            self._histories[key] = history
+        return history
+
+    def put(self, key, history):
+        """Cache history of workflow execution and evict the least recently
+        used histories if the cache is full.
+        """
+        self.discard(key)
+        if history.last_event_id > self.max_events:
+            return
+        self._histories[key] = history
+        self._sizes[key] = history.last_event_id
+        self.event_count += history.last_event_id
+        while len(self._histories) > self.max_size or self.event_count > self.max_events:
+            evicted, _ = self._histories.popitem(last=False)
+            self.event_count -= self._sizes.pop(evicted)
+
+    def discard(self, key):
+        if self._histories.pop(key, None) is not None:
+            self.event_count -= self._sizes.pop(key)
 
 
 class Decider(object):
@@ -23,49 +75,161 @@ class Decider(object):
     def __init__(self, domain, region):
         self.domain = domain
         self.region = region
-        self.client = boto3.client(
-            'swf',
-            region_name=self.region,
-            config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                          read_timeout=config.READ_TIMEOUT))
+        self._client = None
         self.log_handler = LogHandler()
+        self.metric_handler = MetricHandler()
+        self.tracer = Tracer()
+        self.metrics = None
+        self.history = HistoryCache(
+            config.DECIDER_HISTORY_CACHE_SIZE,
+            config.DECIDER_HISTORY_CACHE_MAX_EVENTS)
+
+    @property
+    def client(self):
+        """SWF client of the current process, unless a client is set, e.g.
+        an emulator. It is resolved on each use, so a decider built before
+        fork uses the client of the forked process.
+        """
+        if self._client is not None:
+            return self._client
+        return get_client(self.region)
+
+    @client.setter
+    def client(self, client):
+        self._client = client
 
     def poll(self, task_list):
-        """Poll workflow execution history from SWF.
+        """Poll decision task from SWF.
+
+        Return an iterator of the events of workflow execution history which
+        are newer than the cached history, or None if there is no decision
+        task. Events are polled lazily while the iterator is consumed.
         """
         self.decisions = Decisions()
+        self.metrics = {'durations': {}}
         paginator = self.client.get_paginator('poll_for_decision_task')
-        events = []
-        for res in paginator.paginate(
-                domain=self.domain,
-                taskList={
-                    'name': task_list
-                },
-                identity=socket.gethostname()):
-            if 'events' not in res:
+        pages = iter(paginator.paginate(
+            domain=self.domain,
+            taskList={
+                'name': task_list
+            },
+            identity=socket.gethostname(),
+            reverseOrder=True))
+        with self.timer('poll'):
+            res = next(pages, {})
+        if not res.get('events'):
+            return None
+        self.poll_time = time.time()
+        self.task_token = res['taskToken']
+        self.workflow_execution = res['workflowExecution']
+        self.started_event_id = res['startedEventId']
+        self.previous_started_event_id = res.get('previousStartedEventId', 0)
+
+        history = self.history.get(self.history_key)
+        return self.iter_events(res, pages, history.last_event_id if history else 0)
+
+    def iter_events(self, res, pages, last_event_id):
+        """Iterate events newer than last_event_id in order.
+
+        The pages of decision task are in reverse order, so they are polled
+        until the event next to last_event_id is reached. If nothing is cached
+        and the history does not fit in the first page, the history is
+        streamed in order instead of holding all pages.
+        """
+        new_events = []
+        while res is not None:
+            page = [e for e in res['events'] if e['eventId'] > last_event_id]
+            new_events += page
+
+            # Event ids are consecutive, so all new events are polled once the
+            # event next to the cached ones is reached.
+            if len(page) < len(res['events']) or \
+                    (page and page[-1]['eventId'] == last_event_id + 1):
                 break
-            events += res['events']
-            self.task_token = res['taskToken']
-        return events
+            elif not last_event_id:
+                for event in self.iter_history():
+                    yield event
+                return
+            with self.timer('paginate'):
+                res = next(pages, None)
+
+        for event in reversed(new_events):
+            yield event
+
+    def iter_history(self):
+        """Iterate the history of polled workflow execution in order until
+        the start of decision task.
+        """
+        paginator = self.client.get_paginator('get_workflow_execution_history')
+        pages = iter(paginator.paginate(
+            domain=self.domain,
+            execution=self.workflow_execution,
+            reverseOrder=False))
+        while True:
+            with self.timer('paginate'):
+                res = next(pages, None)
+            if res is None:
+                return
+            for event in res['events']:
+                if event['eventId'] > self.started_event_id:
+                    return
+                yield event
+
+    @property
+    def history_key(self):
+        return (self.workflow_execution['workflowId'], self.workflow_execution['runId'])
+
+    @contextmanager
+    def timer(self, phase, exclude=()):
+        """Add the elapsed time of the block to the duration of phase in
+        metrics. The time of phases in exclude, which are timed inside the
+        block, is not added.
+        """
+        durations = self.metrics['durations']
+        excluded = sum(durations.get(p, 0) for p in exclude)
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start_time
+            elapsed -= sum(durations.get(p, 0) for p in exclude) - excluded
+            durations[phase] = durations.get(phase, 0) + elapsed
+
+    def respond(self):
+        """Respond decisions to SWF and deliver metrics of the decision task
+        to the collectors of "decision".
+        """
+        with self.timer('respond'):
+            self.client.respond_decision_task_completed(
+                taskToken=self.task_token,
+                decisions=self.decisions._data)
+        self.metrics.update({
+            'workflow_execution': self.workflow_execution,
+            'decisions': len(self.decisions._data),
+            'payload_bytes': len(json.dumps(self.decisions._data))})
+        self.metric_handler.emit('decision', self.metrics)
 
     def suspend(self):
-        self.client.respond_decision_task_completed(
-            taskToken=self.task_token,
-            decisions=self.decisions._data)
+        self.respond()
 
     def complete(self, result):
         """Report workflow execution completed.
         """
         self.decisions.complete_workflow_execution(result=result)
-        self.client.respond_decision_task_completed(
-            taskToken=self.task_token,
-            decisions=self.decisions._data)
+        self.respond()
+        self.history.discard(self.history_key)
+        self.closed('completed')
 
     def fail(self, reason, details):
         """Report workflow execution failed.
         """
         self.decisions.fail_workflow_execution(reason, details)
-        self.client.respond_decision_task_completed(
-            taskToken=self.task_token,
-            decisions=self.decisions._data)
+        self.respond()
+        self.history.discard(self.history_key)
+        self.closed('failed')
         self.log_handler.log('error', 'Reason: %s\nDetails: %s' % (reason, details))
+
+    def closed(self, status):
+        """Called after workflow execution is reported closed with status.
+        """
+        pass
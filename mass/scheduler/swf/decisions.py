@@ -87,6 +87,25 @@ class Decisions(object):
             attrs['taskStartToCloseTimeout'] = task_start_to_close_timeout
         self._data.append(o)
 
+    def start_timer(self, timer_id, start_to_fire_timeout, control=None):
+        o = {}
+        o['decisionType'] = 'StartTimer'
+        attrs = o['startTimerDecisionAttributes'] = {}
+        attrs['timerId'] = timer_id
+        attrs['startToFireTimeout'] = start_to_fire_timeout
+        if control is not None:
+            attrs['control'] = control
+        self._data.append(o)
+
+    def record_marker(self, marker_name, details=None):
+        o = {}
+        o['decisionType'] = 'RecordMarker'
+        attrs = o['recordMarkerDecisionAttributes'] = {}
+        attrs['markerName'] = marker_name
+        if details is not None:
+            attrs['details'] = details
+        self._data.append(o)
+
     def complete_workflow_execution(self, result=None):
         o = {}
         o['decisionType'] = 'CompleteWorkflowExecution'
@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""In-memory emulator of the SWF API used by mass, to run deciders and
+workers on one host without AWS.
+
+SWFEmulator implements the client methods which mass calls, so it could
+replace the client of decider and worker in process:
+
+emulator = SWFEmulator()
+decider.client = worker.client = emulator
+
+serve() exposes an emulator over HTTP with the JSON protocol of SWF, so
+boto3 clients of other processes could point at it by config.ENDPOINT_URL,
+e.g. "http://localhost:8080". boto3 still signs requests, so credentials
+have to be set, but they are not checked.
+
+Decision tasks, activity tasks, heartbeats, child workflow executions, timers,
+markers and history pagination are emulated. Timeouts and cancellation of
+activity tasks are not.
+"""
+
+# built-in modules
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import heapq
+import itertools
+import json
+import re
+import threading
+import uuid
+
+# 3rd-party modules
+from botocore.exceptions import ClientError
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+def fault(code, message, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+class WorkflowExecution(object):
+
+    """State of an emulated workflow execution.
+    """
+
+    def __init__(self, domain, workflow_id, workflow_type, task_list,
+                 task_priority, child_policy, tag_list, parent=None):
+        self.domain = domain
+        self.workflow_id = workflow_id
+        self.run_id = uuid.uuid4().hex
+        self.workflow_type = workflow_type
+        self.task_list = task_list
+        self.task_priority = task_priority
+        self.child_policy = child_policy
+        self.tag_list = tag_list
+        self.parent = parent  # (parent execution, initiated event id)
+        self.events = []
+        self.start_timestamp = now()
+        self.close_timestamp = None
+        self.close_status = None
+        self.children = {}  # initiated event id -> child execution
+        self.activities = {}  # activity id -> scheduled event id
+        self.decision_state = None  # None, "scheduled" or "started"
+        self.decision_needed = False
+        self.previous_started_event_id = 0
+
+    @property
+    def execution(self):
+        return {'workflowId': self.workflow_id, 'runId': self.run_id}
+
+    def add(self, event_type, **attributes):
+        event_id = len(self.events) + 1
+        self.events.append({
+            'eventId': event_id,
+            'eventType': event_type,
+            'eventTimestamp': now(),
+            event_type[0].lower() + event_type[1:] + 'EventAttributes': attributes})
+        return event_id
+
+    def info(self):
+        info = {
+            'execution': self.execution,
+            'workflowType': self.workflow_type,
+            'startTimestamp': self.start_timestamp,
+            'executionStatus': 'OPEN' if self.close_status is None else 'CLOSED',
+            'cancelRequested': False,
+            'tagList': self.tag_list}
+        if self.close_status is not None:
+            info['closeStatus'] = self.close_status
+            info['closeTimestamp'] = self.close_timestamp
+        if self.parent is not None:
+            info['parent'] = self.parent[0].execution
+        return info
+
+
+class Paginator(object):
+
+    """Paginator of emulator which follows nextPageToken like boto3.
+    """
+
+    def __init__(self, method):
+        self.method = method
+
+    def paginate(self, **kwargs):
+        while True:
+            res = self.method(**kwargs)
+            yield res
+            if not res.get('nextPageToken'):
+                return
+            kwargs['nextPageToken'] = res['nextPageToken']
+
+
+class SWFEmulator(object):
+
+    """In-memory emulator of SWF.
+
+    Args:
+        poll_timeout (Optional[float]): The time in seconds to wait for a
+            task in long polls. Defaults to 1.
+        page_size (Optional[int]): The default max number of events in a page
+            of history. Defaults to 1000 like SWF.
+    """
+
+    def __init__(self, poll_timeout=1, page_size=1000):
+        self.poll_timeout = poll_timeout
+        self.page_size = page_size
+        self.executions = {}  # run id -> workflow execution
+        self.open_executions = {}  # (domain, workflow id) -> workflow execution
+        self.activity_tasks = {}  # task token -> (execution, scheduled event id, started event id)
+        self._decision_queues = {}  # (domain, task list) -> heap of executions
+        self._activity_queues = {}  # (domain, task list) -> heap of activity tasks
+        self._counter = itertools.count()
+        self._lock = threading.Condition()
+
+    def get_paginator(self, operation_name):
+        return Paginator(getattr(self, operation_name))
+
+    def register_domain(self, **kwargs):
+        return {}
+
+    def register_workflow_type(self, **kwargs):
+        return {}
+
+    def register_activity_type(self, **kwargs):
+        return {}
+
+    # Workflow executions
+
+    def start_workflow_execution(self, domain, workflowId, workflowType, taskList=None,
+                                 taskPriority='0', input=None, tagList=None,
+                                 childPolicy='TERMINATE', **kwargs):
+        with self._lock:
+            if (domain, workflowId) in self.open_executions:
+                raise fault('WorkflowExecutionAlreadyStartedFault', workflowId,
+                            'StartWorkflowExecution')
+            execution = self._start(
+                domain, workflowId, workflowType, taskList, taskPriority, input,
+                tagList, childPolicy, **kwargs)
+            return {'runId': execution.run_id}
+
+    def describe_workflow_execution(self, domain, execution):
+        with self._lock:
+            workflow = self._get_execution(execution, 'DescribeWorkflowExecution')
+            return {
+                'executionInfo': workflow.info(),
+                'executionConfiguration': {
+                    'taskList': workflow.task_list,
+                    'taskPriority': workflow.task_priority,
+                    'childPolicy': workflow.child_policy},
+                'openCounts': {
+                    'openActivityTasks': len(workflow.activities),
+                    'openDecisionTasks': int(workflow.decision_state is not None),
+                    'openTimers': 0,
+                    'openChildWorkflowExecutions': len(
+                        [c for c in workflow.children.values() if c.close_status is None])}}
+
+    def get_workflow_execution_history(self, domain, execution, nextPageToken=None,
+                                       maximumPageSize=None, reverseOrder=False):
+        with self._lock:
+            workflow = self._get_execution(execution, 'GetWorkflowExecutionHistory')
+            return self._page(workflow.events, len(workflow.events), nextPageToken,
+                              maximumPageSize, reverseOrder)
+
+    def list_open_workflow_executions(self, domain, **kwargs):
+        return self._list(domain, True, **kwargs)
+
+    def list_closed_workflow_executions(self, domain, **kwargs):
+        return self._list(domain, False, **kwargs)
+
+    def terminate_workflow_execution(self, domain, workflowId, runId=None,
+                                     reason=None, details=None, **kwargs):
+        with self._lock:
+            workflow = self.open_executions.get((domain, workflowId))
+            if workflow is None or runId not in (None, workflow.run_id):
+                raise fault('UnknownResourceFault', workflowId, 'TerminateWorkflowExecution')
+            self._close(workflow, 'TERMINATED', 'WorkflowExecutionTerminated',
+                        reason=reason, details=details, childPolicy=workflow.child_policy)
+            self._lock.notify_all()
+            return {}
+
+    # Decision tasks
+
+    def poll_for_decision_task(self, domain, taskList, identity=None, nextPageToken=None,
+                               maximumPageSize=None, reverseOrder=False):
+        with self._lock:
+            if nextPageToken:
+                run_id, token = nextPageToken.split('/', 1)
+                workflow = self.executions[run_id]
+                res = self._page(workflow.events, None, token, maximumPageSize, reverseOrder)
+                return self._decision_task(workflow, res)
+
+            workflow = self._pop(self._decision_queues, domain, taskList['name'])
+            if workflow is None:
+                return {'startedEventId': 0, 'previousStartedEventId': 0}
+            workflow.decision_state = 'started'
+            workflow.started_event_id = workflow.add(
+                'DecisionTaskStarted',
+                scheduledEventId=workflow.scheduled_event_id,
+                identity=identity)
+            res = self._page(workflow.events, workflow.started_event_id, None,
+                             maximumPageSize, reverseOrder)
+            return self._decision_task(workflow, res)
+
+    def respond_decision_task_completed(self, taskToken, decisions=None, executionContext=None):
+        with self._lock:
+            run_id, started_event_id = taskToken.split('/')
+            workflow = self.executions.get(run_id)
+            if workflow is None or workflow.close_status is not None or \
+                    workflow.decision_state != 'started' or \
+                    workflow.started_event_id != int(started_event_id):
+                raise fault('UnknownResourceFault', taskToken, 'RespondDecisionTaskCompleted')
+
+            completed = workflow.add(
+                'DecisionTaskCompleted',
+                scheduledEventId=workflow.scheduled_event_id,
+                startedEventId=workflow.started_event_id)
+            if executionContext is not None:
+                workflow.events[-1]['decisionTaskCompletedEventAttributes'][
+                    'executionContext'] = executionContext
+            workflow.previous_started_event_id = workflow.started_event_id
+            workflow.decision_state = None
+            children = []
+            for decision in decisions or []:
+                decision_type = decision['decisionType']
+                attrs = decision.get(
+                    decision_type[0].lower() + decision_type[1:] + 'DecisionAttributes', {})
+                method = getattr(self, '_decide_' + re.sub(
+                    '([A-Z])', r'_\1', decision_type).lower()[1:], None)
+                if method is None:
+                    raise fault('ValidationException', decision_type,
+                                'RespondDecisionTaskCompleted')
+                child = method(workflow, completed, attrs)
+                if child is not None:
+                    children.append(child)
+                if workflow.close_status is not None:
+                    break
+
+            # Children are started after the decision task is completed.
+            for child in children:
+                initiated_event_id = child.parent[1]
+                workflow.add(
+                    'ChildWorkflowExecutionStarted',
+                    workflowExecution=child.execution,
+                    workflowType=child.workflow_type,
+                    initiatedEventId=initiated_event_id)
+                self._schedule_decision(workflow)
+
+            if workflow.decision_needed and workflow.close_status is None:
+                workflow.decision_needed = False
+                self._schedule_decision(workflow)
+            self._lock.notify_all()
+            return {}
+
+    def _decide_schedule_activity_task(self, workflow, completed, attrs):
+        activity_id = attrs['activityId']
+        if activity_id in workflow.activities:
+            workflow.add(
+                'ScheduleActivityTaskFailed',
+                activityType=attrs['activityType'],
+                activityId=activity_id,
+                cause='ACTIVITY_ID_ALREADY_IN_USE',
+                decisionTaskCompletedEventId=completed)
+            self._schedule_decision(workflow)
+            return
+        task_list = attrs.get('taskList', {'name': ''})
+        priority = attrs.get('taskPriority', '0')
+        scheduled = workflow.add(
+            'ActivityTaskScheduled',
+            decisionTaskCompletedEventId=completed,
+            **dict(attrs, taskList=task_list, taskPriority=priority))
+        workflow.activities[activity_id] = scheduled
+        self._push(self._activity_queues, workflow.domain, task_list['name'],
+                   priority, (workflow, scheduled))
+
+    def _decide_start_child_workflow_execution(self, workflow, completed, attrs):
+        task_list = attrs.get('taskList', workflow.task_list)
+        priority = attrs.get('taskPriority', workflow.task_priority)
+        child_policy = attrs.get('childPolicy', 'TERMINATE')
+        initiated = workflow.add(
+            'StartChildWorkflowExecutionInitiated',
+            decisionTaskCompletedEventId=completed,
+            **dict(attrs, taskList=task_list, taskPriority=priority, childPolicy=child_policy))
+        if (workflow.domain, attrs['workflowId']) in self.open_executions:
+            workflow.add(
+                'StartChildWorkflowExecutionFailed',
+                workflowType=attrs['workflowType'],
+                workflowId=attrs['workflowId'],
+                cause='WORKFLOW_ALREADY_RUNNING',
+                initiatedEventId=initiated,
+                decisionTaskCompletedEventId=completed)
+            self._schedule_decision(workflow)
+            return
+        child = self._start(
+            workflow.domain, attrs['workflowId'], attrs['workflowType'], task_list,
+            priority, attrs.get('input'), attrs.get('tagList'), child_policy,
+            parent=(workflow, initiated))
+        workflow.children[initiated] = child
+        return child
+
+    def _decide_complete_workflow_execution(self, workflow, completed, attrs):
+        if workflow.decision_needed:
+            workflow.add(
+                'CompleteWorkflowExecutionFailed',
+                cause='UNHANDLED_DECISION',
+                decisionTaskCompletedEventId=completed)
+            return
+        self._close(workflow, 'COMPLETED', 'WorkflowExecutionCompleted',
+                    decisionTaskCompletedEventId=completed, **attrs)
+
+    def _decide_fail_workflow_execution(self, workflow, completed, attrs):
+        if workflow.decision_needed:
+            workflow.add(
+                'FailWorkflowExecutionFailed',
+                cause='UNHANDLED_DECISION',
+                decisionTaskCompletedEventId=completed)
+            return
+        self._close(workflow, 'FAILED', 'WorkflowExecutionFailed',
+                    decisionTaskCompletedEventId=completed, **attrs)
+
+    def _decide_start_timer(self, workflow, completed, attrs):
+        started = workflow.add(
+            'TimerStarted', decisionTaskCompletedEventId=completed, **attrs)
+        timeout = float(attrs['startToFireTimeout'])
+        if timeout <= 0:
+            self._fire_timer(workflow, attrs['timerId'], started)
+        else:
+            timer = threading.Timer(
+                timeout, self._fire_timer, args=(workflow, attrs['timerId'], started, True))
+            timer.daemon = True
+            timer.start()
+
+    def _decide_record_marker(self, workflow, completed, attrs):
+        workflow.add('MarkerRecorded', decisionTaskCompletedEventId=completed, **attrs)
+
+    def _fire_timer(self, workflow, timer_id, started, lock=False):
+        if lock:
+            with self._lock:
+                return self._fire_timer(workflow, timer_id, started)
+        if workflow.close_status is not None:
+            return
+        workflow.add('TimerFired', timerId=timer_id, startedEventId=started)
+        self._schedule_decision(workflow)
+        self._lock.notify_all()
+
+    # Activity tasks
+
+    def poll_for_activity_task(self, domain, taskList, identity=None):
+        with self._lock:
+            task = self._pop(self._activity_queues, domain, taskList['name'])
+            if task is None:
+                return {'startedEventId': 0}
+            workflow, scheduled = task
+            attrs = workflow.events[scheduled - 1]['activityTaskScheduledEventAttributes']
+            started = workflow.add(
+                'ActivityTaskStarted', scheduledEventId=scheduled, identity=identity)
+            token = '%s/%d' % (workflow.run_id, started)
+            self.activity_tasks[token] = (workflow, scheduled, started)
+            res = {
+                'taskToken': token,
+                'activityId': attrs['activityId'],
+                'startedEventId': started,
+                'workflowExecution': workflow.execution,
+                'activityType': attrs['activityType']}
+            if 'input' in attrs:
+                res['input'] = attrs['input']
+            return res
+
+    def record_activity_task_heartbeat(self, taskToken, details=None):
+        with self._lock:
+            self._get_activity_task(taskToken, 'RecordActivityTaskHeartbeat')
+            return {'cancelRequested': False}
+
+    def respond_activity_task_completed(self, taskToken, result=None):
+        self._close_activity_task(
+            taskToken, 'ActivityTaskCompleted', 'RespondActivityTaskCompleted', result=result)
+        return {}
+
+    def respond_activity_task_failed(self, taskToken, reason=None, details=None):
+        self._close_activity_task(
+            taskToken, 'ActivityTaskFailed', 'RespondActivityTaskFailed',
+            reason=reason, details=details)
+        return {}
+
+    def respond_activity_task_canceled(self, taskToken, details=None):
+        self._close_activity_task(
+            taskToken, 'ActivityTaskCanceled', 'RespondActivityTaskCanceled', details=details)
+        return {}
+
+    def _get_activity_task(self, token, operation_name):
+        task = self.activity_tasks.get(token)
+        if task is None or task[0].close_status is not None:
+            raise fault('UnknownResourceFault', token, operation_name)
+        return task
+
+    def _close_activity_task(self, token, event_type, operation_name, **attrs):
+        with self._lock:
+            workflow, scheduled, started = self._get_activity_task(token, operation_name)
+            del self.activity_tasks[token]
+            activity_id = workflow.events[scheduled - 1][
+                'activityTaskScheduledEventAttributes']['activityId']
+            workflow.activities.pop(activity_id, None)
+            workflow.add(event_type, scheduledEventId=scheduled, startedEventId=started,
+                         **{k: v for k, v in attrs.items() if v is not None})
+            self._schedule_decision(workflow)
+            self._lock.notify_all()
+
+    # Helpers, which are called with lock.
+
+    def _start(self, domain, workflow_id, workflow_type, task_list, task_priority, input,
+               tag_list, child_policy, parent=None, **kwargs):
+        workflow = WorkflowExecution(
+            domain, workflow_id, workflow_type, task_list, task_priority or '0',
+            child_policy, tag_list or [], parent)
+        attrs = {
+            'workflowType': workflow_type,
+            'taskList': task_list,
+            'taskPriority': workflow.task_priority,
+            'childPolicy': child_policy,
+            'tagList': workflow.tag_list}
+        if input is not None:
+            attrs['input'] = input
+        if parent is not None:
+            attrs['parentWorkflowExecution'] = parent[0].execution
+            attrs['parentInitiatedEventId'] = parent[1]
+        for key in ['executionStartToCloseTimeout', 'taskStartToCloseTimeout']:
+            if key in kwargs:
+                attrs[key] = kwargs[key]
+        workflow.add('WorkflowExecutionStarted', **attrs)
+        self.executions[workflow.run_id] = workflow
+        self.open_executions[(domain, workflow_id)] = workflow
+        self._schedule_decision(workflow)
+        self._lock.notify_all()
+        return workflow
+
+    def _close(self, workflow, close_status, event_type, **attrs):
+        workflow.add(event_type, **{k: v for k, v in attrs.items() if v is not None})
+        workflow.close_status = close_status
+        workflow.close_timestamp = now()
+        del self.open_executions[(workflow.domain, workflow.workflow_id)]
+
+        for child in workflow.children.values():
+            if child.close_status is None and child.child_policy == 'TERMINATE':
+                self._close(child, 'TERMINATED', 'WorkflowExecutionTerminated',
+                            cause='CHILD_POLICY_APPLIED', childPolicy=child.child_policy)
+
+        if workflow.parent is not None and workflow.parent[0].close_status is None:
+            parent, initiated = workflow.parent
+            started = [e['eventId'] for e in parent.events
+                       if e['eventType'] == 'ChildWorkflowExecutionStarted'
+                       and e['childWorkflowExecutionStartedEventAttributes']
+                       ['initiatedEventId'] == initiated]
+            close_attrs = {
+                'workflowExecution': workflow.execution,
+                'workflowType': workflow.workflow_type,
+                'initiatedEventId': initiated,
+                'startedEventId': started[0] if started else 0}
+            for key in ['result', 'reason', 'details']:
+                if attrs.get(key) is not None:
+                    close_attrs[key] = attrs[key]
+            parent.add('ChildWorkflowExecution' + event_type[len('WorkflowExecution'):],
+                       **close_attrs)
+            self._schedule_decision(parent)
+
+    def _schedule_decision(self, workflow):
+        if workflow.close_status is not None:
+            return
+        if workflow.decision_state == 'started':
+            workflow.decision_needed = True
+        elif workflow.decision_state is None:
+            workflow.decision_state = 'scheduled'
+            workflow.scheduled_event_id = workflow.add(
+                'DecisionTaskScheduled',
+                taskList=workflow.task_list,
+                taskPriority=workflow.task_priority)
+            self._push(self._decision_queues, workflow.domain, workflow.task_list['name'],
+                       workflow.task_priority, workflow)
+
+    def _push(self, queues, domain, task_list, priority, task):
+        heap = queues.setdefault((domain, task_list), [])
+        heapq.heappush(heap, (-int(priority or 0), next(self._counter), task))
+
+    def _pop(self, queues, domain, task_list):
+        """Pop the task of the highest priority from task list. Wait for a
+        task until poll timeout. Tasks of closed executions are dropped.
+        """
+        heap = queues.setdefault((domain, task_list), [])
+        deadline = None
+        while True:
+            while heap:
+                _, _, task = heapq.heappop(heap)
+                workflow = task[0] if isinstance(task, tuple) else task
+                if workflow.close_status is None:
+                    return task
+            if deadline is None:
+                deadline = now().timestamp() + self.poll_timeout
+            timeout = deadline - now().timestamp()
+            if timeout <= 0:
+                return None
+            self._lock.wait(timeout)
+
+    def _get_execution(self, execution, operation_name):
+        workflow = self.executions.get(execution.get('runId'))
+        if workflow is None:
+            raise fault('UnknownResourceFault', str(execution), operation_name)
+        return workflow
+
+    def _page(self, events, length, token, page_size, reverse):
+        """Return a page of the first length events. The page token records
+        the length, so pages are consistent while events are added.
+        """
+        if token:
+            length, offset = [int(i) for i in token.split(',')]
+        else:
+            offset = 0
+        page_size = page_size or self.page_size
+        events = events[:length]
+        if reverse:
+            page = events[::-1][offset:offset + page_size]
+        else:
+            page = events[offset:offset + page_size]
+        res = {'events': page}
+        if offset + page_size < len(events):
+            res['nextPageToken'] = '%d,%d' % (len(events), offset + page_size)
+        return res
+
+    def _decision_task(self, workflow, res):
+        res.update({
+            'taskToken': '%s/%d' % (workflow.run_id, workflow.started_event_id),
+            'startedEventId': workflow.started_event_id,
+            'previousStartedEventId': workflow.previous_started_event_id,
+            'workflowExecution': workflow.execution,
+            'workflowType': workflow.workflow_type})
+        if 'nextPageToken' in res:
+            res['nextPageToken'] = '%s/%s' % (workflow.run_id, res['nextPageToken'])
+        return res
+
+    def _list(self, domain, is_open, startTimeFilter=None, typeFilter=None,
+              tagFilter=None, executionFilter=None, closeStatusFilter=None, **kwargs):
+        with self._lock:
+            infos = []
+            for workflow in self.executions.values():
+                if workflow.domain != domain or (workflow.close_status is None) != is_open:
+                    continue
+                if startTimeFilter:
+                    oldest = to_datetime(startTimeFilter.get('oldestDate'))
+                    latest = to_datetime(startTimeFilter.get('latestDate'))
+                    if oldest and workflow.start_timestamp < oldest or \
+                            latest and workflow.start_timestamp > latest:
+                        continue
+                if typeFilter and (
+                        typeFilter['name'] != workflow.workflow_type['name'] or
+                        typeFilter.get('version', workflow.workflow_type['version']) !=
+                        workflow.workflow_type['version']):
+                    continue
+                if tagFilter and tagFilter['tag'] not in workflow.tag_list:
+                    continue
+                if executionFilter and executionFilter['workflowId'] != workflow.workflow_id:
+                    continue
+                if closeStatusFilter and closeStatusFilter['status'] != workflow.close_status:
+                    continue
+                infos.append(workflow.info())
+            return {'executionInfos': infos}
+
+
+def to_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromtimestamp(float(value), timezone.utc)
+
+
+def to_json(data):
+    if isinstance(data, datetime):
+        return data.timestamp()
+    elif isinstance(data, dict):
+        return {k: to_json(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [to_json(d) for d in data]
+    return data
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    """Handle requests of the JSON protocol of SWF, e.g. the request with
+    header "X-Amz-Target: SimpleWorkflowService.PollForDecisionTask" is
+    handled by emulator.poll_for_decision_task.
+    """
+
+    emulator = None
+
+    def do_POST(self):
+        operation_name = self.headers['X-Amz-Target'].split('.')[-1]
+        length = int(self.headers.get('Content-Length', 0))
+        kwargs = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        method = re.sub('([A-Z])', r'_\1', operation_name).lower()[1:]
+        try:
+            status, body = 200, to_json(getattr(self.emulator, method)(**kwargs))
+        except ClientError as err:
+            status, body = 400, {
+                '__type': 'com.amazonaws.swf.base.model#%s' % err.response['Error']['Code'],
+                'message': err.response['Error']['Message']}
+        except (AttributeError, TypeError) as err:
+            status, body = 400, {'__type': 'ValidationException', 'message': str(err)}
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+def serve(emulator=None, host='localhost', port=8080):
+    """Return an HTTP server of emulator. Call serve_forever() of it to serve
+    requests.
+    """
+    handler = type('RequestHandler', (RequestHandler,), {
+        'emulator': emulator or SWFEmulator()})
+    server = _ThreadingHTTPServer((host, port), handler)
+    return server
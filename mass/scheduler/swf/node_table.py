@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Node table of job to pass subtrees of job by reference.
+
+A job is compiled once at submission into a table of nodes, where the
+children of a node are replaced by the indexes of their nodes, and the table
+is saved once. Workflow executions carry only the reference of the table and
+the index of their node instead of their subtrees, so each node is serialized
+and parsed once instead of once for each of its ancestors.
+
+The node of a workflow execution is expanded with its children, in which
+actions are kept as they are and tasks are replaced by their references:
+
+{'Task': {'title': ..., 'parallel': ..., '_node': 3, '_serial': 2}}
+
+"_serial" is the max number of serial descendants of the task, which is
+computed at compilation, so priorities of children are computed without
+their subtrees.
+"""
+
+# built-in modules
+from functools import lru_cache
+import json
+
+# local modules
+from mass.dependency import get_offsets, has_dependencies
+from mass.input_handler import InputHandler
+from mass.payload_store import PayloadStore
+from mass.scheduler.swf import config
+
+
+def compile_table(job):
+    """Return the node table of job. The node of job is the first one.
+    """
+    nodes = []
+    serials = []
+
+    def visit(node):
+        type_ = [k for k in node.keys()][0]
+        index = len(nodes)
+        attrs = {k: v for k, v in node[type_].items() if k != 'children'}
+        nodes.append({type_: attrs})
+        serials.append(0)
+        if type_ == 'Action':
+            return index, 0
+        children, counts = [], []
+        for child in node[type_]['children']:
+            child_index, count = visit(child)
+            children.append(child_index)
+            counts.append(count + 1)
+        attrs['children'] = children
+        if node[type_].get('parallel', False) and has_dependencies(node[type_]['children']):
+            offsets = get_offsets(node[type_]['children'], counts)
+            serials[index] = max(o + c for o, c in zip(offsets, counts))
+        elif node[type_].get('parallel', False):
+            serials[index] = max(counts) if counts else 0
+        else:
+            serials[index] = sum(counts)
+        return index, serials[index]
+
+    visit(job)
+    return {'nodes': nodes, 'serials': serials}
+
+
+def save_table(job, protocol=None):
+    """Compile job and save its node table by protocol, or to the payload
+    store if protocol is not given. Return the reference of table.
+    """
+    table = compile_table(job)
+    if protocol:
+        return InputHandler(protocol).save(data=table, genealogy=[job['Job']['title']])
+    return PayloadStore(config.PAYLOAD_STORE_PATH).put(json.dumps(table))
+
+
+def load_table(protocol, reference):
+    """Return node table of reference. Tables are immutable, so they are
+    cached and shared by the workflow executions of a job in process. The
+    reference of a protocol could be any JSON, so it is cached by its JSON.
+    """
+    return _load_table(protocol, json.dumps(reference, sort_keys=True))
+
+
+@lru_cache(maxsize=16)
+def _load_table(protocol, key):
+    reference = json.loads(key)
+    if protocol:
+        return InputHandler(protocol).load(reference)
+    return json.loads(PayloadStore(config.PAYLOAD_STORE_PATH).get(reference))
+
+
+def expand_node(table, index):
+    """Return the node of index with its children.
+    """
+    nodes = table['nodes']
+    type_, attrs = list(nodes[index].items())[0]
+    children = []
+    for child_index in attrs['children']:
+        child_type, child_attrs = list(nodes[child_index].items())[0]
+        if child_type == 'Action':
+            children.append({'Action': dict(child_attrs)})
+        else:
+            child_attrs = {k: v for k, v in child_attrs.items() if k != 'children'}
+            child_attrs['_node'] = child_index
+            child_attrs['_serial'] = table['serials'][child_index]
+            children.append({child_type: child_attrs})
+    node_attrs = dict(attrs)
+    node_attrs['children'] = children
+    return {type_: node_attrs}
@@ -6,43 +6,94 @@
 """
 
 # built-in modules
-from collections import defaultdict, namedtuple
+from collections import namedtuple
 from contextlib import contextmanager
+import bisect
 import json
+import time
 import uuid
 
 # local modules
 from mass.input_handler import InputHandler
 from mass.scheduler.swf import config
+from mass.scheduler.swf.node_table import expand_node, load_table
+from mass.scheduler.swf.utils import decode, dump_input, load_input, resolve
 
 StepError = namedtuple('StepError', ['reason', 'details'])
 
 
-class Event(object):
+class EventKind(object):
 
-    """Wrapper to get value of SWF event by access class members.
+    """Kinds of SWF events which are aggregated as steps.
     """
 
-    def __init__(self, swf_event):
-        if not isinstance(swf_event, dict):
-            raise TypeError()
-        self._swf_event = swf_event
+    OTHER = 0
+    ACTIVITY_TASK = 1
+    CHILD_WORKFLOW_EXECUTION = 2
+
 
-    def __getattr__(self, name):
-        swf_name = ''.join([s.title() for s in name.split('_')])
-        swf_name = swf_name[0].lower() + swf_name[1:]
+_event_types = {}
 
-        key = [k for k in self._swf_event if 'EventAttributes' in k]
-        event_attrs = self._swf_event[key[0]] if key else {}
 
-        if swf_name in self._swf_event:
-            return self._swf_event[swf_name]
-        elif swf_name in event_attrs:
-            return event_attrs[swf_name]
-        elif swf_name in event_attrs.get('workflowExecution', {}):
-            return event_attrs['workflowExecution'][swf_name]
+def parse_event_type(event_type):
+    """Return kind and status of SWF event type, e.g. "ActivityTaskFailed" is
+    parsed as (EventKind.ACTIVITY_TASK, "Failed").
+    """
+    try:
+        return _event_types[event_type]
+    except KeyError:
+        if 'ActivityTask' in event_type:
+            kind, status = EventKind.ACTIVITY_TASK, event_type.replace('ActivityTask', '')
+        elif 'ChildWorkflowExecution' in event_type:
+            kind, status = EventKind.CHILD_WORKFLOW_EXECUTION, event_type.replace('ChildWorkflowExecution', '')
         else:
-            return None
+            kind, status = EventKind.OTHER, None
+        _event_types[event_type] = (kind, status)
+        return kind, status
+
+
+class Event(object):
+
+    """SWF event decoded once into the fields which are used by steps.
+    """
+
+    __slots__ = (
+        'event_id', 'event_type', 'event_timestamp', 'kind', 'status',
+        'activity_id', 'workflow_id', 'scheduled_event_id', 'initiated_event_id',
+        'input', 'result', 'reason', 'details', 'timeout_type',
+        'task_list', 'task_priority', 'tag_list', 'parent_workflow_id', 'control',
+        'marker_name')
+
+    def __init__(self, swf_event):
+        if not isinstance(swf_event, dict):
+            raise TypeError()
+        event_type = swf_event['eventType']
+        attrs = swf_event.get(event_type[0].lower() + event_type[1:] + 'EventAttributes', {})
+        execution = attrs.get('workflowExecution', {})
+
+        self.event_id = swf_event['eventId']
+        self.event_type = event_type
+        self.event_timestamp = swf_event.get('eventTimestamp')
+        self.kind, self.status = parse_event_type(event_type)
+        self.activity_id = attrs.get('activityId')
+        self.workflow_id = attrs.get('workflowId', execution.get('workflowId'))
+        self.scheduled_event_id = attrs.get('scheduledEventId')
+        self.initiated_event_id = attrs.get('initiatedEventId')
+        self.input = attrs.get('input')
+        self.result = attrs.get('result')
+        self.reason = attrs.get('reason')
+        self.details = attrs.get('details')
+        self.timeout_type = attrs.get('timeoutType')
+        self.task_list = attrs.get('taskList')
+        self.task_priority = attrs.get('taskPriority')
+        self.tag_list = attrs.get('tagList')
+        self.control = attrs.get('control')
+        self.marker_name = attrs.get('markerName')
+        parent = attrs.get('parentWorkflowExecution')
+        self.parent_workflow_id = parent['workflowId'] if parent else None
+
+    def __repr__(self):
+        return 'Event(%d, %s)' % (self.event_id, self.event_type)
 
 
 class Step(object):
@@ -64,22 +115,22 @@ class Step(object):
 
     def error(self):
         events = [e for e in self._events
-                  if e.event_type.endswith('Failed')
-                  or e.event_type.endswith('TimedOut')]
+                  if e.status.endswith('Failed')
+                  or e.status.endswith('TimedOut')]
         if not events:
             return None
         else:
             event = events[0]  # latest error event
-            if event.event_type.endswith('Failed'):
-                return StepError(event.reason, event.details)
-            elif event.event_type.endswith('TimedOut'):
+            if event.status.endswith('Failed'):
+                return StepError(event.reason, resolve(event.details))
+            elif event.status.endswith('TimedOut'):
                 return StepError(event.timeout_type, None)
 
     def init_event(self):
         raise NotImplementedError
 
     def input(self):
-        return json.loads(self.init_event().input)
+        return load_input(self.init_event().input)
 
     def name(self):
         raise NotImplementedError
@@ -88,16 +139,13 @@ class Step(object):
         return int(self.init_event().task_priority)
 
     def result(self):
-        events = [e for e in self._events if e.event_type.endswith('Completed')]
+        events = [e for e in self._events if e.status == 'Completed']
         if not events:
             return json.loads('null')
         else:
-            try:
-                return events[0].result
-            except AttributeError:
-                return json.loads('null')
+            return decode(resolve(events[0].result))
 
-    def retry(self, decisions):
+    def retry(self, decisions, scheduled_time=None):
         raise NotImplementedError
 
     def retry_count(self):
@@ -112,7 +160,7 @@ class Step(object):
         return self.retry_count() < self._max_retry_count
 
     def status(self):
-        return self._events[-1].event_type.replace(self.type(), '')
+        return self._events[-1].status
 
     def task_list(self):
         return self.init_event().task_list.get('name', None)
@@ -123,70 +171,102 @@ class Step(object):
 
 class ActivityTask(Step):
 
+    def batch_results(self):
+        """Return the results of actions in a batch reported by its latest
+        failure, or None if they are not reported.
+        """
+        events = [e for e in self._events if e.status == 'Failed' and e.details]
+        if not events:
+            return None
+        try:
+            return json.loads(resolve(events[-1].details))
+        except ValueError:
+            return None
+
+    def error(self):
+        """Return the error of step. The error of a batch is the one of its
+        first failed action.
+        """
+        error = super(ActivityTask, self).error()
+        if error is None or not self.input().get('batch'):
+            return error
+        for result in self.batch_results() or []:
+            if result and result['status'] == 'failed':
+                return StepError(result['reason'], result['details'])
+        return error
+
     def init_event(self):
-        events = [e for e in self._events if e.event_type.endswith('Scheduled')]
+        events = [e for e in self._events if e.status == 'Scheduled']
         if not events:
-            events = [e for e in self._events if e.event_type == 'ScheduleActivityTaskFailed']
+            events = [e for e in self._events if e.status == 'ScheduleFailed']
         return events[0] if events else None
 
     def name(self):
         return self.init_event().activity_id
 
-    def retry(self, decisions):
+    def retry(self, decisions, scheduled_time=None):
+        input_data = self.input()
+        if scheduled_time is not None:
+            input_data['scheduled_time'] = scheduled_time
+        if input_data.get('batch'):
+            # Only the actions which are not completed are executed again.
+            input_data['results'] = self.batch_results() or input_data.get('results')
         self.schedule(
             decisions=decisions,
             name=self.retry_name(),
-            input_data=self.input(),
+            input_data=input_data,
             task_list=self.task_list(),
-            priority=self.priority())
+            priority=self.priority(),
+            control=self.init_event().control)
 
     def retry_count(self):
         retry_count = sum(
-            [1 for e in self._events if e.event_type.endswith('Scheduled')]) - 1
+            [1 for e in self._events if e.status == 'Scheduled']) - 1
         return retry_count
 
     @classmethod
-    def schedule(cls, decisions, name, input_data, task_list, priority):
+    def schedule(cls, decisions, name, input_data, task_list, priority, control=None):
         decisions.schedule_activity_task(
             activity_id=name,
             activity_type_name=config.ACTIVITY_TYPE_FOR_ACTION['name'],
             activity_type_version=config.ACTIVITY_TYPE_FOR_ACTION['version'],
             task_list=task_list,
             task_priority=str(priority),
-            control=None,
+            control=control,
             heartbeat_timeout=str(config.ACTIVITY_HEARTBEAT_TIMEOUT),
             schedule_to_close_timeout=str(config.ACTIVITY_TASK_START_TO_CLOSE_TIMEOUT),
             schedule_to_start_timeout=str(config.ACTIVITY_TASK_START_TO_CLOSE_TIMEOUT),
             start_to_close_timeout=str(config.ACTIVITY_TASK_START_TO_CLOSE_TIMEOUT),
-            input=json.dumps(input_data))
+            input=dump_input(input_data))
 
 
 class ChildWorkflowExecution(Step):
 
     def init_event(self):
-        events = [e for e in self._events if e.event_type.endswith('Initiated')]
+        events = [e for e in self._events if e.status == 'StartInitiated']
         if not events:
-            events = [e for e in self._events if e.event_type == 'StartChildWorkflowExecutionFailed']
+            events = [e for e in self._events if e.status == 'StartFailed']
         return events[0] if events else None
 
     def name(self):
         return self.init_event().workflow_id
 
-    def retry(self, decisions):
+    def retry(self, decisions, scheduled_time=None):
         self.start(
             decisions=decisions,
             name=self.retry_name(),
             input_data=self.input(),
             tag_list=self.tag_list(),
-            priority=self.priority())
+            priority=self.priority(),
+            control=self.init_event().control)
 
     def retry_count(self):
         retry_count = sum(
-            [1 for e in self._events if e.event_type.endswith('Initiated')]) - 1
+            [1 for e in self._events if e.status == 'StartInitiated']) - 1
         return retry_count
 
     @classmethod
-    def start(cls, decisions, name, input_data, tag_list, priority):
+    def start(cls, decisions, name, input_data, tag_list, priority, control=None):
         decisions.start_child_workflow_execution(
             workflow_id=name,
             workflow_type_name=config.WORKFLOW_TYPE_FOR_TASK['name'],
@@ -195,10 +275,10 @@ class ChildWorkflowExecution(Step):
             task_priority=str(priority),
             tag_list=tag_list,
             child_policy=config.WORKFLOW_CHILD_POLICY,
-            control=None,
+            control=control,
             execution_start_to_close_timeout=str(config.WORKFLOW_EXECUTION_START_TO_CLOSE_TIMEOUT),
             task_start_to_close_timeout=str(config.DECISION_TASK_START_TO_CLOSE_TIMEOUT),
-            input=json.dumps(input_data))
+            input=dump_input(input_data))
 
     def tag_list(self):
         return self.init_event().tag_list
@@ -207,6 +287,12 @@ class ChildWorkflowExecution(Step):
 class StepHandler(object):
 
     """Classify events of SWF execution history to steps.
+
+    Events are folded into steps one by one and raw events are not kept, so
+    the handler could consume the history page by page while it is polled.
+    The handler of a workflow execution could be kept between decision tasks
+    and only applied with the events which are new since the last decision
+    task.
     """
 
     def __init__(self, events, activity_max_retry=0, workflow_max_retry=0):
@@ -215,96 +301,212 @@ class StepHandler(object):
         self.workflow_max_retry = workflow_max_retry
         self.activity_newbe_count = 0
         self.workflow_newbe_count = 0
+        self.activity_count = 0
+        self.workflow_count = 0
+        self.last_event_id = 0
+        self.input = None
+        self.table = None  # reference of node table if subtrees are passed by reference
+        self.load_time = 0  # time in seconds to load the input
+        self.decision_time = None  # started time of the last decision task
+        self.priorities = None  # priorities of children, computed by decider
+        self.inlined = None  # {index: task} of inlined children, planned by decider
+        self.markers = {}  # marker name -> details of recorded markers
+
+        # (index of child, position of step) where the replay of a decision
+        # resumes from. Children before it are done and their steps are
+        # placed before the position.
+        self.checkpoint = (0, 0)
+        self._committable = True
+        self._cursor = 0
+        self._pending = []  # sorted positions of scheduled or started steps
+        self._closed = []  # positions of steps closed by the last applied events
+        self._positions = {}  # step name -> position of step
+        self._activity_steps = {}  # scheduled event id -> step name
+        self._workflow_steps = {}  # initiated event id -> step name
+
+        self.apply(events)
+        if self.input is None:
+            raise ValueError('WorkflowExecutionStarted event is not found.')
+
+    def apply(self, events):
+        """Fold an iterable of SWF events into steps. Events which have been
+        applied are ignored.
+        """
+        self._closed = []
+        for swf_event in events:
+            if swf_event['eventId'] <= self.last_event_id:
+                continue
+            event = Event(swf_event)
+            self.last_event_id = event.event_id
+            if event.event_type == 'WorkflowExecutionStarted':
+                self.start(event)
+                continue
+            elif event.event_type == 'DecisionTaskStarted':
+                self.decision_time = event.event_timestamp
+                continue
+            elif event.event_type == 'MarkerRecorded':
+                self.markers[event.marker_name] = event.details
+                continue
+
+            step_name = self.get_step_name(event)
+            if not step_name:
+                continue
+
+            position = self._positions.get(step_name)
+            if position is None:
+                position = self._positions[step_name] = len(self.events)
+                if event.kind == EventKind.ACTIVITY_TASK:
+                    self.events.append(ActivityTask([event], self.activity_max_retry))
+                    self.activity_count += 1
+                else:
+                    self.events.append(ChildWorkflowExecution([event], self.workflow_max_retry))
+                    self.workflow_count += 1
+                was_pending = False
+            else:
+                step = self.events[position]
+                was_pending = step.status() in ['Scheduled', 'Started']
+                step._events.append(event)
+
+            is_pending = self.events[position].status() in ['Scheduled', 'Started']
+            if is_pending and not was_pending:
+                bisect.insort(self._pending, position)
+            elif was_pending and not is_pending:
+                self._pending.remove(position)
+                self._closed.append(position)
+
+    def latencies(self):
+        """Return (name, seconds) of the steps closed by the last applied
+        events. The latency of a step is from its latest scheduling to the
+        start of the decision task which handles its result, so it includes
+        the time waiting for worker and decider.
+        """
+        latencies = []
+        for position in self._closed:
+            step = self.events[position]
+            scheduled = [e for e in step._events if e.status in ['Scheduled', 'StartInitiated']]
+            if not scheduled or self.decision_time is None:
+                continue
+            latency = self.decision_time - scheduled[-1].event_timestamp
+            latencies.append((step.name(), latency.total_seconds()))
+        return latencies
+
+    def start(self, event):
+        """Load the input of workflow execution from its started event.
+        """
+        self.tag_list = event.tag_list
+        self.priority = int(event.task_priority)
+        self.start_time = event.event_timestamp
+        self.parent_workflow_id = event.parent_workflow_id
 
-        def get_start_event(events):
-            events = map(Event, events)
-            events = [e for e in events if not e.event_type.startswith('Decision')]
-            return events[0]
-
-        start_event = get_start_event(events)
-        self.input = json.loads(start_event.input)
-        self.tag_list = start_event.tag_list
-        self.priority = int(start_event.task_priority)
-
-        input_ = json.loads(start_event.input)
+        start_time = time.time()
+        input_ = load_input(event.input)
         self.protocol = input_['protocol']
-        handler = InputHandler(self.protocol)
-        self.input = handler.load(input_['body'])
-
-        swf_event_groups = self.classify_events(
-            events, self.activity_max_retry, self.workflow_max_retry)
+        if 'table' in input_:
+            self.table = input_['table']
+            self.input = expand_node(load_table(self.protocol, self.table), input_['node'])
+        else:
+            handler = InputHandler(self.protocol)
+            self.input = handler.load(input_['body'])
+        self.load_time = time.time() - start_time
 
-        def to_event(swf_events):
-            if 'ActivityTask' in swf_events[0].event_type:
-                return ActivityTask(swf_events, self.activity_max_retry)
-            elif 'ChildWorkflowExecution' in swf_events[0].event_type:
-                return ChildWorkflowExecution(swf_events, self.workflow_max_retry)
+    def resume(self):
+        """Uncheck steps after the checkpoint to replay them in a new decision
+        and return the index of child to resume from.
+        """
+        index, position = self.checkpoint
+        for step in self.events[position:self._cursor + 1]:
+            step.is_checked = False
+        self._cursor = position
+        self._committable = True
+        self.activity_newbe_count = 0
+        self.workflow_newbe_count = 0
+        return index
 
-        self.events = [
-            to_event(swf_events) for swf_events in swf_event_groups.values()]
-        self.events = sorted(self.events, key=lambda a: a.created_time())
+    def commit(self, index):
+        """Move the checkpoint to the child of index if all steps popped since
+        the checkpoint are completed.
+        """
+        if not self._committable:
+            return
+        _, position = self.checkpoint
+        for step in self.events[position:self._cursor]:
+            if step.status() != 'Completed':
+                self._committable = False
+                return
+        self.checkpoint = (index, self._cursor)
+
+    def hold(self):
+        """Keep the checkpoint from moving in this decision, e.g. until the
+        markers recorded by it are in the history.
+        """
+        self._committable = False
 
     @contextmanager
     def pop(self):
-        unchecked_events = [a for a in self.events if not a.is_checked]
-        if unchecked_events:
-            yield unchecked_events[0]
-            unchecked_events[0].is_checked = True
+        if self.is_scheduled():
+            step = self.events[self._cursor]
+            yield step
+            step.is_checked = True
+            self._cursor += 1
         else:
             yield None
 
     def get_next_activity_name(self):
-        activity_count = len(
-            [a for a in self.events if a.type() == 'ActivityTask'])
-        activity_count += self.activity_newbe_count
+        activity_count = self.activity_count + self.activity_newbe_count
         next_id = activity_count * (self.activity_max_retry + 1)
 
         self.activity_newbe_count += 1
         return str(next_id)
 
     def get_next_workflow_name(self, prefix):
-        workflow_count = len(
-            [e for e in self.events if e.type() == 'ChildWorkflowExecution'])
-        workflow_count += self.workflow_newbe_count
+        workflow_count = self.workflow_count + self.workflow_newbe_count
         next_id = workflow_count * (self.workflow_max_retry + 1)
         next_name = '-'.join([prefix, str(uuid.uuid1()), str(next_id)])
 
         self.workflow_newbe_count += 1
         return next_name
 
+    def count_scheduled(self):
+        """Return the number of steps after the checkpoint.
+        """
+        return len(self.events) - self.checkpoint[1]
+
+    def count_pending(self):
+        """Return the number of scheduled or started steps.
+        """
+        return len(self._pending)
+
     def is_scheduled(self):
-        unchecked_events = [a for a in self.events if not a.is_checked]
-        return len(unchecked_events) > 0
+        while self._cursor < len(self.events) and self.events[self._cursor].is_checked:
+            self._cursor += 1
+        return self._cursor < len(self.events)
 
     def is_waiting(self):
-        pending_events = [
-            a for a in self.events if a.is_checked and a.status() in ['Scheduled', 'Started']]
-        return len(pending_events) > 0
+        return bool(self._pending) and self._pending[0] < self._cursor
+
+    def get_step_name(self, event):
+        """Return the name of step which the event belongs to.
 
-    def classify_events(self, swf_events, activity_max_retry, workflow_max_retry):
-        """Classify events to steps by event type and id.
+        Events of activity tasks refer to their scheduled event and events of
+        child workflow executions refer to their initiated event, so the step
+        names are indexed by the id of those events instead of searching the
+        history for them.
         """
-        events = map(Event, swf_events)
-        events = [e for e in events if not e.event_type.startswith('Decision')]
-        events = [e for e in events if not e.event_type.startswith('Workflow')]
-
-        steps = defaultdict(list)
-        for event in events:
-            step_name = None
-            if 'ActivityTask' in event.event_type:
-                if event.event_type.endswith('Scheduled'):
-                    activity_id = int(event.activity_id.split('-')[-1])
-                else:
-                    init_event_id = event.scheduled_event_id
-                    init_event = [e for e in events if e.event_id == init_event_id][0]
-                    activity_id = int(init_event.activity_id.split('-')[-1])
-                activity_id = activity_id - (activity_id % (activity_max_retry + 1))
+        step_name = None
+        if event.kind == EventKind.ACTIVITY_TASK:
+            step_name = self._activity_steps.get(event.scheduled_event_id)
+            if step_name is None and event.activity_id is not None:
+                activity_id = int(event.activity_id.split('-')[-1])
+                activity_id = activity_id - (activity_id % (self.activity_max_retry + 1))
                 step_name = 'activity-%d' % activity_id
-            elif 'ChildWorkflowExecution' in event.event_type:
+                if event.status == 'Scheduled':
+                    self._activity_steps[event.event_id] = step_name
+        elif event.kind == EventKind.CHILD_WORKFLOW_EXECUTION:
+            step_name = self._workflow_steps.get(event.initiated_event_id)
+            if step_name is None:
                 workflow_id = int(event.workflow_id.split('-')[-1])
-                workflow_id = workflow_id - (workflow_id % (workflow_max_retry + 1))
+                workflow_id = workflow_id - (workflow_id % (self.workflow_max_retry + 1))
                 step_name = 'workflow-%d' % workflow_id
-
-            if step_name:
-                steps[step_name].append(event)
-        return steps
+                if event.status == 'StartInitiated':
+                    self._workflow_steps[event.event_id] = step_name
+        return step_name
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-"""Helper functions to register SWF domain, workflow type and activity type.
+"""Helper functions to create SWF client, register SWF domain, workflow type
+and activity type, and encode inputs, results and details sent to SWF.
 """
 
 # built-in modules
+import base64
+import json
+import lzma
 import math
+import os
+import threading
+import zlib
 
 # 3rd-party modules
 from botocore.client import Config
@@ -13,15 +20,130 @@ from botocore.exceptions import ClientError
 import boto3
 
 # local modules
+from mass.input_handler import InputHandler
+from mass.payload_store import PayloadStore
 from mass.scheduler.swf import config
 
 
+_clients = {}
+_clients_lock = threading.Lock()
+
+# codec name -> (compress, decompress) of bytes, which could be extended.
+CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+# The version of the framing of encoded payloads, "mass:<version>:<codec>:".
+CODEC_VERSION = 1
+
+# The prefix of references to spilled payloads. It is framed like encoded
+# payloads, so references are never confused with JSON of user data.
+REFERENCE_PREFIX = 'mass:%d:ref:' % CODEC_VERSION
+
+
+def get_client(region=None):
+    """Return SWF client of region which is shared in process.
+
+    Creating a client is slow and each client has its own connection pool, so
+    clients are cached by region and config. They are also keyed by process
+    id because connections could not be shared with forked processes.
+    """
+    key = (os.getpid(), region or config.REGION, config.ENDPOINT_URL, config.CONNECT_TIMEOUT,
+           config.READ_TIMEOUT, config.MAX_POOL_CONNECTIONS, config.TCP_KEEPALIVE)
+    with _clients_lock:
+        if key not in _clients:
+            # Drop clients inherited from the parent process.
+            for k in [k for k in _clients if k[0] != key[0]]:
+                del _clients[k]
+            options = {
+                'connect_timeout': config.CONNECT_TIMEOUT,
+                'read_timeout': config.READ_TIMEOUT,
+                'max_pool_connections': config.MAX_POOL_CONNECTIONS
+            }
+            # TCP keep-alive is only supported by newer botocore.
+            if 'tcp_keepalive' in Config.OPTION_DEFAULTS:
+                options['tcp_keepalive'] = config.TCP_KEEPALIVE
+            _clients[key] = boto3.session.Session().client(
+                'swf',
+                region_name=key[1],
+                endpoint_url=config.ENDPOINT_URL,
+                config=Config(**options))
+        return _clients[key]
+
+
+def encode(payload, codec=None):
+    """Compress payload string by codec, or config.PAYLOAD_CODEC, if the
+    encoded payload is shorter.
+    """
+    codec = codec or config.PAYLOAD_CODEC
+    if not codec or payload is None:
+        return payload
+    compress, _ = CODECS[codec]
+    encoded = 'mass:%d:%s:%s' % (
+        CODEC_VERSION, codec,
+        base64.b64encode(compress(payload.encode('utf-8'))).decode('ascii'))
+    return encoded if len(encoded) < len(payload) else payload
+
+
+def decode(payload):
+    """Return payload string which is encoded by encode().
+
+    Encoded payloads are told from JSON by their prefix "mass:".
+    """
+    if payload is None or not payload.startswith('mass:'):
+        return payload
+    _, version, codec, data = payload.split(':', 3)
+    if int(version) != CODEC_VERSION:
+        raise ValueError('Unsupported version of encoded payload: %s' % version)
+    _, decompress = CODECS[codec]
+    return decompress(base64.b64decode(data)).decode('utf-8')
+
+
+def spill(payload, max_size, protocol=None, genealogy=None):
+    """Return payload string, or a reference to it if it is longer than
+    max_size. The payload is saved by protocol of InputHandler, or to the
+    payload store if protocol is not given.
+    """
+    if payload is None or len(payload) <= max_size:
+        return payload
+    if protocol:
+        return REFERENCE_PREFIX + json.dumps({
+            'key': InputHandler(protocol).save(data=payload, genealogy=genealogy),
+            'protocol': protocol})
+    return REFERENCE_PREFIX + json.dumps({
+        'key': PayloadStore(config.PAYLOAD_STORE_PATH).put(payload)})
+
+
+def resolve(payload):
+    """Return payload string which is referred by spill().
+    """
+    if payload is None:
+        return payload
+    if not payload.startswith(REFERENCE_PREFIX):
+        return payload
+    reference = json.loads(payload[len(REFERENCE_PREFIX):])
+    if 'protocol' in reference:
+        return InputHandler(reference['protocol']).load(reference['key'])
+    return PayloadStore(config.PAYLOAD_STORE_PATH).get(reference['key'])
+
+
+def dump_input(data):
+    """Return input string of data for SWF. Data longer than
+    config.MAX_INPUT_SIZE after encoding is saved to the payload store and
+    referred by key.
+    """
+    return spill(encode(json.dumps(data)), config.MAX_INPUT_SIZE)
+
+
+def load_input(input_):
+    """Return data of input string from SWF.
+    """
+    return json.loads(decode(resolve(input_)))
+
+
 def register_domain(domain=None, region=None):
-    client = boto3.client(
-        'swf',
-        region_name=region or config.REGION,
-        config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                      read_timeout=config.READ_TIMEOUT))
+    client = get_client(region)
 
     # register domain for Mass
     try:
@@ -37,11 +159,7 @@ def register_domain(domain=None, region=None):
 
 
 def register_workflow_type(domain=None, region=None):
-    client = boto3.client(
-        'swf',
-        region_name=region or config.REGION,
-        config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                      read_timeout=config.READ_TIMEOUT))
+    client = get_client(region)
 
     # register workflow type for Job
     try:
@@ -79,11 +197,7 @@ def register_workflow_type(domain=None, region=None):
 
 
 def register_activity_type(domain=None, region=None):
-    client = boto3.client(
-        'swf',
-        region_name=region or config.REGION,
-        config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                      read_timeout=config.READ_TIMEOUT))
+    client = get_client(region)
 
     # register activity type for Cmd
     try:
@@ -18,12 +18,16 @@ class BaseWorker(object):
     """
 
     role_functions = {}
+    role_executors = {}
 
-    def role(self, name):
-        """Registers a role to execute relative action.
+    def role(self, name, executor=None):
+        """Registers a role to execute relative action. The executor of role
+        overrides the executor of worker, e.g. "thread" for I/O-bound roles.
         """
         def decorator(func):
             self.role_functions[name] = func
+            if executor is not None:
+                self.role_executors[name] = executor
 
             @wraps(func)
             def wrapper(*args, **kwargs):
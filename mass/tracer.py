@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tracing of mass jobs.
+
+Spans of a job share the title of job as trace id, and span ids are derived
+from SWF ids, so the timeline of a job could be reconstructed from the spans
+exported by submitter, deciders and workers:
+
+submit: "<job title>:submit"
+workflow: "<workflow id>", the parent is the workflow of parent task, or the
+          submit span for job.
+decision: "<workflow id>:decision:<started event id>"
+schedule, retry: "<workflow id>:schedule:<activity id or child workflow id>",
+                 the parent is the decision.
+activity: "<workflow id>/<activity id>"
+heartbeat: "<workflow id>/<activity id>:heartbeat:<count>"
+
+Example:
+
+Tracer().exporter(JSONLExporter('/tmp/mass-trace.jsonl'))
+"""
+from contextlib import contextmanager
+import json
+import time
+
+
+class Tracer(object):
+
+    EXPORTERS = []
+
+    def export(self, span):
+        """Deliver span to registered exporters.
+        """
+        for func in self.EXPORTERS:
+            func(span)
+
+    def exporter(self, func=None):
+        """Register func to export spans. Return a decorator if func is not
+        given.
+        """
+        if func is None:
+            return self.exporter
+        self.EXPORTERS.append(func)
+        return func
+
+    @contextmanager
+    def span(self, name, trace_id, span_id, parent_id=None, start_time=None, **attributes):
+        """Export a span of the block. Attributes of the yielded span could be
+        updated in the block.
+        """
+        span = {
+            'trace_id': trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'start_time': start_time or time.time(),
+            'attributes': attributes}
+        try:
+            yield span
+        except Exception as err:
+            span['attributes']['error'] = repr(err)
+            raise
+        finally:
+            if self.EXPORTERS:
+                span['end_time'] = time.time()
+                self.export(span)
+
+    def event(self, name, trace_id, span_id, parent_id=None, **attributes):
+        """Export a span without duration.
+        """
+        if not self.EXPORTERS:
+            return
+        now = time.time()
+        self.export({
+            'trace_id': trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'start_time': now,
+            'end_time': now,
+            'attributes': attributes})
+
+
+class JSONLExporter(object):
+
+    """Append spans to a file as JSON lines. The file is opened for each
+    span, so it could be shared by forked workers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, span):
+        with open(self.path, 'a') as fp:
+            fp.write(json.dumps(span, default=str) + '\n')
@@ -4,47 +4,64 @@
 """Helper functions.
 """
 
-# built-in modules
-import json
-
-# 3rd-party modules
-from botocore.client import Config
-
 # local modules
+from mass.dependency import check_dependencies
 from mass.exception import UnsupportedScheduler
 from mass.input_handler import InputHandler
+from mass.tracer import Tracer
 
 
-def submit(job, protocol=None, priority=1, scheduler='swf', domain=None, region=None):
+def submit(job, protocol=None, priority=1, scheduler='swf', domain=None, region=None,
+           reference=False):
     """Submit mass job to SWF with specific priority.
+
+    If reference is True, job is compiled into a node table which is saved
+    once by protocol, or to the payload store if protocol is not given, and
+    tasks are passed to child workflows by reference to the table.
+
+    If scheduler is "local", job is executed in local process by the
+    registered roles and the call returns after job is finished. TaskError is
+    raised if job is failed.
+
+    InvalidDependency is raised if the dependencies of children are invalid
+    or cyclic.
     """
+    check_dependencies(job)
+    if scheduler == 'local':
+        from mass.scheduler.local import LocalScheduler
+        LocalScheduler().run(job)
+        return job['Job']['title'], None
     if scheduler != 'swf':
         raise UnsupportedScheduler(scheduler)
     from mass.scheduler.swf import config
-    import boto3
-    client = boto3.client(
-        'swf',
-        region_name=region or config.REGION,
-        config=Config(connect_timeout=config.CONNECT_TIMEOUT,
-                      read_timeout=config.READ_TIMEOUT))
+    from mass.scheduler.swf.node_table import save_table
+    from mass.scheduler.swf.utils import dump_input, get_client
+    client = get_client(region)
     handler = InputHandler(protocol)
 
     job_title = job['Job']['title']
-    res = client.start_workflow_execution(
-        domain=domain or config.DOMAIN,
-        workflowId=job_title,
-        workflowType=config.WORKFLOW_TYPE_FOR_JOB,
-        taskList={'name': config.DECISION_TASK_LIST},
-        taskPriority=str(priority),
-        input=json.dumps({
+    if reference:
+        input_data = {'protocol': protocol, 'table': save_table(job, protocol), 'node': 0}
+    else:
+        input_data = {
             'protocol': protocol,
             'body': handler.save(
                 data=job,
                 genealogy=[job_title]
             )
-        }),
-        executionStartToCloseTimeout=str(config.WORKFLOW_EXECUTION_START_TO_CLOSE_TIMEOUT),
-        tagList=[job_title],
-        taskStartToCloseTimeout=str(config.DECISION_TASK_START_TO_CLOSE_TIMEOUT),
-        childPolicy=config.WORKFLOW_CHILD_POLICY)
+        }
+    with Tracer().span('submit', job_title, '%s:submit' % job_title,
+                       priority=priority) as span:
+        res = client.start_workflow_execution(
+            domain=domain or config.DOMAIN,
+            workflowId=job_title,
+            workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+            taskList={'name': config.DECISION_TASK_LIST},
+            taskPriority=str(priority),
+            input=dump_input(input_data),
+            executionStartToCloseTimeout=str(config.WORKFLOW_EXECUTION_START_TO_CLOSE_TIMEOUT),
+            tagList=[job_title],
+            taskStartToCloseTimeout=str(config.DECISION_TASK_START_TO_CLOSE_TIMEOUT),
+            childPolicy=config.WORKFLOW_CHILD_POLICY)
+        span['attributes']['run_id'] = res['runId']
     return job_title, res['runId']
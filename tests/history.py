@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Helpers to build SWF workflow execution history for testing.
+"""
+
+# built-in modules
+from datetime import datetime, timedelta
+import copy
+import json
+
+
+class History(list):
+    """Build SWF workflow execution history for testing.
+    """
+
+    def __init__(self, job, run_id='run'):
+        super(History, self).__init__()
+        self.execution = {'workflowId': job['Job']['title'], 'runId': run_id}
+        self.previous_started_event_id = 0
+        self.add('WorkflowExecutionStarted', {
+            'input': json.dumps({'protocol': None, 'body': job}),
+            'tagList': [job['Job']['title']],
+            'taskPriority': '1'})
+
+    def add(self, event_type, attributes):
+        event_id = len(self) + 1
+        attr_name = event_type[0].lower() + event_type[1:] + 'EventAttributes'
+        self.append({
+            'eventId': event_id,
+            'eventType': event_type,
+            'eventTimestamp': datetime(2015, 1, 1) + timedelta(seconds=event_id),
+            attr_name: attributes})
+        return event_id
+
+    def decision(self):
+        scheduled = self.add('DecisionTaskScheduled', {'taskList': {'name': 'mass'}})
+        started = self.add('DecisionTaskStarted', {'scheduledEventId': scheduled})
+        self.add('DecisionTaskCompleted', {
+            'scheduledEventId': scheduled, 'startedEventId': started})
+
+    def schedule_activity(self, activity_id):
+        return self.add('ActivityTaskScheduled', {
+            'activityId': str(activity_id),
+            'activityType': {'name': 'Action', 'version': '0.1'},
+            'input': json.dumps({'protocol': None, 'body': {}}),
+            'taskList': {'name': 'mass'},
+            'taskPriority': '2'})
+
+    def finish_activity(self, scheduled_event_id, event_type='ActivityTaskCompleted', **attributes):
+        started = self.add('ActivityTaskStarted', {'scheduledEventId': scheduled_event_id})
+        attributes.update({'scheduledEventId': scheduled_event_id, 'startedEventId': started})
+        return self.add(event_type, attributes)
+
+    def initiate_child_workflow(self, workflow_id):
+        return self.add('StartChildWorkflowExecutionInitiated', {
+            'workflowId': workflow_id,
+            'workflowType': {'name': 'Task', 'version': '0.1'},
+            'input': json.dumps({'protocol': None, 'body': {}}),
+            'tagList': ['Job', workflow_id],
+            'taskList': {'name': 'mass'},
+            'taskPriority': '2'})
+
+    def finish_child_workflow(self, initiated_event_id, workflow_id, event_type='ChildWorkflowExecutionCompleted'):
+        execution = {'workflowId': workflow_id, 'runId': 'run-' + workflow_id}
+        self.add('ChildWorkflowExecutionStarted', {
+            'initiatedEventId': initiated_event_id, 'workflowExecution': execution})
+        return self.add(event_type, {
+            'initiatedEventId': initiated_event_id, 'workflowExecution': execution})
+
+    def poll(self, page_size=100, reverse_order=False):
+        """Schedule and start a decision task. Return the pages of history
+        polled by decider.
+        """
+        scheduled = self.add('DecisionTaskScheduled', {'taskList': {'name': 'mass'}})
+        started = self.add('DecisionTaskStarted', {'scheduledEventId': scheduled})
+        events = self[::-1] if reverse_order else self[:]
+        for i in range(0, len(events), page_size):
+            yield {
+                'taskToken': 'token-%d' % started,
+                'workflowExecution': self.execution,
+                'startedEventId': started,
+                'previousStartedEventId': self.previous_started_event_id,
+                'events': copy.deepcopy(events[i:i + page_size])
+            }
+
+    def respond(self, decisions):
+        """Complete the decision task and add the events of decisions.
+        """
+        started = [e for e in self if e['eventType'] == 'DecisionTaskStarted'][-1]['eventId']
+        completed = self.add('DecisionTaskCompleted', {
+            'scheduledEventId': started - 1, 'startedEventId': started})
+        self.previous_started_event_id = started
+        for decision in decisions:
+            decision_type = decision['decisionType']
+            attrs = decision[decision_type[0].lower() + decision_type[1:] + 'DecisionAttributes']
+            attrs = dict(attrs, decisionTaskCompletedEventId=completed)
+            if decision_type == 'ScheduleActivityTask':
+                self.add('ActivityTaskScheduled', attrs)
+            elif decision_type == 'StartChildWorkflowExecution':
+                self.add('StartChildWorkflowExecutionInitiated', attrs)
+            elif decision_type == 'CompleteWorkflowExecution':
+                self.add('WorkflowExecutionCompleted', attrs)
+            elif decision_type == 'FailWorkflowExecution':
+                self.add('WorkflowExecutionFailed', attrs)
+
+    def scheduled_activities(self):
+        return [e for e in self if e['eventType'] == 'ActivityTaskScheduled']
+
+
+class Client(object):
+    """Stub of SWF client which serves decision tasks of history.
+    """
+
+    def __init__(self, history, page_size=100):
+        self.history = history
+        self.page_size = page_size
+        self.page_count = 0
+        self.responses = []
+
+    def get_paginator(self, operation_name):
+        self.operation_name = operation_name
+        return self
+
+    def paginate(self, **kwargs):
+        if self.operation_name == 'poll_for_decision_task':
+            pages = self.history.poll(self.page_size, kwargs.get('reverseOrder', False))
+        else:
+            assert self.operation_name == 'get_workflow_execution_history'
+            assert kwargs['execution'] == self.history.execution
+            pages = ({'events': copy.deepcopy(self.history[i:i + self.page_size])}
+                     for i in range(0, len(self.history), self.page_size))
+        for page in pages:
+            self.page_count += 1
+            yield page
+
+    def respond_decision_task_completed(self, taskToken, decisions):
+        self.responses.append(decisions)
+        self.history.respond(decisions)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+import tracemalloc
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from history import Client, History
+from mass import Job, Task, Action
+from mass.log_handler import LogHandler
+from mass.metric_handler import MetricHandler
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, get_priorities, get_priority
+from mass.scheduler.swf.decider import HistoryCache
+
+
+def make_decider(history):
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = Client(history)
+    return decider
+
+
+def decision_types(decisions):
+    return [d['decisionType'] for d in decisions]
+
+
+def run_job(job, complete, cached=True):
+    """Run decisions of job until it is closed. Activities are completed by
+    complete(history, scheduled_event) which returns the closing event type.
+    """
+    history = History(job)
+    decider = make_decider(history)
+    responses = []
+    while True:
+        if not cached:
+            decider = make_decider(history)
+        decider.run('mass')
+        responses.append(decider.client.responses[-1])
+        if history[-1]['eventType'].startswith('WorkflowExecution'):
+            return history, responses
+        for event in history.scheduled_activities():
+            if not [e for e in history if e.get('activityTaskStartedEventAttributes', {})
+                    .get('scheduledEventId') == event['eventId']]:
+                complete(history, event)
+        assert len(responses) < 50
+
+
+def complete_all(history, event):
+    history.finish_activity(event['eventId'], result='null')
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_cached_handler_makes_same_decisions(parallel):
+    with Job('Job', parallel=parallel) as job:
+        for i in range(5):
+            Action(msg='Action #%d' % i, _role='echo')
+        Action(msg='on error', _role='echo', _whenerror=True)
+
+    history, cold = run_job(job, complete_all, cached=False)
+    history, warm = run_job(job, complete_all, cached=True)
+    assert warm == cold
+    assert history[-1]['eventType'] == 'WorkflowExecutionCompleted'
+    activity_ids = [e['activityTaskScheduledEventAttributes']['activityId']
+                    for e in history.scheduled_activities()]
+    assert activity_ids == ['0', '3', '6', '9', '12']
+
+
+def test_cached_handler_retries_and_fails():
+    with Job('Job') as job:
+        Action(msg='Action #0', _role='echo')
+        Action(msg='Action #1', _role='echo')
+        Action(msg='on error', _role='echo', _whenerror=True)
+
+    def fail_second(history, event):
+        if event['activityTaskScheduledEventAttributes']['activityId'] == '0':
+            history.finish_activity(event['eventId'], result='null')
+        elif event['activityTaskScheduledEventAttributes']['input'].find('on error') < 0:
+            history.finish_activity(
+                event['eventId'], 'ActivityTaskFailed', reason='error', details='trace')
+        else:
+            history.finish_activity(event['eventId'], result='null')
+
+    history, cold = run_job(job, fail_second, cached=False)
+    history, warm = run_job(job, fail_second, cached=True)
+    assert warm == cold
+    assert history[-1]['eventType'] == 'WorkflowExecutionFailed'
+    activity_ids = [e['activityTaskScheduledEventAttributes']['activityId']
+                    for e in history.scheduled_activities()]
+    assert activity_ids == ['0', '3', '4', '5', '6']
+
+
+def test_cached_handler_applies_decisions_of_other_decider():
+    with Job('Job') as job:
+        Action(msg='Action #0', _role='echo')
+        Action(msg='Action #1', _role='echo')
+
+    history = History(job)
+    decider = make_decider(history)
+    decider.run('mass')
+    handler = decider.history.get(('Job', 'run'))
+    history.finish_activity(history.scheduled_activities()[0]['eventId'], result='null')
+
+    other = make_decider(history)
+    other.run('mass')
+    assert decision_types(other.client.responses[-1]) == ['ScheduleActivityTask']
+    history.finish_activity(history.scheduled_activities()[1]['eventId'], result='null')
+
+    decider.run('mass')
+    assert decider.history.get(('Job', 'run')) is None
+    assert decision_types(decider.client.responses[-1]) == ['CompleteWorkflowExecution']
+    assert handler.checkpoint == (2, 2)
+
+
+def test_poll_new_events_only():
+    with Job('Job') as job:
+        for i in range(100):
+            Action(msg='Action #%d' % i, _role='echo')
+
+    history = History(job)
+    decider = make_decider(history)
+    decider.client.page_size = 10
+    for _ in range(50):
+        decider.run('mass')
+        history.finish_activity(history.scheduled_activities()[-1]['eventId'], result='null')
+    assert len(history) > 300
+
+    page_count = decider.client.page_count
+    handler = decider.history.get(('Job', 'run'))
+    events = list(decider.poll('mass'))
+    assert decider.client.page_count == page_count + 1
+    assert events == history[handler.last_event_id:]
+
+
+def test_stream_history_of_uncached_execution():
+    with Job('Job') as job:
+        for i in range(100):
+            Action(msg='Action #%d' % i, _role='echo')
+
+    history = History(job)
+    decider = make_decider(history)
+    for _ in range(50):
+        decider.run('mass')
+        history.finish_activity(history.scheduled_activities()[-1]['eventId'], result='null')
+
+    decider.history.discard(('Job', 'run'))
+    events = decider.poll('mass')
+    assert decider.client.operation_name == 'poll_for_decision_task'
+    assert list(events) == history
+    assert decider.client.operation_name == 'get_workflow_execution_history'
+
+
+@pytest.mark.parametrize('size', [100, 1000])
+def test_memory_of_streaming_history(size, monkeypatch):
+    """The memory allocated while folding history is bounded by a page of
+    events besides the steps kept by the handler.
+    """
+    monkeypatch.setattr(config, 'MAX_DECISIONS', size + 1)
+    with Job('Job', parallel=True) as job:
+        for i in range(size):
+            Action(msg='Action #%d' % i, _role='echo')
+    history = History(job)
+    decider = make_decider(history)
+    decider.run('mass')
+    for event in history.scheduled_activities():
+        history.finish_activity(event['eventId'], result='null')
+    decider.history.discard(('Job', 'run'))
+
+    tracemalloc.start()
+    events = decider.poll('mass')
+    handler = decider.load_handler(events)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(handler.events) == size
+    assert peak - retained < 200 * 1024
+
+
+def test_priorities():
+    with Job('Job') as job:
+        Action(msg='Action #0', _role='echo')
+        with Task('Task #1'):
+            Action(msg='Action #1.0', _role='echo')
+            Action(msg='Action #1.1', _role='echo')
+        with Task('Task #2', parallel=True):
+            with Task('Task #2.0'):
+                for i in range(3):
+                    Action(msg='Action #2.0.%d' % i, _role='echo')
+            Action(msg='Action #2.1', _role='echo')
+        Action(msg='Action #3', _role='echo')
+
+    assert get_priorities(job, 1) == [2, 3, 6, 11]
+    assert [get_priority(job, 1, i) for i in range(4)] == [2, 3, 6, 11]
+    assert get_priorities(job['Job']['children'][2], 6) == [7, 7]
+
+
+def test_history_cache():
+    class History(object):
+        def __init__(self, last_event_id):
+            self.last_event_id = last_event_id
+
+    cache = HistoryCache(max_size=2, max_events=10)
+    cache.put('a', History(3))
+    cache.put('b', History(3))
+    assert cache.get('a').last_event_id == 3
+    cache.put('c', History(3))
+    assert cache.get('b') is None
+    assert len(cache) == 2
+
+    cache.put('d', History(5))
+    assert cache.get('a') is None
+    assert cache.event_count == 8
+
+    cache.put('e', History(11))
+    assert cache.get('e') is None
+    cache.discard('c')
+    assert cache.event_count == 5
+
+    # A history folded with new events in place is counted again.
+    history = cache.get('d')
+    history.last_event_id = 8
+    cache.put('d', history)
+    assert cache.event_count == 8
+    history.last_event_id = 9
+    cache.put('d', history)
+    assert cache.event_count == 9
+    cache.put('f', History(2))
+    assert cache.get('d') is None
+    assert cache.event_count == 2
+    cache.discard('f')
+    assert cache.event_count == 0 and len(cache) == 0
+
+
+def test_step_latency(monkeypatch):
+    with Job('Job') as job:
+        Action(msg='Action #0', _role='echo')
+        Action(msg='Action #1', _role='echo')
+
+    messages = []
+    monkeypatch.setitem(LogHandler.HANDLERS, 'info', [messages.append])
+    history = History(job)
+    decider = make_decider(history)
+    decider.run('mass')
+    assert decider.handler.latencies() == []
+
+    scheduled = history.scheduled_activities()[-1]['eventId']
+    history.finish_activity(scheduled, result='null')
+    decider.run('mass')
+    # The activity is scheduled at event 5 and handled by decision task
+    # started at event 9, and events are a second apart.
+    assert decider.handler.latencies() == [('0', 4.0)]
+    assert messages == ['Step 0 latency: 4.000 seconds']
+
+
+def test_decision_metrics(monkeypatch):
+    with Job('Job') as job:
+        Action(msg='Action #0', _role='echo')
+        Action(msg='Action #1', _role='echo')
+
+    metrics = []
+    monkeypatch.setitem(MetricHandler.HANDLERS, 'decision', [metrics.append])
+    history, responses = run_job(job, complete_all)
+    assert len(metrics) == len(responses) == 3
+    assert [m['decisions'] for m in metrics] == [1, 1, 1]
+    assert [m['cached'] for m in metrics] == [False, True, True]
+    assert [m['history_size'] for m in metrics] == [3, 9, 15]
+    assert [m['events'] for m in metrics] == [3, 6, 6]
+    assert metrics[0]['workflow_execution'] == history.execution
+    assert metrics[0]['payload_bytes'] == len(json.dumps(responses[0]))
+    assert set(metrics[0]['durations']) == {
+        'poll', 'parse', 'load_input', 'execute', 'save_input', 'respond'}
+    assert all(d >= 0 for m in metrics for d in m['durations'].values())
+    assert metrics[1]['latencies'] == [('0', 4.0)]
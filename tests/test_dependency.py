@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Job, Task, Action
+from mass.dependency import check_dependencies, get_offsets, sort_children
+from mass.exception import InvalidDependency
+from mass.scheduler.swf import count_max_serial_children, get_priorities, get_priority
+from mass.scheduler.swf.node_table import compile_table
+import mass
+
+
+def test_depends_on_siblings():
+    with Job('Job', parallel=True) as job:
+        a = Action(msg='a')
+        b = Task('b', _depends_on=[a])
+        Action(msg='c', _depends_on=[a, b])
+        Action(msg='d', _depends_on=[2])
+    children = job['Job']['children']
+    assert [c[list(c)[0]].get('_depends_on') for c in children] == [None, [0], [0, 1], [2]]
+    assert sort_children(children) == [0, 1, 2, 3]
+
+
+def test_invalid_dependencies():
+    with Job('Job', parallel=True) as job:
+        Action(msg='a', _depends_on=[1])
+        Action(msg='b', _depends_on=[0])
+    with pytest.raises(InvalidDependency):
+        check_dependencies(job)
+    with pytest.raises(InvalidDependency):
+        mass.submit(job, scheduler='local')
+
+    with Job('Job') as job:
+        with Task('Task'):
+            Action(msg='a', _depends_on=[1])
+            Action(msg='b')
+    with pytest.raises(InvalidDependency):
+        check_dependencies(job)
+
+    with Job('Job', parallel=True) as job:
+        on_error = Action(msg='on error', _whenerror=True)
+        Action(msg='a', _depends_on=[on_error])
+    with pytest.raises(InvalidDependency):
+        check_dependencies(job)
+
+
+def test_critical_path_priorities():
+    # a -> b -> d is the critical path of 4 serial steps, c runs with them.
+    with Job('Job', parallel=True) as job:
+        a = Action(msg='a')
+        with Task('b', _depends_on=[a]) as b:
+            Action(msg='b.0')
+            Action(msg='b.1')
+        Action(msg='c')
+        Action(msg='d', _depends_on=[b])
+
+    children = job['Job']['children']
+    assert get_offsets(children, [1, 3, 1, 1]) == [0, 1, 0, 4]
+    assert count_max_serial_children(job) == 5
+    assert get_priorities(job, 1) == [2, 3, 2, 6]
+    assert [get_priority(job, 1, i) for i in range(4)] == [2, 3, 2, 6]
+    assert compile_table(job)['serials'][0] == 5
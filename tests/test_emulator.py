@@ -0,0 +1,548 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+import threading
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Job, Task, Action
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, SWFWorker
+from mass.scheduler.swf.emulator import SWFEmulator, serve
+from mass.scheduler.swf.utils import encode
+import mass
+
+
+calls = []
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(config, 'ACTIVITY_EXECUTOR', 'thread')
+    del calls[:]
+    worker = SWFWorker('mass', 'us-east-1')
+
+    @worker.role('emulated')
+    def emulated(msg, fail=False):
+        calls.append(msg)
+        if fail:
+            raise ValueError(msg)
+        return msg
+    return worker
+
+
+def run_until_closed(emulator, decider, worker, run_id, max_rounds=200):
+    """Run decider and worker alternately until workflow execution is closed.
+    """
+    for _ in range(max_rounds):
+        info = emulator.describe_workflow_execution(
+            domain='mass', execution={'workflowId': 'Job', 'runId': run_id})['executionInfo']
+        if info['executionStatus'] == 'CLOSED':
+            return info
+        decider.run(config.DECISION_TASK_LIST)
+        worker.run('emulated')
+    raise AssertionError('workflow execution is not closed')
+
+
+def start_job(client, job):
+    return client.start_workflow_execution(
+        domain='mass',
+        workflowId=job['Job']['title'],
+        workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': config.DECISION_TASK_LIST},
+        taskPriority='1',
+        input=json.dumps({'protocol': None, 'body': job}),
+        tagList=[job['Job']['title']])['runId']
+
+
+@pytest.mark.parametrize('page_size', [1000, 4])
+def test_run_job(worker, page_size):
+    with Job('Job') as job:
+        Action(msg='0', _role='emulated')
+        with Task('Task', parallel=True):
+            Action(msg='1.0', _role='emulated')
+            Action(msg='1.1', _role='emulated')
+        Action(msg='2', _role='emulated')
+
+    emulator = SWFEmulator(poll_timeout=0, page_size=page_size)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'COMPLETED'
+    assert calls[0] == '0' and sorted(calls[1:3]) == ['1.0', '1.1'] and calls[3] == '2'
+
+    history = list(emulator.get_paginator('get_workflow_execution_history').paginate(
+        domain='mass', execution={'workflowId': 'Job', 'runId': run_id}))
+    assert (len(history) > 1) == (page_size == 4)
+    event_types = [e['eventType'] for page in history for e in page['events']]
+    assert event_types.count('ChildWorkflowExecutionCompleted') == 1
+    assert event_types[-1] == 'WorkflowExecutionCompleted'
+
+
+def test_fail_job(worker, monkeypatch):
+    monkeypatch.setattr(config, 'ACTIVITY_MAX_RETRY', 1)
+    with Job('Job') as job:
+        with Task('Task'):
+            Action(msg='fail', fail=True, _role='emulated')
+        Action(msg='on error', _role='emulated', _whenerror=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'FAILED'
+    assert calls == ['fail', 'fail', 'on error']
+
+
+def schedule_activity(activity_id):
+    return {
+        'decisionType': 'ScheduleActivityTask',
+        'scheduleActivityTaskDecisionAttributes': {
+            'activityId': activity_id, 'activityType': config.ACTIVITY_TYPE_FOR_ACTION,
+            'taskList': {'name': 'mass'}}}
+
+
+def test_unhandled_decision():
+    emulator = SWFEmulator(poll_timeout=0)
+    with Job('Job') as job:
+        Action(msg='0', _role='emulated')
+    start_job(emulator, job)
+    poll_decision = lambda: emulator.poll_for_decision_task(
+        domain='mass', taskList={'name': 'mass'})
+    poll_activity = lambda: emulator.poll_for_activity_task(
+        domain='mass', taskList={'name': 'mass'})
+
+    task = poll_decision()
+    emulator.respond_decision_task_completed(
+        task['taskToken'], decisions=[schedule_activity('0'), schedule_activity('1')])
+    assert 'taskToken' not in poll_decision()
+
+    first, second = poll_activity(), poll_activity()
+    assert emulator.record_activity_task_heartbeat(first['taskToken']) == {
+        'cancelRequested': False}
+    emulator.respond_activity_task_completed(first['taskToken'], result='null')
+
+    # The workflow execution could not be completed if an event is added
+    # during the decision task.
+    task = poll_decision()
+    emulator.respond_activity_task_completed(second['taskToken'], result='null')
+    emulator.respond_decision_task_completed(task['taskToken'], decisions=[{
+        'decisionType': 'CompleteWorkflowExecution',
+        'completeWorkflowExecutionDecisionAttributes': {}}])
+    task = poll_decision()
+    assert task['events'][-3]['eventType'] == 'CompleteWorkflowExecutionFailed'
+
+    emulator.respond_decision_task_completed(task['taskToken'], decisions=[{
+        'decisionType': 'StartTimer',
+        'startTimerDecisionAttributes': {'timerId': 'timer', 'startToFireTimeout': '0'}}])
+    task = poll_decision()
+    assert task['events'][-3]['eventType'] == 'TimerFired'
+
+
+def test_serve(worker, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'emulator')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'emulator')
+    emulator = SWFEmulator(poll_timeout=0, page_size=5)
+    server = serve(emulator, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    monkeypatch.setattr(config, 'ENDPOINT_URL', 'http://localhost:%d' % server.server_port)
+
+    with Job('Job') as job:
+        with Task('Task'):
+            Action(msg='0', _role='emulated')
+
+    try:
+        _, run_id = mass.submit(job, region='us-east-1')
+        decider = SWFDecider('mass', 'us-east-1')
+        worker = SWFWorker('mass', 'us-east-1')
+        info = run_until_closed(emulator, decider, worker, run_id)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert info['closeStatus'] == 'COMPLETED'
+    assert calls == ['0']
+
+
+def count_open_activities(workflow):
+    event_types = [e['eventType'] for e in workflow.events]
+    return event_types.count('ActivityTaskScheduled') - sum(
+        event_types.count(t) for t in [
+            'ActivityTaskCompleted', 'ActivityTaskFailed', 'ActivityTaskTimedOut',
+            'ActivityTaskCanceled'])
+
+
+def count_events(workflow, event_type):
+    return sum(1 for e in workflow.events if e['eventType'] == event_type)
+
+
+def test_max_parallel(worker):
+    with Job('Job', parallel=True, max_parallel=2) as job:
+        for i in range(5):
+            Action(msg=str(i), _role='emulated')
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    workflow = emulator.executions[run_id]
+
+    while workflow.close_status is None:
+        decider.run(config.DECISION_TASK_LIST)
+        assert count_open_activities(workflow) <= 2
+        worker.run('emulated')
+    assert workflow.close_status == 'COMPLETED'
+    assert calls == ['0', '1', '2', '3', '4']
+
+
+def test_split_decisions(worker, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_DECISIONS', 3)
+    with Job('Job', parallel=True) as job:
+        for i in range(5):
+            Action(msg=str(i), _role='emulated')
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    workflow = emulator.executions[run_id]
+
+    # The rest of children are scheduled in the decisions triggered by timers.
+    for scheduled in [2, 4, 5]:
+        decider.run(config.DECISION_TASK_LIST)
+        assert count_open_activities(workflow) == scheduled
+        assert len(decider.decisions._data) <= config.MAX_DECISIONS
+    decider.run(config.DECISION_TASK_LIST)
+    assert count_open_activities(workflow) == 5
+
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'COMPLETED'
+    assert sorted(calls) == ['0', '1', '2', '3', '4']
+
+
+def test_split_inline_decisions(worker, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_DECISIONS', 3)
+    with Job('Job', parallel=True) as job:
+        for i in range(5):
+            Action(msg=str(i), _role='emulated', _inline=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    workflow = emulator.executions[run_id]
+
+    # The markers of inline actions share the limit of decisions.
+    for recorded in [2, 4]:
+        decider.run(config.DECISION_TASK_LIST)
+        assert count_events(workflow, 'MarkerRecorded') == recorded
+        assert len(decider.decisions._data) <= config.MAX_DECISIONS
+
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'COMPLETED'
+    assert calls == ['0', '1', '2', '3', '4']
+
+
+@pytest.mark.parametrize('cache_size', [1000, 0])
+def test_split_serial_inline_decisions(worker, monkeypatch, cache_size):
+    monkeypatch.setattr(config, 'MAX_DECISIONS', 3)
+    monkeypatch.setattr(config, 'INLINE_TASK_MAX_ACTIONS', 3)
+    monkeypatch.setattr(config, 'DECIDER_HISTORY_CACHE_SIZE', cache_size)
+    with Job('Job') as job:
+        for msg in 'abc':
+            Action(msg=msg, _role='emulated', _inline=True)
+        with Task('Inlined'):
+            for msg in 'def':
+                Action(msg=msg, _role='emulated', _inline=True)
+        Action(msg='g', fail=True, _role='emulated', _inline=True)
+        for msg in 'xyz':
+            Action(msg=msg, _role='emulated', _inline=True, _whenerror=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    sizes = []
+    respond = emulator.respond_decision_task_completed
+
+    def respond_decision_task_completed(taskToken, decisions=None, **kwargs):
+        sizes.append(len(decisions or []))
+        return respond(taskToken, decisions, **kwargs)
+    emulator.respond_decision_task_completed = respond_decision_task_completed
+
+    # The markers of serial inline actions share the limit of decisions.
+    run_id = start_job(emulator, job)
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'FAILED'
+    assert calls == list('abcdefgxyz')
+    assert max(sizes) <= config.MAX_DECISIONS
+
+
+def test_dependencies(worker):
+    with Job('Job', parallel=True) as job:
+        a = Action(msg='a', _role='emulated')
+        b = Action(msg='b', _role='emulated', _depends_on=[a])
+        Action(msg='c', _role='emulated')
+        Action(msg='d', _role='emulated', _depends_on=[b])
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    workflow = emulator.executions[run_id]
+
+    decider.run(config.DECISION_TASK_LIST)
+    assert count_open_activities(workflow) == 2
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'COMPLETED'
+    # b and d on the critical path have higher priority than c.
+    assert calls == ['a', 'b', 'd', 'c']
+
+
+@pytest.mark.parametrize('cache_size', [1000, 0])
+def test_inline_tasks(worker, monkeypatch, cache_size):
+    monkeypatch.setattr(config, 'INLINE_TASK_MAX_ACTIONS', 2)
+    monkeypatch.setattr(config, 'DECIDER_HISTORY_CACHE_SIZE', cache_size)
+    with Job('Job') as job:
+        Action(msg='a', _role='emulated')
+        with Task('Inlined'):
+            Action(msg='b', _role='emulated')
+            Action(msg='c', _role='emulated')
+        with Task('Large'):
+            for msg in 'def':
+                Action(msg=msg, _role='emulated')
+        with Task('Parallel', parallel=True):
+            Action(msg='g', _role='emulated')
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'COMPLETED'
+    assert calls == list('abcdefg')
+
+    events = emulator.executions[run_id].events
+    children = [e['startChildWorkflowExecutionInitiatedEventAttributes']['tagList'][-1]
+                for e in events if e['eventType'] == 'StartChildWorkflowExecutionInitiated']
+    assert children == ['Large', 'Parallel']
+    genealogies = [json.loads(e['activityTaskScheduledEventAttributes']['input'])['genealogy']
+                   for e in events if e['eventType'] == 'ActivityTaskScheduled']
+    assert [g[:-1] for g in genealogies] == [['Job'], ['Job', 'Inlined'], ['Job', 'Inlined']]
+
+
+def test_fail_inlined_task(worker, monkeypatch):
+    monkeypatch.setattr(config, 'INLINE_TASK_MAX_ACTIONS', 2)
+    monkeypatch.setattr(config, 'ACTIVITY_MAX_RETRY', 0)
+    with Job('Job') as job:
+        with Task('Inlined'):
+            Action(msg='a', fail=True, _role='emulated')
+            Action(msg='b', _role='emulated')
+        Action(msg='c', _role='emulated', _whenerror=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'FAILED'
+    assert calls == ['a', 'c']
+    assert not any(e['eventType'] == 'StartChildWorkflowExecutionInitiated'
+                   for e in emulator.executions[run_id].events)
+
+
+def test_batch_actions(worker, monkeypatch):
+    monkeypatch.setattr(config, 'ACTIVITY_BATCH_SIZE', {'emulated': 3})
+    failures = set()
+
+    @worker.role('flaky')
+    def flaky(msg):
+        calls.append(msg)
+        if msg not in failures:
+            failures.add(msg)
+            raise ValueError(msg)
+
+    with Job('Job') as job:
+        for msg in 'abcd':
+            Action(msg=msg, _role='emulated')
+        Action(msg='e', _role='flaky')
+        with Task('Parallel', parallel=True, max_parallel=4):
+            for msg in 'fghij':
+                Action(msg=msg, _role='emulated')
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    for _ in range(50):
+        if emulator.executions[run_id].close_status:
+            break
+        decider.run(config.DECISION_TASK_LIST)
+        worker.run('emulated')
+        worker.run('flaky')
+    assert emulator.executions[run_id].close_status == 'COMPLETED'
+    assert calls == list('abcdee') + list('fghij')
+
+    activities = [
+        e['activityTaskScheduledEventAttributes'].get('control')
+        for workflow in emulator.executions.values() for e in workflow.events
+        if e['eventType'] == 'ActivityTaskScheduled']
+    # a-c, d, e and its retry, then f-h and i within max_parallel, and j.
+    assert activities == [None] * 4 + ['0,1,2', '3', '4']
+
+
+def test_retry_batch(worker, monkeypatch):
+    monkeypatch.setattr(config, 'ACTIVITY_BATCH_SIZE', {'emulated': 3})
+    monkeypatch.setattr(config, 'ACTIVITY_MAX_RETRY', 1)
+    with Job('Job') as job:
+        Action(msg='a', _role='emulated')
+        Action(msg='b', fail=True, _role='emulated')
+        Action(msg='c', _role='emulated')
+        Action(msg='d', _role='emulated', _whenerror=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'FAILED'
+    # Only the failed action is retried, c never runs after it, and the
+    # action when error runs.
+    assert calls == ['a', 'b', 'b', 'd']
+    events = emulator.executions[run_id].events
+    assert events[-1]['workflowExecutionFailedEventAttributes']['reason'] == "ValueError('b')"
+
+
+@pytest.mark.parametrize('parallel,max_workers', [(False, 3), (True, 1), (True, 3)])
+def test_execute_batch(worker, monkeypatch, parallel, max_workers):
+    monkeypatch.setattr(config, 'ACTIVITY_BATCH_MAX_WORKERS', max_workers)
+    actions = [Action(msg=msg, fail=msg == 'b', _role='emulated') for msg in 'abc']
+    result = worker.execute_batch(actions, parallel=parallel)
+    assert result['status'] == 'failed' and result['reason'] == "ValueError('b')"
+    results = json.loads(result['details'])
+    if parallel:
+        assert [r['status'] for r in results] == ['completed', 'failed', 'completed']
+    else:
+        # A serial batch stops at the failed action.
+        assert calls == ['a', 'b']
+        assert [r and r['status'] for r in results] == ['completed', 'failed', None]
+
+    # Completed actions are not executed again.
+    del calls[:]
+    results[1] = None
+    actions[1]['Action']['fail'] = False
+    result = worker.execute_batch(actions, results, parallel=parallel)
+    assert result == {'status': 'completed', 'result': ['a', 'b', 'c'],
+                      'execution_time': result['execution_time']}
+    assert calls == (['b'] if parallel else ['b', 'c'])
+
+
+@pytest.mark.parametrize('cache_size', [1000, 0])
+def test_inline_actions(worker, monkeypatch, capsys, cache_size):
+    monkeypatch.setattr(config, 'INLINE_ROLES', [None])
+    monkeypatch.setattr(config, 'DECIDER_HISTORY_CACHE_SIZE', cache_size)
+    with Job('Job') as job:
+        Action(msg='a')
+        Action(msg='b', _role='emulated', _inline=True)
+        Action(msg='c', _role='emulated')
+        Action(msg='d', _role='emulated', _inline=True)
+        with Task('Parallel', parallel=True):
+            e = Action(msg='e', _role='emulated', _inline=True)
+            Action(msg='f', _role='emulated', _depends_on=[e])
+            Action(msg='g', _role='emulated', _inline=True, _depends_on=[e])
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    workflow = emulator.executions[run_id]
+
+    # a and b run in the first decision, which schedules c.
+    decider.run(config.DECISION_TASK_LIST)
+    assert "msg='a'" in capsys.readouterr().out
+    assert calls == ['b']
+    assert count_events(workflow, 'MarkerRecorded') == 2
+    assert count_open_activities(workflow) == 1
+
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'COMPLETED'
+    assert calls == list('bcdegf')
+    assert count_events(workflow, 'MarkerRecorded') == 3
+    assert count_events(workflow, 'ActivityTaskScheduled') == 1
+
+
+@pytest.mark.parametrize('cache_size', [1000, 0])
+def test_inline_action_after_started_activity(worker, monkeypatch, cache_size):
+    monkeypatch.setattr(config, 'DECIDER_HISTORY_CACHE_SIZE', cache_size)
+    with Job('Job') as job:
+        Action(msg='a', _role='emulated')
+        Action(msg='b', _role='emulated', _inline=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    workflow = emulator.executions[run_id]
+    decider.run(config.DECISION_TASK_LIST)
+    token = emulator.poll_for_activity_task(
+        domain='mass', taskList={'name': 'emulated'})['taskToken']
+
+    # Another decision while a is started must not run b.
+    emulator._schedule_decision(workflow)
+    decider.run(config.DECISION_TASK_LIST)
+    assert calls == []
+    assert count_events(workflow, 'MarkerRecorded') == 0
+
+    emulator.respond_activity_task_completed(taskToken=token, result=encode(json.dumps('a')))
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'COMPLETED'
+    assert calls == ['b']
+    assert count_events(workflow, 'MarkerRecorded') == 1
+
+
+@pytest.mark.parametrize('cache_size', [1000, 0])
+@pytest.mark.parametrize('depends', [False, True])
+def test_fail_inline_action_in_parallel(worker, monkeypatch, cache_size, depends):
+    monkeypatch.setattr(config, 'DECIDER_HISTORY_CACHE_SIZE', cache_size)
+    with Job('Job', parallel=True) as job:
+        a0 = Action(msg='A0', _role='emulated')
+        Action(msg='A1', fail=True, _role='emulated', _inline=True,
+               _depends_on=[a0] if depends else [])
+        Action(msg='A2', _role='emulated')
+        Action(msg='W', _role='emulated', _whenerror=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'FAILED'
+    # The action when error is never counted as a child of the task.
+    assert calls == (['A0', 'A1', 'A2', 'W'] if depends else ['A1', 'W'])
+
+
+def test_fail_inline_action(worker, monkeypatch):
+    with Job('Job') as job:
+        Action(msg='a', fail=True, _role='emulated', _inline=True)
+        Action(msg='b', _role='emulated')
+        Action(msg='c', _role='emulated', _inline=True, _whenerror=True)
+
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    run_id = start_job(emulator, job)
+    info = run_until_closed(emulator, decider, worker, run_id)
+    assert info['closeStatus'] == 'FAILED'
+    assert calls == ['a', 'c']
+    workflow = emulator.executions[run_id]
+    assert count_events(workflow, 'MarkerRecorded') == 2
+    assert workflow.events[-1]['workflowExecutionFailedEventAttributes']['reason'] == \
+        "ValueError('a')"
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Job, Action, InputHandler
+from mass.payload_store import PayloadStore
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider
+from mass.scheduler.swf.emulator import SWFEmulator
+from mass.scheduler.swf.utils import dump_input
+
+
+@pytest.fixture(autouse=True)
+def handlers(monkeypatch):
+    monkeypatch.setattr(InputHandler, 'HANDLERS', {})
+
+
+def test_save():
+    handler = InputHandler('single')
+    saved = {}
+
+    @handler.saver()
+    def save(data):
+        saved[len(saved)] = data
+        return len(saved) - 1
+
+    @handler.loader()
+    def load(key):
+        return saved[key]
+
+    assert handler.save(data='0', genealogy=['Job']) == 0
+    assert handler.save_batch([('1', ['Job']), ('2', ['Job'])]) == [1, 2]
+    assert handler.load(2) == '2'
+    assert InputHandler().save_batch([('1', ['Job'])]) == ['1']
+
+
+def test_save_batch():
+    handler = InputHandler('batch')
+    calls = []
+
+    @handler.saver(batch=True)
+    def save(items):
+        calls.append(items)
+        return [genealogy[-1] for _, genealogy in items]
+
+    assert handler.save(data='0', genealogy=['Job', '0']) == '0'
+    assert handler.save_batch([('1', ['Job', '1']), ('2', ['Job', '2'])]) == ['1', '2']
+    assert [len(items) for items in calls] == [1, 2]
+
+
+def test_payload_store_protocol(tmpdir):
+    PayloadStore(str(tmpdir)).register('store')
+    handler = InputHandler('store')
+    keys = handler.save_batch([({'msg': i}, ['Job']) for i in range(3)])
+    assert [handler.load(key) for key in keys] == [{'msg': i} for i in range(3)]
+
+
+def test_decider_saves_in_batch():
+    handler = InputHandler('batch')
+    calls = []
+
+    @handler.saver(batch=True)
+    def save(items):
+        calls.append(items)
+        return [json.dumps(data) for data, _ in items]
+
+    @handler.loader()
+    def load(body):
+        return json.loads(body)
+
+    with Job('Job', parallel=True) as job:
+        for i in range(5):
+            Action(msg=str(i), _role='batched')
+    emulator = SWFEmulator(poll_timeout=0)
+    emulator.start_workflow_execution(
+        domain='mass', workflowId='Job', workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': 'mass'},
+        input=dump_input({'protocol': 'batch', 'body': json.dumps(job)}), tagList=['Job'])
+    decider = SWFDecider('mass', 'us-east-1')
+    decider.client = emulator
+    decider.run('mass')
+
+    assert len(calls) == 1
+    assert [data['Action']['msg'] for data, _ in calls[0]] == [str(i) for i in range(5)]
+    assert [genealogy for _, genealogy in calls[0]] == [
+        ['Job', 'Action%d' % (i * (config.ACTIVITY_MAX_RETRY + 1))] for i in range(5)]
+    for i in range(5):
+        task = emulator.poll_for_activity_task(domain='mass', taskList={'name': 'batched'})
+        assert json.loads(json.loads(task['input'])['body'])['Action']['msg'] == str(i)
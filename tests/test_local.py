@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import os
+import threading
+import time
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Job, Task, Action
+from mass.exception import TaskError
+from mass.scheduler.local import LocalScheduler
+from mass.scheduler.worker import BaseWorker
+import mass
+
+
+calls = []
+failures = {}
+
+
+@pytest.fixture
+def worker():
+    del calls[:]
+    failures.clear()
+    worker = BaseWorker()
+
+    @worker.role('record')
+    def record(msg):
+        calls.append(msg)
+        if failures.get(msg, 0) > 0:
+            failures[msg] -= 1
+            raise ValueError(msg)
+        return msg
+
+    @worker.role('local_sleep')
+    def local_sleep(seconds):
+        time.sleep(seconds)
+
+    @worker.role('local_pid')
+    def local_pid():
+        return os.getpid()
+
+    return worker
+
+
+def test_serial_and_nested(worker):
+    with Job('Job') as job:
+        Action(msg='0', _role='record')
+        with Task('Task'):
+            Action(msg='1.0', _role='record')
+            Action(msg='1.1', _role='record')
+        Action(msg='2', _role='record')
+        Action(msg='on error', _role='record', _whenerror=True)
+
+    LocalScheduler(worker).run(job)
+    assert calls == ['0', '1.0', '1.1', '2']
+
+
+def test_parallel(worker):
+    with Job('Job', parallel=True) as job:
+        for _ in range(4):
+            with Task('Task'):
+                Action(seconds=0.2, _role='local_sleep')
+
+    start_time = time.time()
+    LocalScheduler(worker, max_workers=4).run(job)
+    assert time.time() - start_time < 0.6
+
+
+def test_retry_action(worker):
+    with Job('Job') as job:
+        Action(msg='flaky', _role='record')
+
+    failures['flaky'] = 2
+    LocalScheduler(worker, activity_max_retry=2).run(job)
+    assert calls == ['flaky'] * 3
+
+    del calls[:]
+    failures['flaky'] = 2
+    with pytest.raises(TaskError) as error:
+        LocalScheduler(worker, activity_max_retry=1).run(job)
+    assert error.value.reason == "ValueError('flaky')"
+    assert calls == ['flaky'] * 2
+
+
+def test_retry_task(worker):
+    with Job('Job') as job:
+        with Task('Task'):
+            Action(msg='0', _role='record')
+            Action(msg='flaky', _role='record')
+
+    failures['flaky'] = 1
+    LocalScheduler(worker, activity_max_retry=0, workflow_max_retry=1).run(job)
+    assert calls == ['0', 'flaky', '0', 'flaky']
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_whenerror(worker, parallel):
+    with Job('Job', parallel=parallel) as job:
+        with Task('Task'):
+            Action(msg='fail', _role='record')
+            Action(msg='skipped', _role='record')
+            Action(msg='task on error', _role='record', _whenerror=True)
+        Action(msg='job on error', _role='record', _whenerror=True)
+
+    failures['fail'] = 1
+    with pytest.raises(TaskError) as error:
+        LocalScheduler(worker, activity_max_retry=0).run(job)
+    assert error.value.reason == "ValueError('fail')"
+    assert calls == ['fail', 'task on error', 'job on error']
+
+
+def test_process_executor(worker):
+    with Job('Job') as job:
+        Action(_role='local_pid')
+
+    LocalScheduler(worker, executor='process').run(job)
+
+    with Job('Job') as job:
+        Action(msg='fail', _role='record')
+    failures['fail'] = 1
+    with pytest.raises(TaskError):
+        LocalScheduler(worker, executor='process', activity_max_retry=0).run(job)
+
+
+def test_submit(worker):
+    with Job('Job') as job:
+        Action(msg='0', _role='record')
+
+    assert mass.submit(job, scheduler='local') == ('Job', None)
+    assert calls == ['0']
+
+
+def test_max_parallel(worker):
+    running = []
+    peak = []
+
+    @worker.role('local_count')
+    def local_count():
+        running.append(1)
+        peak.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+
+    with Job('Job', parallel=True, max_parallel=2) as job:
+        for _ in range(6):
+            Action(_role='local_count')
+
+    LocalScheduler(worker, max_workers=6).run(job)
+    assert len(peak) == 6 and max(peak) == 2
+
+
+def test_dependencies(worker):
+    with Job('Job', parallel=True) as job:
+        a = Action(msg='a', _role='record')
+        Action(msg='b', _role='record', _depends_on=[a])
+        Action(_role='local_sleep', seconds=0.1)
+
+    LocalScheduler(worker).run(job)
+    assert calls == ['a', 'b']
+
+
+def test_retry_in_parallel(worker):
+    event = threading.Event()
+
+    @worker.role('local_wait')
+    def local_wait():
+        calls.append('wait')
+        if calls.count('wait') == 1:
+            raise ValueError('wait')
+        assert event.wait(1)
+
+    @worker.role('local_set')
+    def local_set():
+        event.set()
+
+    # The retry of a waits for c, which is started after b is completed.
+    with Job('Job', parallel=True, max_parallel=2) as job:
+        Action(_role='local_wait')
+        b = Action(seconds=0.1, _role='local_sleep')
+        Action(_role='local_set', _depends_on=[b])
+
+    LocalScheduler(worker, max_workers=2, activity_max_retry=1).run(job)
+    assert calls == ['wait', 'wait']
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+from multiprocessing import Process, Queue
+from urllib.request import urlopen
+import json
+
+# local modules
+from mass import Job, Action
+from mass.scheduler.metrics import QueueRecorder, WorkerMetrics, serve
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, SWFWorker
+from mass.scheduler.swf.emulator import SWFEmulator
+
+
+def test_render():
+    metrics = WorkerMetrics()
+    metrics.add_processes('echo', 2)
+    metrics.count('echo', 'completed')
+    metrics.count('echo', 'completed')
+    metrics.observe('echo', 'execution', 0.07)
+    metrics.observe('echo', 'execution', 2)
+    metrics.count('echo', 'busy_seconds', 0)
+
+    lines = metrics.render().splitlines()
+    assert 'mass_worker_completed_total{role="echo"} 2.0' in lines
+    assert 'mass_worker_execution_seconds_bucket{role="echo",le="0.05"} 0' in lines
+    assert 'mass_worker_execution_seconds_bucket{role="echo",le="0.1"} 1' in lines
+    assert 'mass_worker_execution_seconds_bucket{role="echo",le="+Inf"} 2' in lines
+    assert 'mass_worker_execution_seconds_count{role="echo"} 2' in lines
+    assert 'mass_worker_processes{role="echo"} 2' in lines
+    assert 'mass_worker_utilization{role="echo"} 0.0000' in lines
+
+
+def record(queue):
+    recorder = QueueRecorder(queue)
+    recorder.count('echo', 'failed')
+    recorder.observe('echo', 'poll_wait', 1)
+
+
+def test_aggregate_processes():
+    metrics = WorkerMetrics()
+    queue = Queue()
+    processes = [Process(target=record, args=(queue,)) for _ in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    queue.put(None)
+    metrics.collect(queue)
+    assert metrics.counters[('echo', 'failed')] == 3
+    assert metrics.histograms[('echo', 'poll_wait')].count == 3
+
+
+def test_serve():
+    metrics = WorkerMetrics()
+    metrics.count('echo', 'completed')
+    server = serve(metrics, port=0)
+    try:
+        text = urlopen('http://localhost:%d/metrics' % server.server_port).read()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert text.decode('utf-8') == metrics.render()
+
+
+def test_worker_metrics(monkeypatch):
+    monkeypatch.setattr(config, 'ACTIVITY_EXECUTOR', 'thread')
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    worker = SWFWorker('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+
+    @worker.role('measured')
+    def measured(fail):
+        if fail:
+            raise ValueError()
+
+    with Job('Job', parallel=True) as job:
+        Action(fail=False, _role='measured')
+        Action(fail=True, _role='measured')
+    emulator.start_workflow_execution(
+        domain='mass', workflowId='Job', workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': 'mass'}, input=json.dumps({'protocol': None, 'body': job}))
+
+    decider.run('mass')
+    for _ in range(3):
+        worker.run('measured')
+    counters = worker.metrics.counters
+    assert counters[('measured', 'polls')] == 3
+    assert counters[('measured', 'empty_polls')] == 1
+    assert counters[('measured', 'completed')] == 1
+    assert counters[('measured', 'failed')] == 1
+    assert counters[('measured', 'busy_seconds')] > 0
+    histograms = worker.metrics.histograms
+    assert histograms[('measured', 'poll_wait')].count == 3
+    assert histograms[('measured', 'schedule_to_start')].count == 2
+    assert histograms[('measured', 'execution')].count == 2
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+
+# local modules
+from mass import Job, Task, Action, InputHandler
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, SWFWorker, get_priorities
+from mass.scheduler.swf.emulator import SWFEmulator
+from mass.scheduler.swf.node_table import compile_table, expand_node, load_table, save_table
+import mass
+
+
+def make_job():
+    with Job('Job') as job:
+        Action(msg='0', _role='referred')
+        with Task('Task', parallel=True):
+            with Task('Subtask'):
+                Action(msg='1.0.0', _role='referred')
+                Action(msg='1.0.1', _role='referred')
+            Action(msg='1.1', _role='referred')
+        Action(msg='2', _role='referred')
+    return json.loads(json.dumps(job))
+
+
+def test_compile_table():
+    job = make_job()
+    table = compile_table(job)
+    assert len(table['nodes']) == 8
+    assert table['nodes'][0]['Job']['children'] == [1, 2, 7]
+
+    root = expand_node(table, 0)
+    assert root['Job']['children'][0] == job['Job']['children'][0]
+    assert root['Job']['children'][1] == {
+        'Task': {'title': 'Task', 'parallel': True, '_node': 2, '_serial': 3}}
+    assert get_priorities(root, 1) == get_priorities(job, 1)
+
+    task = expand_node(table, 2)
+    assert task['Task']['children'][1] == job['Job']['children'][1]['Task']['children'][1]
+
+
+def test_run_job_by_reference(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, 'PAYLOAD_STORE_PATH', str(tmpdir))
+    monkeypatch.setattr(config, 'ACTIVITY_EXECUTOR', 'thread')
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    worker = SWFWorker('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    calls = []
+
+    @worker.role('referred')
+    def referred(msg):
+        calls.append(msg)
+
+    monkeypatch.setattr(mass.scheduler.swf.utils, 'get_client', lambda region=None: emulator)
+    _, run_id = mass.submit(make_job(), region='us-east-1', reference=True)
+    reference = json.loads(emulator.executions[run_id].events[0][
+        'workflowExecutionStartedEventAttributes']['input'])['table']
+
+    while emulator.executions[run_id].close_status is None:
+        decider.run('mass')
+        worker.run('referred')
+    assert emulator.executions[run_id].close_status == 'COMPLETED'
+    assert calls[0] == '0' and calls[-1] == '2'
+    assert sorted(calls) == ['0', '1.0.0', '1.0.1', '1.1', '2']
+
+    children = [json.loads(e['startChildWorkflowExecutionInitiatedEventAttributes']['input'])
+                for workflow in emulator.executions.values() for e in workflow.events
+                if e['eventType'] == 'StartChildWorkflowExecutionInitiated']
+    assert children == [
+        {'protocol': None, 'table': reference, 'node': 2},
+        {'protocol': None, 'table': reference, 'node': 3}]
+
+
+def test_load_table_by_unhashable_reference(monkeypatch):
+    monkeypatch.setattr(InputHandler, 'HANDLERS', {})
+    handler = InputHandler('dict')
+    tables = []
+
+    @handler.saver()
+    def save(data):
+        tables.append(data)
+        return {'index': len(tables) - 1}
+
+    @handler.loader()
+    def load(reference):
+        return tables[reference['index']]
+
+    reference = save_table(make_job(), 'dict')
+    assert reference == {'index': 0}
+    assert load_table('dict', reference) is load_table('dict', {'index': 0})
+    assert expand_node(load_table('dict', reference), 0)['Job']['title'] == 'Job'
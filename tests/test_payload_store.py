@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+import os
+import time
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Job, Action, InputHandler
+from mass.payload_store import PayloadStore
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, SWFWorker
+from mass.scheduler.swf.emulator import SWFEmulator
+from mass.scheduler.swf.utils import REFERENCE_PREFIX, dump_input, load_input, resolve, spill
+
+
+def test_put_and_get(tmpdir):
+    store = PayloadStore(str(tmpdir))
+    key = store.put('payload')
+    assert store.put('payload') == key
+    assert store.put('another payload') != key
+    assert store.get(key) == 'payload'
+    assert len(tmpdir.listdir()) == 2
+
+
+def test_invalid_key(tmpdir):
+    store = PayloadStore(str(tmpdir))
+    for key in ['/etc/passwd', '../' + store.put('payload'), 'A' * 64, None]:
+        with pytest.raises(ValueError):
+            store.get(key)
+
+
+def test_gc(tmpdir):
+    store = PayloadStore(str(tmpdir))
+    old, new = store.put('old'), store.put('new')
+    past = time.time() - 100
+    os.utime(store.key_path(old), (past, past))
+    assert store.gc(max_age=50) == 1
+    assert not os.path.exists(store.key_path(old))
+    assert store.get(new) == 'new'
+
+    # Saving a payload again keeps it from being collected.
+    os.utime(store.key_path(new), (past, past))
+    store.put('new')
+    assert store.gc(max_age=50) == 0
+
+
+def test_spill_input(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, 'PAYLOAD_STORE_PATH', str(tmpdir))
+    monkeypatch.setattr(config, 'MAX_INPUT_SIZE', 100)
+    assert dump_input({'msg': 'small'}) == json.dumps({'msg': 'small'})
+    data = {'msg': 'x' * 100}
+    input_ = dump_input(data)
+    assert len(input_) < 100
+    assert load_input(input_) == data
+
+
+def test_user_data_like_reference(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, 'PAYLOAD_STORE_PATH', str(tmpdir))
+    for data in [{'$payload': '/etc/passwd'}, {'$payload': 'key', 'protocol': 'store'}]:
+        assert resolve(json.dumps(data)) == json.dumps(data)
+        assert load_input(dump_input(data)) == data
+
+
+def test_spill_by_protocol(tmpdir, monkeypatch):
+    monkeypatch.setattr(InputHandler, 'HANDLERS', {})
+    PayloadStore(str(tmpdir)).register('store')
+    reference = spill('x' * 1000, 10, 'store', ['Job', 'result'])
+    assert reference.startswith(REFERENCE_PREFIX) and len(reference) < 1000
+    assert resolve(reference) == 'x' * 1000
+
+
+def test_spill_job(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, 'PAYLOAD_STORE_PATH', str(tmpdir))
+    monkeypatch.setattr(config, 'MAX_INPUT_SIZE', 1000)
+    monkeypatch.setattr(config, 'ACTIVITY_EXECUTOR', 'thread')
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    worker = SWFWorker('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+    calls = []
+
+    @worker.role('spilled')
+    def spilled(msg):
+        calls.append(msg)
+
+    with Job('Job') as job:
+        Action(msg='x' * 1000, _role='spilled')
+        Action(msg='x' * 1000, _role='spilled')
+    run_id = emulator.start_workflow_execution(
+        domain='mass', workflowId='Job', workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': 'mass'}, input=dump_input({'protocol': None, 'body': job}),
+        tagList=['Job'])['runId']
+
+    workflow = emulator.executions[run_id]
+    while workflow.close_status is None:
+        decider.run('mass')
+        worker.run('spilled')
+    assert workflow.close_status == 'COMPLETED'
+    assert calls == ['x' * 1000] * 2
+    inputs = [attrs['input'] for e in workflow.events for attrs in e.values()
+              if isinstance(attrs, dict) and 'input' in attrs]
+    assert len(inputs) == 3 and all(len(i) < 1000 for i in inputs)
+
+
+def test_spill_result(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, 'PAYLOAD_STORE_PATH', str(tmpdir))
+    monkeypatch.setattr(config, 'MAX_RESULT_SIZE', 100)
+    monkeypatch.setattr(config, 'MAX_DETAIL_SIZE', 100)
+    monkeypatch.setattr(config, 'ACTIVITY_MAX_RETRY', 0)
+    monkeypatch.setattr(config, 'ACTIVITY_EXECUTOR', 'thread')
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    worker = SWFWorker('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+
+    @worker.role('spilled')
+    def spilled(msg, fail=False):
+        if fail:
+            raise ValueError(msg)
+        return msg
+
+    with Job('Job', parallel=True) as job:
+        Action(msg='x' * 100, _role='spilled')
+        Action(msg='y' * 100, fail=True, _role='spilled')
+    run_id = emulator.start_workflow_execution(
+        domain='mass', workflowId='Job', workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': 'mass'}, input=dump_input({'protocol': None, 'body': job}),
+        tagList=['Job'])['runId']
+
+    workflow = emulator.executions[run_id]
+    decider.run('mass')
+    worker.run('spilled')
+    worker.run('spilled')
+    decider.run('mass')
+    assert workflow.close_status == 'FAILED'
+
+    completed, failed = decider.handler.events
+    assert completed.result() == json.dumps('x' * 100)
+    assert len(completed._events[-1].result) < 100
+    assert 'y' * 100 in failed.error().details
+    assert len(failed._events[-1].details) < 100
+    details = workflow.events[-1]['workflowExecutionFailedEventAttributes']['details']
+    assert len(details) < 100 and 'y' * 100 in resolve(details)
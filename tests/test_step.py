@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# local modules
+from history import History
+from mass import Job, Task, Action
+from mass.scheduler.swf.step import Event, EventKind, StepHandler
+
+
+def test_classify_events():
+    with Job('Job') as job:
+        Action(msg='first', _role='echo')
+        with Task('Task'):
+            Action(msg='second', _role='echo')
+        Action(msg='third', _role='echo')
+
+    history = History(job)
+    history.decision()
+    scheduled = history.schedule_activity(0)
+    history.finish_activity(scheduled, result='"first"')
+    history.decision()
+    initiated = history.initiate_child_workflow('Task-uuid-0')
+    history.finish_child_workflow(initiated, 'Task-uuid-0')
+    history.decision()
+    scheduled = history.schedule_activity(3)
+    history.finish_activity(scheduled, 'ActivityTaskFailed', reason='error', details='trace')
+    history.decision()
+    scheduled = history.schedule_activity(4)
+
+    handler = StepHandler(history, activity_max_retry=2)
+    assert [s.type() for s in handler.events] == [
+        'ActivityTask', 'ChildWorkflowExecution', 'ActivityTask']
+    assert [s.status() for s in handler.events] == ['Completed', 'Completed', 'Scheduled']
+    assert [s.name() for s in handler.events] == ['0', 'Task-uuid-0', '3']
+    assert handler.events[0].result() == '"first"'
+    assert handler.events[2].retry_count() == 1
+    assert handler.events[2].error() == ('error', 'trace')
+
+
+def test_decode_event():
+    history = History(Job('Job'))
+    initiated = history.initiate_child_workflow('Task-uuid-0')
+    history.finish_child_workflow(initiated, 'Task-uuid-0', 'ChildWorkflowExecutionFailed')
+
+    event = Event(history[0])
+    assert event.kind == EventKind.OTHER
+    assert event.tag_list == ['Job']
+    assert event.task_priority == '1'
+
+    event = Event(history[-1])
+    assert event.event_id == 4
+    assert event.kind == EventKind.CHILD_WORKFLOW_EXECUTION
+    assert event.status == 'Failed'
+    assert event.workflow_id == 'Task-uuid-0'
+    assert event.initiated_event_id == initiated
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Job, Task, Action
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, SWFWorker
+from mass.scheduler.swf.emulator import SWFEmulator
+from mass.tracer import Tracer, JSONLExporter
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    spans = []
+    monkeypatch.setattr(Tracer, 'EXPORTERS', [spans.append])
+    return spans
+
+
+def test_span(spans):
+    tracer = Tracer()
+    with pytest.raises(ValueError):
+        with tracer.span('block', 'Job', 'Job:block', foo='bar') as span:
+            span['attributes']['answer'] = 42
+            raise ValueError('error')
+    tracer.event('event', 'Job', 'Job:event', parent_id='Job:block')
+
+    block, event = spans
+    assert block['attributes'] == {'foo': 'bar', 'answer': 42, 'error': "ValueError('error')"}
+    assert block['end_time'] >= block['start_time']
+    assert event['parent_id'] == 'Job:block'
+    assert event['start_time'] == event['end_time']
+
+
+def test_jsonl_exporter(tmpdir):
+    path = str(tmpdir.join('trace.jsonl'))
+    exporter = JSONLExporter(path)
+    exporter({'span_id': '0'})
+    exporter({'span_id': '1'})
+    with open(path) as fp:
+        assert [json.loads(line)['span_id'] for line in fp] == ['0', '1']
+
+
+def test_trace_job(spans, monkeypatch):
+    monkeypatch.setattr(config, 'ACTIVITY_EXECUTOR', 'thread')
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    worker = SWFWorker('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+
+    @worker.role('traced')
+    def traced():
+        pass
+
+    with Job('Job') as job:
+        with Task('Task'):
+            Action(_role='traced')
+    run_id = emulator.start_workflow_execution(
+        domain='mass', workflowId='Job', workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': 'mass'}, input=json.dumps({'protocol': None, 'body': job}),
+        tagList=['Job'])['runId']
+
+    while emulator.executions[run_id].close_status is None:
+        decider.run('mass')
+        worker.run('traced')
+
+    assert all(span['trace_id'] == 'Job' for span in spans)
+    by_id = {span['span_id']: span for span in spans}
+    assert by_id['Job']['parent_id'] == 'Job:submit'
+    assert by_id['Job']['attributes']['status'] == 'completed'
+    task_id = [span['span_id'] for span in spans
+               if span['name'] == 'workflow' and span['span_id'] != 'Job'][0]
+    assert by_id[task_id]['parent_id'] == 'Job'
+    schedule = by_id['Job:schedule:%s' % task_id]
+    assert by_id[schedule['parent_id']]['name'] == 'decision'
+    activity = by_id['%s/0' % task_id]
+    assert activity['parent_id'] == task_id
+    assert activity['attributes']['status'] == 'completed'
+    assert activity['attributes']['genealogy'] == ['Job', 'Task', 'Action0']
+    assert by_id['%s:schedule:0' % task_id]['parent_id'] == '%s:decision:3' % task_id
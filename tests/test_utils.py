@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+import os
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Job, Action
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFDecider, SWFWorker
+from mass.scheduler.swf.emulator import SWFEmulator
+from mass.scheduler.swf.utils import decode, dump_input, encode, get_client
+
+
+def test_get_client(monkeypatch):
+    client = get_client('us-east-1')
+    assert get_client('us-east-1') is client
+    assert get_client('us-west-2') is not client
+    assert client.meta.config.max_pool_connections == config.MAX_POOL_CONNECTIONS
+    assert client.meta.config.tcp_keepalive == config.TCP_KEEPALIVE
+
+    # Decider and worker share the client of process.
+    assert SWFDecider('mass', 'us-east-1').client is client
+    assert SWFWorker('mass', 'us-east-1').client is client
+
+    monkeypatch.setattr(config, 'MAX_POOL_CONNECTIONS', config.MAX_POOL_CONNECTIONS + 1)
+    assert get_client('us-east-1') is not client
+
+
+def test_get_client_of_forked_process(monkeypatch):
+    client = get_client('us-east-1')
+    decider = SWFDecider('mass', 'us-east-1')
+    worker = SWFWorker('mass', 'us-east-1')
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert get_client('us-east-1') is not client
+
+    # Decider and worker built before fork use the client of forked process.
+    assert decider.client is get_client('us-east-1')
+    assert worker.client is get_client('us-east-1')
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma'])
+def test_codec(codec):
+    payload = json.dumps({'msg': 'x' * 1000})
+    encoded = encode(payload, codec)
+    assert encoded.startswith('mass:1:%s:' % codec) and len(encoded) < len(payload)
+    assert decode(encoded) == payload
+
+    # Payloads are not encoded if they are not shortened.
+    assert encode('"x"', codec) == '"x"'
+    assert decode('"x"') == '"x"'
+
+    with pytest.raises(ValueError):
+        decode(encoded.replace('mass:1:', 'mass:2:'))
+
+
+def test_encode_payloads(monkeypatch):
+    monkeypatch.setattr(config, 'PAYLOAD_CODEC', 'zlib')
+    monkeypatch.setattr(config, 'ACTIVITY_EXECUTOR', 'thread')
+    emulator = SWFEmulator(poll_timeout=0)
+    decider = SWFDecider('mass', 'us-east-1')
+    worker = SWFWorker('mass', 'us-east-1')
+    decider.client = worker.client = emulator
+
+    @worker.role('encoded')
+    def encoded(msg):
+        return msg
+
+    with Job('Job') as job:
+        Action(msg='x' * 1000, _role='encoded')
+    run_id = emulator.start_workflow_execution(
+        domain='mass', workflowId='Job', workflowType=config.WORKFLOW_TYPE_FOR_JOB,
+        taskList={'name': 'mass'}, input=dump_input({'protocol': None, 'body': job}),
+        tagList=['Job'])['runId']
+
+    workflow = emulator.executions[run_id]
+    while workflow.close_status is None:
+        decider.run('mass')
+        worker.run('encoded')
+    assert workflow.close_status == 'COMPLETED'
+    step = decider.handler.events[0]
+    assert step.result() == json.dumps('x' * 1000)
+    payloads = [attrs[k] for e in workflow.events for attrs in e.values()
+                if isinstance(attrs, dict) for k in ('input', 'result') if k in attrs]
+    assert len(payloads) == 3 and all(p.startswith('mass:1:zlib:') for p in payloads)
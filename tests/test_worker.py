@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# built-in modules
+import json
+import os
+import random
+import time
+
+# 3rd-party modules
+import pytest
+
+# local modules
+from mass import Action
+from mass.scheduler.swf import config
+from mass.scheduler.swf import SWFWorker, run_forever
+
+
+class Client(object):
+    """Stub of SWF client which records activity task heartbeats.
+    """
+
+    def __init__(self, cancel_requested=False):
+        self.cancel_requested = cancel_requested
+        self.heartbeat_count = 0
+
+    def record_activity_task_heartbeat(self, taskToken, details):
+        self.heartbeat_count += 1
+        return {'cancelRequested': self.cancel_requested}
+
+
+def make_action(role, **kwargs):
+    return json.loads(json.dumps(Action(_role=role, **kwargs)))
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(config, 'ACTIVITY_HEARTBEAT_INTERVAL', 0.05)
+    worker = SWFWorker()
+    worker.client = Client()
+
+    @worker.role('pid')
+    def pid():
+        return os.getpid()
+
+    @worker.role('fail')
+    def fail(msg):
+        raise ValueError(msg)
+
+    @worker.role('crash')
+    def crash():
+        os._exit(3)
+
+    @worker.role('sleep')
+    def sleep(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    yield worker
+    for executor in worker.executors.values():
+        executor.shutdown()
+
+
+@pytest.mark.parametrize('executor', ['process', 'pool', 'thread'])
+def test_execute_action(worker, executor):
+    worker.executor = executor
+    result = worker.execute_action(make_action('sleep', seconds=0.2))
+    assert result['status'] == 'completed'
+    assert result['result'] == 0.2
+    assert worker.client.heartbeat_count > 0
+
+    result = worker.execute_action(make_action('fail', msg='oops'))
+    assert result['status'] == 'failed'
+    assert result['reason'] == "ValueError('oops')"
+
+
+def test_reuse_pool_process(worker, monkeypatch):
+    worker.executor = 'pool'
+    pids = [worker.execute_action(make_action('pid'))['result'] for _ in range(3)]
+    assert len(set(pids)) == 1
+    assert pids[0] != os.getpid()
+
+    monkeypatch.setattr(config, 'ACTIVITY_POOL_MAX_TASKS', 1)
+    worker.executors.clear()
+    pids = [worker.execute_action(make_action('pid'))['result'] for _ in range(3)]
+    assert len(set(pids)) == 3
+
+
+@pytest.mark.parametrize('executor', ['process', 'pool'])
+def test_crash(worker, executor):
+    worker.executor = executor
+    result = worker.execute_action(make_action('crash'))
+    assert result['status'] == 'failed'
+    assert result['reason'] == 'WorkerCrashed(exitcode=3)'
+    assert worker.execute_action(make_action('pid'))['status'] == 'completed'
+
+
+@pytest.mark.parametrize('executor', ['process', 'pool', 'thread'])
+def test_cancel(worker, executor):
+    worker.executor = executor
+    worker.client.cancel_requested = True
+    start_time = time.time()
+    result = worker.execute_action(make_action('sleep', seconds=5))
+    assert result == {'status': 'cancelled'}
+    assert time.time() - start_time < 2
+
+    worker.client.cancel_requested = False
+    assert worker.execute_action(make_action('pid'))['status'] == 'completed'
+
+
+def test_role_executor(worker):
+    worker.executor = 'pool'
+
+    @worker.role('thread_pid', executor='thread')
+    def thread_pid():
+        return os.getpid()
+
+    assert worker.execute_action(make_action('thread_pid'))['result'] == os.getpid()
+    assert worker.execute_action(make_action('pid'))['result'] != os.getpid()
+
+
+def test_run_forever(monkeypatch):
+    monkeypatch.setattr(config, 'POLL_BACKOFF_BASE', 1)
+    monkeypatch.setattr(config, 'POLL_BACKOFF_MAX', 3)
+    monkeypatch.setattr(random, 'uniform', lambda a, b: b)
+    delays = []
+    monkeypatch.setattr(time, 'sleep', delays.append)
+    results = iter([ValueError, ValueError, ValueError, ValueError, None, None,
+                    ValueError, KeyboardInterrupt])
+
+    def poll():
+        result = next(results)
+        if result is not None:
+            raise result
+
+    with pytest.raises(KeyboardInterrupt):
+        run_forever(poll)
+    # No delay after polls which succeed and the backoff is reset by them.
+    assert delays == [1, 2, 3, 3, 1]